@@ -0,0 +1,106 @@
+"""
+Archived history against the same rows in Transactions: size on disk, and the date range
+page, full range search and summary read from Parquet day files (server/archive.py)
+against the same queries in PostgreSQL.
+
+Tops the Transactions table of DATABASE_URL up to --rows synthetic rows, then writes
+the first --days of seeded history to a temporary archive directory, copying them
+through a temporary table: Transactions is left as it was. Each range is read from the
+archive and from Transactions; summaries in PostgreSQL are timed both from the raw rows
+and through the rollups the API uses.
+
+    python benchmarks/bench_archive.py --rows 1000000 --days 180
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+
+from common import SEED_START, percentile, seed_transactions
+from server import archive, queries
+
+RAW_SUMMARY = """
+    SELECT type, count(*), sum(origin_amount) FROM Transactions
+    WHERE timestamp >= %s AND timestamp <= %s GROUP BY type
+"""
+
+
+def timed(function, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)
+
+
+def sql(cur, query: str, params: tuple):
+    def run():
+        cur.execute(query, params)
+        return cur.fetchall()
+    return run
+
+
+def main(args):
+    conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+    seed_transactions(conn, args.rows)
+    cur = conn.cursor()
+    start = datetime.fromisoformat(SEED_START)
+    end = start + timedelta(days=args.days)
+
+    archive.ARCHIVE_DIR = tempfile.mkdtemp(prefix="archive-")
+    try:
+        cur.execute("CREATE TEMP TABLE archive_source AS SELECT * FROM Transactions WHERE timestamp >= %s AND timestamp < %s", (start, end))
+        cur.execute("SELECT count(*), pg_total_relation_size('archive_source') FROM archive_source")
+        rows, table_bytes = cur.fetchone()
+        # What the rows take in Transactions: the heap above, plus its share of the indexes.
+        cur.execute("SELECT sum(pg_indexes_size(relid)) * %s / greatest(sum(c.reltuples), 1) FROM pg_partition_tree('transactions') JOIN pg_class c ON c.oid = relid WHERE isleaf",
+                    (rows,))
+        index_bytes = float(cur.fetchone()[0] or 0)
+        started = time.perf_counter()
+        archive.write_archive(conn, "archive_source")
+        elapsed = time.perf_counter() - started
+        conn.rollback()
+        archive.advance_watermark(end)
+        archive_bytes = sum(os.path.getsize(os.path.join(directory, name)) for directory, _, names in os.walk(archive.ARCHIVE_DIR) for name in names)
+        print(f"{rows} rows in {args.days} days archived in {elapsed:.1f} s ({rows / elapsed:.0f} rows/s)")
+        print(f"Transactions {(table_bytes + index_bytes) / 2 ** 20:.0f} MB with indexes, archive {archive_bytes / 2 ** 20:.1f} MB\n")
+
+        print(f"median / p95 ms over {args.runs} runs")
+        print(f"{'range':<8}{'query':<14}{'archive':>18}{'postgres':>18}{'rollups':>18}")
+        middle = start + timedelta(days=args.days // 2, hours=7, minutes=13)
+        for label, days in (("day", 1), ("week", 7), ("month", 30)):
+            lo, hi = middle, middle + timedelta(days=days)
+            page_query = queries.search_page_query(queries.SEARCH_TRANSACTIONS_BY_DATE_RANGE, False)
+            cases = {
+                "page of 100": (lambda: archive.search(lo, hi, 100), sql(cur, page_query, (lo, hi, 100)), None),
+                "all rows": (lambda: archive.search(lo, hi), sql(cur, queries.SEARCH_TRANSACTIONS_BY_DATE_RANGE, (lo, hi)), None),
+                "summary": (lambda: archive.summarize(lo, hi), sql(cur, RAW_SUMMARY, (lo, hi)), sql(cur, queries.TRANSACTION_SUMMARY, (lo, hi))),
+            }
+            for name, functions in cases.items():
+                cells = []
+                for function in functions:
+                    if function is None:
+                        cells.append(f"{'':>18}")
+                        continue
+                    function()  # warm the page cache
+                    timings = timed(function, args.runs)
+                    cells.append(f"{statistics.median(timings):>10.1f} / {percentile(timings, 0.95):>5.1f}")
+                print(f"{label:<8}{name:<14}" + "".join(cells))
+    finally:
+        shutil.rmtree(archive.ARCHIVE_DIR)
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Seed Transactions up to this many rows")
+    parser.add_argument("--days", type=int, default=180, help="Days of seeded history to archive")
+    parser.add_argument("--runs", type=int, default=20, help="Timed runs per query")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,64 @@
+"""
+Throughput of the API under many concurrent clients.
+
+Runs the app in-process over ASGI, so every client shares one event loop the
+same way requests share a uvicorn worker: a handler that blocks the loop
+serialises all of them. Needs DATABASE_URL and a key added with src/manage_keys.py.
+
+    python benchmarks/bench_concurrency.py --clients 64 --requests 2000 --api-key <key>
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from server import async_database  # noqa: E402
+from server.app import app  # noqa: E402
+
+ENDPOINT = "/transactions/total_amount"
+PARAMS = {"start_date": "2023-01-01T00:00:00", "end_date": "2030-01-01T00:00:00"}
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+async def client_loop(client: httpx.AsyncClient, remaining: list, latencies: list):
+    while remaining:
+        remaining.pop()
+        started = time.perf_counter()
+        response = await client.get(ENDPOINT, params=PARAMS)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(clients: int, requests: int, api_key: str):
+    await async_database.open_pool()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers={"access_token": api_key}) as client:
+            remaining = list(range(requests))
+            latencies = []
+            started = time.perf_counter()
+            await asyncio.gather(*(client_loop(client, remaining, latencies) for _ in range(clients)))
+            elapsed = time.perf_counter() - started
+    finally:
+        await async_database.close_pool()
+
+    latencies.sort()
+    print(f"clients={clients} requests={len(latencies)} elapsed={elapsed:.2f}s")
+    print(f"throughput={len(latencies) / elapsed:.1f} req/s")
+    print(f"p50={latencies[len(latencies) // 2] * 1000:.1f}ms p99={latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--api-key", default=os.getenv("API_KEY"))
+    args = parser.parse_args()
+    asyncio.run(run(args.clients, args.requests, args.api_key))
@@ -0,0 +1,187 @@
+"""
+Storage and read cost of device data inline in every transaction row, as JSONB columns,
+against the deduplicated layout: a Devices table keyed by content hash and two BIGINT
+references per row (server/devices.py).
+
+Builds both layouts with --rows transactions spread over --devices distinct full
+DeviceData payloads in temporary tables of DATABASE_URL, then reports their size,
+a full scan and point lookups by transaction_id (joined back to Devices for the
+deduplicated layout, like SELECT_TRANSACTION_BY_ID). Nothing is left behind.
+
+    python benchmarks/bench_device_storage.py --rows 1000000 --devices 1000
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+import psycopg2
+
+from common import percentile
+from server import queries
+from server.devices import DeviceBatch
+from server.models.transaction import DeviceData
+
+queries_insert_devices = queries.INSERT_DEVICES.replace("Devices", "devices")
+
+COLUMNS = """
+    id SERIAL PRIMARY KEY,
+    transaction_id BIGINT UNIQUE,
+    type VARCHAR(50) NOT NULL,
+    timestamp TIMESTAMP,
+    origin_user_id VARCHAR(50),
+    destination_user_id VARCHAR(50),
+    origin_amount NUMERIC NOT NULL,
+    origin_currency VARCHAR(3) NOT NULL,
+    origin_country VARCHAR(2),
+    destination_amount NUMERIC NOT NULL,
+    destination_currency VARCHAR(3) NOT NULL,
+    destination_country VARCHAR(2),
+    promotion_code_used BOOLEAN,
+    reference VARCHAR(255),
+"""
+
+# Shared by both layouts, so they hold the same transactions.
+ROW_VALUES = """
+    g, 'TRANSFER', timestamp '2024-01-01' + g * interval '30 seconds', (g %% 10007)::text, ((g * 7) %% 10007)::text,
+    round((random() * 2000)::numeric, 2), 'USD', 'US', round((random() * 2000)::numeric, 2), 'USD', 'DE',
+    false, 'seed',
+"""
+
+LAYOUTS = {
+    "inline JSONB": {
+        "setup": [
+            f"CREATE TEMP TABLE inline_transactions ({COLUMNS} origin_device_data JSONB, destination_device_data JSONB, tags JSONB)",
+            f"""
+            INSERT INTO inline_transactions (transaction_id, type, timestamp, origin_user_id, destination_user_id,
+                origin_amount, origin_currency, origin_country, destination_amount, destination_currency, destination_country,
+                promotion_code_used, reference, origin_device_data, destination_device_data, tags)
+            SELECT {ROW_VALUES} od.data, dd.data, '[{{"key": "customKey", "value": "customValue"}}]'
+            FROM generate_series(1, %(rows)s) g
+            JOIN bench_devices od ON od.n = g %% %(devices)s
+            JOIN bench_devices dd ON dd.n = (g * 7) %% %(devices)s
+            """,
+        ],
+        "tables": ["inline_transactions"],
+        "scan": "SELECT * FROM inline_transactions",
+        "lookup": "SELECT * FROM inline_transactions WHERE transaction_id = %s",
+    },
+    "deduplicated": {
+        "setup": [
+            f"CREATE TEMP TABLE dedup_transactions ({COLUMNS} origin_device_id BIGINT, destination_device_id BIGINT, tags JSONB)",
+            "CREATE TEMP TABLE devices (device_id BIGINT PRIMARY KEY, data JSONB NOT NULL)",
+            queries_insert_devices,
+            f"""
+            INSERT INTO dedup_transactions (transaction_id, type, timestamp, origin_user_id, destination_user_id,
+                origin_amount, origin_currency, origin_country, destination_amount, destination_currency, destination_country,
+                promotion_code_used, reference, origin_device_id, destination_device_id, tags)
+            SELECT {ROW_VALUES} od.device_id, dd.device_id, '[{{"key": "customKey", "value": "customValue"}}]'
+            FROM generate_series(1, %(rows)s) g
+            JOIN bench_devices od ON od.n = g %% %(devices)s
+            JOIN bench_devices dd ON dd.n = (g * 7) %% %(devices)s
+            """,
+        ],
+        "tables": ["dedup_transactions", "devices"],
+        "scan": "SELECT * FROM dedup_transactions",
+        "lookup": """
+            SELECT t.*, od.data AS origin_device_data, dd.data AS destination_device_data
+            FROM dedup_transactions t
+            LEFT JOIN devices od ON od.device_id = t.origin_device_id
+            LEFT JOIN devices dd ON dd.device_id = t.destination_device_id
+            WHERE t.transaction_id = %s
+        """,
+    },
+}
+
+
+def device_payloads(count: int) -> list:
+    rng = random.Random(count)
+    payloads = []
+    for n in range(count):
+        payloads.append(DeviceData(
+            batteryLevel=rng.randrange(5, 100),
+            deviceLatitude=round(rng.uniform(-90, 90), 4),
+            deviceLongitude=round(rng.uniform(-180, 180), 4),
+            ipAddress=f"10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}",
+            deviceIdentifier=f"{rng.getrandbits(84):021x}",
+            vpnUsed=rng.random() < 0.1,
+        ).dict())
+    return payloads
+
+
+def scan(cur, query: str) -> tuple:
+    # Server-side timing and pages touched; nothing is sent to the client.
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query)
+    result = cur.fetchone()[0][0]
+    plan = result["Plan"]
+    return result["Execution Time"], plan.get("Shared Hit Blocks", 0) + plan.get("Local Hit Blocks", 0) + plan.get("Local Read Blocks", 0)
+
+
+def main(rows: int, devices: int, lookups: int):
+    conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SET temp_buffers = '1GB'")  # keep both layouts in memory, so scans compare pages, not disk
+
+    payloads = device_payloads(devices)
+    batch = DeviceBatch(skip_known=False)
+    device_ids = [batch.add(payload) for payload in payloads]
+    cur.execute("CREATE TEMP TABLE bench_devices (n INT PRIMARY KEY, device_id BIGINT, data JSONB)")
+    cur.executemany(
+        "INSERT INTO bench_devices VALUES (%s, %s, %s)",
+        [(n, device_ids[n], json.dumps(payload)) for n, payload in enumerate(payloads)],
+    )
+    sample = random.sample(range(1, rows + 1), min(lookups, rows))
+
+    print(f"{rows} transactions, {devices} distinct devices of ~{sum(len(json.dumps(p)) for p in payloads) // devices} bytes")
+    print(f"{'layout':<16}{'heap MB':>9}{'total MB':>10}{'rows/page':>11}{'scan ms':>9}{'pages':>9}{'lookup p50':>12}{'p95 ms':>8}")
+    baseline = None
+    for name, layout in LAYOUTS.items():
+        for statement in layout["setup"]:
+            if statement is queries_insert_devices:
+                cur.execute(statement, batch.params())
+            elif "%(rows)s" in statement:
+                cur.execute(statement, {"rows": rows, "devices": devices})
+            else:
+                cur.execute(statement)
+        heap = total = 0
+        for table in layout["tables"]:
+            cur.execute("VACUUM ANALYZE " + table)
+            cur.execute("SELECT pg_relation_size(%s), pg_total_relation_size(%s)", (table, table))
+            table_heap, table_total = cur.fetchone()
+            heap += table_heap
+            total += table_total
+        cur.execute("SELECT relpages FROM pg_class WHERE relname = %s", (layout["tables"][0],))
+        rows_per_page = rows / max(cur.fetchone()[0], 1)
+        scan(cur, layout["scan"])  # warm
+        scan_ms, pages = scan(cur, layout["scan"])
+        # Prepared like the API's psycopg 3 connections prepare repeated statements, so
+        # this times execution, not planning the joins.
+        cur.execute("PREPARE lookup (BIGINT) AS " + layout["lookup"].replace("%s", "$1"))
+        timings = []
+        for transaction_id in sample:
+            started = time.perf_counter()
+            cur.execute("EXECUTE lookup (%s)", (transaction_id,))
+            cur.fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        cur.execute("DEALLOCATE lookup")
+        timings.sort()
+        print(
+            f"{name:<16}{heap / 2 ** 20:>9.1f}{total / 2 ** 20:>10.1f}{rows_per_page:>11.1f}{scan_ms:>9.1f}{pages:>9}"
+            f"{percentile(timings, 0.5):>12.3f}{percentile(timings, 0.95):>8.3f}"
+        )
+        if baseline is None:
+            baseline = total
+        else:
+            print(f"total size: {total / baseline:.0%} of inline")
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--devices", type=int, default=1000, help="Distinct device payloads")
+    parser.add_argument("--lookups", type=int, default=1000, help="Point lookups per layout")
+    args = parser.parse_args()
+    main(args.rows, args.devices, args.lookups)
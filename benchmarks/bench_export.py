@@ -0,0 +1,101 @@
+"""
+Bulk history pulls: the JSON array of /search_transaction_by_date_range, its NDJSON
+stream, and /transactions/export as Arrow IPC and Parquet, over the same date range.
+
+Tops the Transactions table of DATABASE_URL up to --rows synthetic rows, then reads
+--days of them through each path in-process over ASGI and reports throughput, bytes
+and how much the process's peak RSS grew (Linux only), the memory an export costs.
+
+    python benchmarks/bench_export.py --rows 3000000 --days 365
+"""
+import argparse
+import asyncio
+import logging
+import os
+import secrets
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import psycopg2
+
+from common import SEED_START, seed_transactions
+from server import queries
+from server.utils.utils import hash_key
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+PATHS = {
+    "json array": ("/search_transaction_by_date_range", {}),
+    "ndjson stream": ("/search_transaction_by_date_range", {"stream": "true"}),
+    "arrow": ("/transactions/export", {"format": "arrow"}),
+    "parquet": ("/transactions/export", {"format": "parquet"}),
+}
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")  # resets VmHWM to the current RSS
+    except OSError:
+        pass
+
+
+async def run(args):
+    conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+    seed_transactions(conn, args.rows)
+    cur = conn.cursor()
+    api_key = secrets.token_urlsafe(32)
+    cur.execute(queries.INSERT_KEY, (hash_key(api_key),))
+    conn.commit()
+
+    start = datetime.fromisoformat(SEED_START)
+    date_range = {"start_date": start.isoformat(), "end_date": (start + timedelta(days=args.days)).isoformat()}
+    cur.execute("SELECT count(*) FROM Transactions WHERE timestamp >= %(start_date)s AND timestamp <= %(end_date)s", date_range)
+    rows = cur.fetchone()[0]
+
+    from server import async_database
+    from server.app import app
+    await async_database.open_pool()
+    transport = httpx.ASGITransport(app=app)
+    print(f"{rows} rows in {args.days} days")
+    print(f"{'path':<16}{'seconds':>9}{'rows/s':>11}{'MB':>9}{'peak RSS +MB':>14}")
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers={"access_token": api_key}, timeout=None) as client:
+            for name in args.paths:
+                path, params = PATHS[name]
+                reset_peak_rss()
+                baseline = peak_rss_mb()
+                size = 0
+                started = time.perf_counter()
+                async with client.stream("GET", path, params=dict(date_range, **params)) as response:
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                elapsed = time.perf_counter() - started
+                growth = peak_rss_mb() - baseline if baseline is not None else float("nan")
+                print(f"{name:<16}{elapsed:>9.2f}{rows / elapsed:>11.0f}{size / 2 ** 20:>9.1f}{growth:>14.1f}")
+    finally:
+        await async_database.close_pool()
+        cur.execute(queries.DELETE_KEY, (hash_key(api_key),))
+        conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Seed Transactions up to this many rows")
+    parser.add_argument("--days", type=int, default=90, help="Days of seeded history to export")
+    parser.add_argument("--paths", default=",".join(PATHS), help=f"Comma-separated subset of: {', '.join(PATHS)}")
+    args = parser.parse_args()
+    args.paths = args.paths.split(",")
+    asyncio.run(run(args))
@@ -0,0 +1,145 @@
+"""
+Range queries as history grows: an unpartitioned table against one range partitioned by
+month, like Transactions (migration 8, server/partitions.py).
+
+Builds both in temporary tables of DATABASE_URL with the Transactions columns and its
+(timestamp, id) index, holding --per-day rows a day. History grows backwards in steps
+(--years), so the newest month, where the queries run, stays the same; after each step
+the same queries are timed on both tables through psycopg 3 like the API, and finally
+dropping the oldest month is timed: DELETE against DETACH and DROP. Nothing is left behind.
+
+    python benchmarks/bench_partitions.py --per-day 2000 --years 1,2,4
+"""
+import argparse
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import psycopg
+
+from common import percentile
+from server.partitions import bucket, buckets_between, partition_name
+
+NEWEST = datetime(2025, 1, 1)  # history ends here, and grows backwards from it
+
+COLUMNS = """
+    id BIGINT NOT NULL,
+    transaction_id BIGINT,
+    type VARCHAR(50) NOT NULL,
+    timestamp TIMESTAMP NOT NULL,
+    origin_user_id VARCHAR(50),
+    destination_user_id VARCHAR(50),
+    origin_amount NUMERIC NOT NULL,
+    origin_currency VARCHAR(3) NOT NULL,
+    origin_country VARCHAR(2),
+    destination_amount NUMERIC NOT NULL,
+    destination_currency VARCHAR(3) NOT NULL,
+    destination_country VARCHAR(2),
+    promotion_code_used BOOLEAN,
+    reference VARCHAR(255)
+"""
+
+# Rows g of [first, last], spaced evenly over the day count they stand for, backwards from NEWEST.
+ROWS = """
+    INSERT INTO {table}
+    SELECT g, g, (ARRAY['WITHDRAW', 'DEPOSIT', 'TRANSFER', 'EXTERNAL_PAYMENT', 'REFUND', 'OTHER'])[1 + g %% 6],
+        %(newest)s::timestamp - g * %(spacing)s * interval '1 second',
+        (g %% 10007)::text, ((g * 7) %% 10007)::text, round((random() * 2000)::numeric, 2), 'USD', (ARRAY['DE', 'IN', 'US'])[1 + g %% 3],
+        round((random() * 2000)::numeric, 2), 'USD', 'US', false, 'seed'
+    FROM generate_series(%(first)s::bigint, %(last)s::bigint) g
+"""
+
+# Newest day and week of history; the same rows whatever the table size.
+DAY = (NEWEST - timedelta(days=2), NEWEST - timedelta(days=1))
+WEEK = (NEWEST - timedelta(days=9), NEWEST - timedelta(days=2))
+
+QUERIES = {
+    "day page": ("SELECT * FROM {table} WHERE timestamp >= %s AND timestamp <= %s ORDER BY timestamp, id LIMIT 100", DAY),
+    "week summary": ("SELECT type, count(*), sum(origin_amount) FROM {table} WHERE timestamp >= %s AND timestamp <= %s GROUP BY type", WEEK),
+    "week by country": ("SELECT count(*) FROM {table} WHERE timestamp >= %s AND timestamp <= %s AND origin_country = 'DE'", WEEK),
+}
+
+
+def grow(conn, rows_before: int, rows_after: int, spacing: float):
+    oldest = NEWEST - timedelta(seconds=rows_after * spacing)
+    newest_of_step = NEWEST - timedelta(seconds=(rows_before + 1) * spacing)
+    for start, end in sorted(buckets_between(oldest, newest_of_step, "month")):
+        name = partition_name(start)
+        conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {name} PARTITION OF parted FOR VALUES FROM ('{start}') TO ('{end}')")
+    params = {"newest": NEWEST, "spacing": spacing, "first": rows_before + 1, "last": rows_after}
+    for table in ("flat", "parted"):
+        conn.execute(ROWS.format(table=table), params)
+        conn.execute(f"ANALYZE {table}")
+
+
+def time_query(conn, query: str, params: tuple, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)
+
+
+def size_mb(conn, table: str) -> float:
+    # Partitions and their indexes included; pg_partition_tree() is empty for a plain table.
+    return conn.execute(
+        "SELECT coalesce(sum(pg_total_relation_size(relid)), pg_total_relation_size(%s::regclass))"
+        " FROM pg_partition_tree(%s::regclass) WHERE isleaf",
+        (table, table),
+    ).fetchone()[0] / 2 ** 20
+
+
+def drop_oldest_month(conn, rows: int, spacing: float) -> dict:
+    oldest = NEWEST - timedelta(seconds=rows * spacing)
+    start, end = bucket(oldest, "month")
+    timings = {}
+    with conn.transaction(force_rollback=True):
+        started = time.perf_counter()
+        conn.execute("DELETE FROM flat WHERE timestamp >= %s AND timestamp < %s", (start, end))
+        timings["flat"] = (time.perf_counter() - started) * 1000
+    with conn.transaction(force_rollback=True):
+        started = time.perf_counter()
+        conn.execute(f"ALTER TABLE parted DETACH PARTITION {partition_name(start)}")
+        conn.execute(f"DROP TABLE {partition_name(start)}")
+        timings["parted"] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+def main(per_day: int, years: list, runs: int):
+    conn = psycopg.connect(os.getenv("DATABASE_URL"), autocommit=True)
+    conn.execute("SET temp_buffers = '2GB'")
+    conn.execute(f"CREATE TEMP TABLE flat ({COLUMNS})")
+    conn.execute(f"CREATE TEMP TABLE parted ({COLUMNS}) PARTITION BY RANGE (timestamp)")
+    for table in ("flat", "parted"):
+        conn.execute(f"CREATE INDEX ON {table} (timestamp, id) INCLUDE (type, origin_amount)")
+    spacing = 86400 / per_day
+
+    print(f"{per_day} rows a day; median / p95 ms over {runs} runs")
+    print(f"{'years':>5}{'rows':>11}{'table':>8}{'MB':>8}" + "".join(f"{name:>22}" for name in QUERIES))
+    rows = 0
+    for year in years:
+        target = int(year * 365 * per_day)
+        grow(conn, rows, target, spacing)
+        rows = target
+        for table in ("flat", "parted"):
+            cells = []
+            for query, params in QUERIES.values():
+                sql = query.format(table=table)
+                time_query(conn, sql, params, 5)  # warm the cache and let psycopg prepare it
+                timings = time_query(conn, sql, params, runs)
+                cells.append(f"{statistics.median(timings):>13.2f} / {percentile(timings, 0.95):>5.2f}")
+            print(f"{year:>5}{rows:>11}{table:>8}{size_mb(conn, table):>8.0f}" + "".join(cells))
+    timings = drop_oldest_month(conn, rows, spacing)
+    print(f"drop the oldest month: DELETE {timings['flat']:.0f} ms, DETACH + DROP {timings['parted']:.0f} ms")
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--per-day", type=int, default=2000, help="Rows per day of history")
+    parser.add_argument("--years", default="1,2,4", help="Comma-separated history sizes to measure, in years")
+    parser.add_argument("--runs", type=int, default=200, help="Timed runs per query")
+    args = parser.parse_args()
+    main(args.per_day, [float(year) for year in args.years.split(",")], args.runs)
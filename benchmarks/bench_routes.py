@@ -0,0 +1,327 @@
+"""
+Throughput and latency of every route in server/routes/transaction.py.
+
+Tops the Transactions table of DATABASE_URL up to --rows synthetic rows, registers a
+temporary API key, then drives each scenario with every --concurrency level and
+writes throughput and p50/p95/p99 latency to a JSON file. Compare two runs with
+benchmarks/compare.py.
+
+By default the app runs in-process over ASGI (one worker, no network). Pass
+--base-url to benchmark a running server instead; it must use the same database.
+
+    python benchmarks/bench_routes.py --rows 1000000 --concurrency 1,16,64
+    python benchmarks/bench_routes.py --base-url http://localhost:8000 --scenarios search_by_type,summary_month
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import secrets
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import psycopg2
+
+from common import SEED_INTERVAL_SECONDS, SEED_START, SEED_TYPES, SEED_USERS, seed_transactions, summarize
+from server import queries
+from server.utils.ids import IdGenerator
+from server.utils.utils import hash_key
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+class Fixture:
+    """
+    What the scenarios draw their parameters from: the seeded time range, a sample
+    of seeded transaction ids and amounts, and an id generator for bulk rows.
+    """
+
+    def __init__(self, conn):
+        cur = conn.cursor()
+        cur.execute(queries.NEXT_ID_WORKER)
+        self.ids = IdGenerator(cur.fetchone()[0])
+        cur.execute("SELECT reltuples::BIGINT FROM pg_class WHERE relname = 'transactions'")
+        estimate = max(cur.fetchone()[0], 1)
+        cur.execute(
+            "SELECT transaction_id, origin_amount FROM Transactions TABLESAMPLE BERNOULLI (%s) WHERE reference = 'seed' LIMIT 1000",
+            (min(100.0, 100.0 * 2000 / estimate),),
+        )
+        sample = cur.fetchall() or [(0, 0)]
+        cur.execute("SELECT count(*) FROM Transactions WHERE reference = 'seed'")
+        seeded = max(cur.fetchone()[0], 1)
+        cur.close()
+        self.transaction_ids = [int(row[0]) for row in sample]
+        self.amounts = [float(row[1]) for row in sample]
+        self.start = datetime.fromisoformat(SEED_START)
+        self.span = timedelta(seconds=seeded * SEED_INTERVAL_SECONDS)
+
+    def instant(self, width: timedelta) -> datetime:
+        room = max((self.span - width).total_seconds(), 0)
+        return self.start + timedelta(seconds=random.uniform(0, room))
+
+    def date_range(self, width: timedelta) -> dict:
+        start = self.instant(width)
+        return {"start_date": start.isoformat(), "end_date": (start + width).isoformat()}
+
+
+def transaction_row(transaction_id: int) -> dict:
+    amount = {"transactionAmount": round(random.uniform(1, 2000), 2), "transactionCurrency": "USD", "country": "US"}
+    return {
+        "type": random.choice(SEED_TYPES),
+        "transactionId": transaction_id,
+        "timestamp": datetime.now().isoformat(),
+        "originUserId": str(random.randrange(SEED_USERS)),
+        "destinationUserId": str(random.randrange(SEED_USERS)),
+        "originAmountDetails": amount,
+        "destinationAmountDetails": amount,
+    }
+
+
+# Each scenario performs one operation; its latency is one sample. Read scenarios pick
+# fresh parameters every call so they are not answered from a single hot page.
+
+async def get_transaction(client, fixture):
+    return await client.get(f"/get_transactions/{random.choice(fixture.transaction_ids)}")
+
+
+async def create_transaction(client, fixture):
+    return await client.post("/create_transactions", json={
+        "amount": round(random.uniform(1, 2000), 2),
+        "sender_id": str(random.randrange(SEED_USERS)),
+        "destination_id": str(random.randrange(SEED_USERS)),
+        "type": random.choice(SEED_TYPES),
+        "currency": "USD",
+        "country": "US",
+    })
+
+
+async def bulk_ndjson_100(client, fixture):
+    body = "\n".join(json.dumps(transaction_row(fixture.ids.next_id())) for _ in range(100))
+    return await client.post("/transactions/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+
+async def search_by_amount(client, fixture):
+    return await client.get("/search_transaction_by_amount", params={"amount": random.choice(fixture.amounts)})
+
+
+async def search_by_date_range_day(client, fixture):
+    params = dict(fixture.date_range(timedelta(days=1)), limit=100)
+    return await client.get("/search_transaction_by_date_range", params=params)
+
+
+async def search_by_type(client, fixture):
+    params = {"type": random.choice(SEED_TYPES), "limit": 100}
+    return await client.get("/search_transaction_by_type", params=params)
+
+
+async def search_by_type_second_page(client, fixture):
+    params = {"type": random.choice(SEED_TYPES), "limit": 100}
+    first = await client.get("/search_transaction_by_type", params=params)
+    cursor = first.json().get("next_cursor") if first.status_code == 200 else None
+    if not cursor:
+        return first
+    return await client.get("/search_transaction_by_type", params=dict(params, cursor=cursor))
+
+
+async def stream_date_range_hour(client, fixture):
+    params = dict(fixture.date_range(timedelta(hours=1)), stream="true")
+    async with client.stream("GET", "/search_transaction_by_date_range", params=params) as response:
+        async for _ in response.aiter_bytes():
+            pass
+    return response
+
+
+async def search_advanced_user(client, fixture):
+    params = {"user_id": str(random.randrange(SEED_USERS)), "sort_order": "desc", "limit": 100}
+    return await client.get("/transactions/search_advanced", params=params)
+
+
+async def search_advanced_type_week(client, fixture):
+    params = dict(fixture.date_range(timedelta(days=7)), type=random.choice(SEED_TYPES), limit=100)
+    return await client.get("/transactions/search_advanced", params=params)
+
+
+async def summary_month(client, fixture):
+    return await client.get("/transactions/summary", params=fixture.date_range(timedelta(days=30)))
+
+
+async def total_amount_month(client, fixture):
+    return await client.get("/transactions/total_amount", params=fixture.date_range(timedelta(days=30)))
+
+
+async def summary_all(client, fixture):
+    params = {"start_date": fixture.start.isoformat(), "end_date": (fixture.start + fixture.span).isoformat()}
+    return await client.get("/transactions/summary", params=params)
+
+
+async def cron_status(client, fixture):
+    return await client.get("/cron/status")
+
+
+async def cron_start_stop(client, fixture):
+    started = await client.post("/cron/start", json={"rate": 1})
+    if started.status_code != 200:
+        return started
+    return await client.post("/cron/stop")
+
+
+SCENARIOS = {
+    "get_transaction": get_transaction,
+    "create_transaction": create_transaction,
+    "bulk_ndjson_100": bulk_ndjson_100,
+    "search_by_amount": search_by_amount,
+    "search_by_date_range_day": search_by_date_range_day,
+    "search_by_type": search_by_type,
+    "search_by_type_second_page": search_by_type_second_page,
+    "stream_date_range_hour": stream_date_range_hour,
+    "search_advanced_user": search_advanced_user,
+    "search_advanced_type_week": search_advanced_type_week,
+    "summary_month": summary_month,
+    "total_amount_month": total_amount_month,
+    "summary_all": summary_all,
+    "cron_status": cron_status,
+    "cron_start_stop": cron_start_stop,
+}
+
+# Toggling the shared generator from many clients at once measures lock-step no-ops.
+SERIAL_SCENARIOS = {"cron_start_stop"}
+
+
+async def client_loop(client, scenario, fixture, remaining: list, latencies: list, errors: list):
+    while remaining:
+        remaining.pop()
+        started = time.perf_counter()
+        try:
+            response = await scenario(client, fixture)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(1)
+
+
+async def run_scenario(client, scenario, fixture, concurrency: int, requests: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        await scenario(client, fixture)
+    remaining = list(range(requests))
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        client_loop(client, scenario, fixture, remaining, latencies, errors) for _ in range(concurrency)
+    ))
+    return summarize(latencies, time.perf_counter() - started, len(errors))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+async def run(args) -> dict:
+    conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+    seed_transactions(conn, args.rows)
+    fixture = Fixture(conn)
+    cur = conn.cursor()
+    cur.execute("SELECT count(*) FROM Transactions")
+    table_rows = cur.fetchone()[0]
+    cur.execute("SHOW server_version")
+    server_version = cur.fetchone()[0]
+
+    api_key = secrets.token_urlsafe(32)
+    cur.execute(queries.INSERT_KEY, (hash_key(api_key),))
+    conn.commit()
+
+    headers = {"access_token": api_key}
+    if args.base_url:
+        transport, base_url, app = None, args.base_url, None
+    else:
+        from server import async_database
+        from server.app import app
+        from server.utils.ids import id_generator
+        await async_database.open_pool()
+        id_generator.worker_id = await async_database.lease_id_worker()
+        transport, base_url = httpx.ASGITransport(app=app), "http://bench"
+
+    results = []
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency))
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+            for name in args.scenarios:
+                for concurrency in args.concurrency:
+                    if name in SERIAL_SCENARIOS and concurrency > 1:
+                        continue
+                    result = await run_scenario(client, SCENARIOS[name], fixture, concurrency, args.requests, args.warmup)
+                    result = dict(scenario=name, concurrency=concurrency, **result)
+                    results.append(result)
+                    print(
+                        f"{name:<28}{concurrency:>5}{result.get('throughput') or 0:>10.1f}"
+                        f"{result.get('p50_ms', 0):>10.2f}{result.get('p95_ms', 0):>10.2f}"
+                        f"{result.get('p99_ms', 0):>10.2f}{result['errors']:>7}"
+                    )
+    finally:
+        if app is not None:
+            await async_database.close_pool()
+        cur.execute(queries.DELETE_KEY, (hash_key(api_key),))
+        conn.commit()
+        conn.close()
+
+    return {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "target": args.base_url or "asgi",
+            "rows": table_rows,
+            "requests_per_scenario": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+            "postgres": server_version,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000, help="Seed Transactions up to this many rows (1e4 to 1e7)")
+    parser.add_argument("--concurrency", default="1,16", help="Comma-separated concurrent client counts")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario and concurrency level")
+    parser.add_argument("--warmup", type=int, default=10, help="Unrecorded requests before each measurement")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--base-url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--output", help="Result file; defaults to benchmarks/results/routes-<rows>-<time>.json")
+    args = parser.parse_args()
+    args.concurrency = [int(value) for value in args.concurrency.split(",")]
+    args.scenarios = [name.strip() for name in args.scenarios.split(",")]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    print(f"{'scenario':<28}{'conc':>5}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>7}")
+    report = asyncio.run(run(args))
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"routes-{args.rows}-{datetime.now().strftime('%Y%m%dT%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Cost of the rule engine (server/rules.py): assessing one transaction inline as it is
+stored, and re-scoring stored history in bulk, for rule sets of growing size.
+
+The default rules are padded with generated ones up to each --rules size. Inline cost
+is timed per call over --transactions synthetic transactions. Bulk re-scoring is timed
+on the first --days of seeded history in DATABASE_URL, which is topped up to --rows
+rows, inside a transaction that is rolled back: nothing is left behind.
+
+    python benchmarks/bench_rules.py --rules 3,30,300 --days 7
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+
+from common import SEED_START, percentile, seed_transactions
+from server import rules
+
+TYPES = ["WITHDRAW", "DEPOSIT", "TRANSFER", "EXTERNAL_PAYMENT", "REFUND", "OTHER"]
+CURRENCIES = ["EUR", "USD", "INR"]
+
+
+def rule_set(size: int) -> list:
+    definitions = rules.load_rules()
+    rng = random.Random(5)
+    for i in range(len(definitions), size):
+        definitions.append(rules.RuleDefinition(
+            ruleId=f"generated-{i}",
+            ruleName=f"Generated rule {i}",
+            score=rng.choice([5, 10, 20]),
+            conditions=[
+                {"field": "type", "op": "in", "value": rng.sample(TYPES, 2)},
+                {"field": "origin_currency", "op": "==", "value": rng.choice(CURRENCIES)},
+                {"field": "origin_amount", "op": ">=", "value": rng.randrange(100, 2000)},
+            ],
+        ))
+    return definitions
+
+
+def transactions(count: int) -> list:
+    rng = random.Random(7)
+    result = []
+    for _ in range(count):
+        details = {"transactionAmount": round(rng.uniform(1, 2000), 2), "transactionCurrency": rng.choice(CURRENCIES), "country": "DE"}
+        result.append({
+            "type": rng.choice(TYPES), "timestamp": datetime.now(), "originUserId": "1", "destinationUserId": "2",
+            "originAmountDetails": details, "destinationAmountDetails": details,
+        })
+    return result
+
+
+def main(args):
+    conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+    seed_transactions(conn, args.rows)
+    cur = conn.cursor()
+    start = datetime.fromisoformat(SEED_START)
+    end = start + timedelta(days=args.days)
+    cur.execute("SELECT count(*) FROM Transactions WHERE timestamp >= %s AND timestamp < %s", (start, end))
+    rows = cur.fetchone()[0]
+    conn.rollback()
+    sample = transactions(args.transactions)
+
+    print(f"inline: {args.transactions} transactions; bulk: {rows} rows in {args.days} days")
+    print(f"{'rules':>6}{'compile ms':>12}{'median us':>11}{'p99 us':>9}{'hits/txn':>10}{'bulk rows/s':>13}")
+    for size in args.rules:
+        definitions = rule_set(size)
+        started = time.perf_counter()
+        engine = rules.RuleEngine(definitions)
+        compile_ms = (time.perf_counter() - started) * 1000
+
+        timings, hits = [], 0
+        for transaction in sample:
+            started = time.perf_counter_ns()
+            hit_rules, _, _ = engine.assess(transaction)
+            timings.append((time.perf_counter_ns() - started) / 1000)
+            hits += len(hit_rules)
+        timings.sort()
+
+        started = time.perf_counter()
+        updated = engine.rescore_window(cur, start, end)
+        elapsed = time.perf_counter() - started
+        conn.rollback()
+        print(f"{size:>6}{compile_ms:>12.1f}{statistics.median(timings):>11.1f}{percentile(timings, 0.99):>9.1f}"
+              f"{hits / len(sample):>10.2f}{updated / elapsed:>13.0f}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", default="3,30,300", help="Comma-separated rule set sizes")
+    parser.add_argument("--transactions", type=int, default=100_000, help="Synthetic transactions assessed inline")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Seed Transactions up to this many rows")
+    parser.add_argument("--days", type=int, default=7, help="Days of seeded history re-scored in bulk")
+    args = parser.parse_args()
+    args.rules = [int(size) for size in args.rules.split(",")]
+    main(args)
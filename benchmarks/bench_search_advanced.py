@@ -0,0 +1,64 @@
+"""
+Latency of /transactions/search_advanced queries for mixed filter combinations.
+
+Tops the Transactions table of DATABASE_URL up to --rows synthetic rows, then runs
+each filter combination --repeat times through the same query builder the route
+uses and reports p50/p95 latency and whether the plan used an index.
+
+    python benchmarks/bench_search_advanced.py --rows 1000000
+"""
+import argparse
+import os
+import time
+
+import psycopg2
+
+from common import percentile, seed_transactions
+from server import queries
+
+COMBINATIONS = [
+    ("type + month", {"type": "DEPOSIT", "start_date": "2024-03-01", "end_date": "2024-04-01"}, {}),
+    ("amount range", {"min_amount": 100, "max_amount": 101}, {"sort_by": "origin_amount"}),
+    ("exact amount + type", {"amount": 1500, "type": "REFUND"}, {}),
+    ("user", {"user_id": "42"}, {"descending": True}),
+    ("user + country + range", {"user_id": "42", "country": "US", "start_date": "2024-01-01", "end_date": "2024-06-01"}, {}),
+    ("day, by amount desc", {"start_date": "2024-02-01", "end_date": "2024-02-02"}, {"sort_by": "origin_amount", "descending": True}),
+    ("no filters", {}, {}),
+]
+
+
+def plan_uses_index(plan: dict) -> bool:
+    if "Index" in plan["Node Type"]:
+        return True
+    return any(plan_uses_index(child) for child in plan.get("Plans", []))
+
+
+def main(rows: int, repeat: int, limit: int):
+    conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+    seed_transactions(conn, rows)
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    print(f"{'combination':<26}{'p50 ms':>10}{'p95 ms':>10}  index")
+    for name, filters, options in COMBINATIONS:
+        query, params = queries.advanced_search_query(filters, limit=limit, **options)
+        cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+        uses_index = plan_uses_index(cur.fetchone()[0][0]["Plan"])
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cur.execute(query, params)
+            cur.fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        print(f"{name:<26}{percentile(timings, 0.5):>10.2f}{percentile(timings, 0.95):>10.2f}  {uses_index}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+    main(args.rows, args.repeat, args.limit)
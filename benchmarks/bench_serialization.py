@@ -0,0 +1,93 @@
+"""
+Bytes per second of response serialization: jsonable_encoder + JSONResponse, the
+default FastAPI path, against the orjson path of server/utils/serialization.py.
+
+Encodes synthetic search results and full transaction rows, with the same value
+types psycopg returns (Decimal, datetime, dicts from JSONB), and checks that both
+paths produce the same JSON. No database needed.
+
+    python benchmarks/bench_serialization.py --rows 100,1000,10000
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import common  # noqa: F401  (puts src/ on sys.path)
+from server.routes.transaction import format_search_result
+from server.rows import compile_mapper
+from server.utils.serialization import FastJSONResponse
+
+COLUMNS = (
+    "id", "transaction_id", "type", "timestamp", "origin_user_id", "destination_user_id",
+    "origin_amount", "origin_currency", "origin_country", "destination_amount", "destination_currency",
+    "destination_country", "promotion_code_used", "reference", "origin_device_data", "destination_device_data", "tags",
+)
+
+
+def make_rows(count: int) -> list:
+    rng = random.Random(count)
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        amount = Decimal(rng.randrange(100, 200000)) / 100
+        rows.append((
+            i + 1, Decimal(10 ** 9 + i), rng.choice(["DEPOSIT", "TRANSFER", "REFUND"]),
+            start + timedelta(seconds=30 * i, microseconds=rng.randrange(10 ** 6)),
+            str(rng.randrange(10007)), str(rng.randrange(10007)),
+            amount, "USD", "US", amount, "USD", "DE", False, "seed",
+            {"ipAddress": "10.23.191.2", "batteryLevel": 95.0, "vpnUsed": False},
+            {"ipAddress": "10.23.191.3", "batteryLevel": 41.5, "vpnUsed": True},
+            [{"key": "customKey", "value": "customValue"}],
+        ))
+    return rows
+
+
+def old_path(content) -> bytes:
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def new_path(content) -> bytes:
+    return FastJSONResponse(content).body
+
+
+def measure(encode, content, min_seconds: float) -> tuple:
+    runs, elapsed = 0, 0.0
+    started = time.perf_counter()
+    while elapsed < min_seconds:
+        body = encode(content)
+        runs += 1
+        elapsed = time.perf_counter() - started
+    return len(body) * runs / elapsed, elapsed / runs
+
+
+def main(sizes: list, min_seconds: float):
+    print(f"{'payload':<24}{'rows':>7}{'bytes':>10}{'old MB/s':>10}{'new MB/s':>10}{'old ms':>9}{'new ms':>9}{'speedup':>9}")
+    for count in sizes:
+        mapper = compile_mapper(COLUMNS)
+        rows = [mapper(row) for row in make_rows(count)]
+        payloads = {
+            "search page": {"transactions": [format_search_result(row) for row in rows], "next_cursor": "abc"},
+            "full transactions": rows,
+        }
+        for name, content in payloads.items():
+            assert json.loads(old_path(content)) == json.loads(new_path(content)), name
+            old_rate, old_time = measure(old_path, content, min_seconds)
+            new_rate, new_time = measure(new_path, content, min_seconds)
+            print(
+                f"{name:<24}{count:>7}{len(new_path(content)):>10}{old_rate / 1e6:>10.1f}{new_rate / 1e6:>10.1f}"
+                f"{old_time * 1000:>9.2f}{new_time * 1000:>9.2f}{new_rate / old_rate:>8.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="100,1000,10000", help="Comma-separated result sizes")
+    parser.add_argument("--seconds", type=float, default=1.0, help="Minimum time per measurement")
+    args = parser.parse_args()
+    main([int(size) for size in args.rows.split(",")], args.seconds)
@@ -0,0 +1,74 @@
+"""
+Cold start of the API: how long a fresh process takes to import server.app and to run
+its lifespan startup (pool, cache, id worker lease) against DATABASE_URL, and which
+imports the time goes to, from python -X importtime.
+
+Every run is a new interpreter, so nothing is cached in memory between runs.
+
+    python benchmarks/bench_startup.py --runs 10 --top 15
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+STARTUP = """
+import asyncio, time
+started = time.perf_counter()
+from server.app import app
+imported = time.perf_counter()
+
+async def lifespan():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+ready = asyncio.run(lifespan())
+print(imported - started, ready - imported)
+"""
+
+
+def run_startup() -> tuple:
+    output = subprocess.run([sys.executable, "-c", STARTUP], cwd=SRC, capture_output=True, text=True, check=True).stdout
+    imported, ready = output.split()[-2:]
+    return float(imported) * 1000, float(ready) * 1000
+
+
+def import_profile() -> list:
+    # (module, self us, cumulative us) for every module server.app imports.
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server.app"], cwd=SRC, capture_output=True, text=True, check=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def main(runs: int, top: int):
+    timings = [run_startup() for _ in range(runs)]
+    for label, values in (("import server.app", [t[0] for t in timings]), ("lifespan startup", [t[1] for t in timings])):
+        print(f"{label:<20} median {statistics.median(values):>7.1f} ms   min {min(values):>7.1f} ms")
+
+    modules = import_profile()
+    packages = defaultdict(int)
+    for name, self_us, _ in modules:
+        packages[name.split(".")[0]] += self_us
+    print(f"\n{'package':<24}{'self ms':>9}")
+    for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"{name:<24}{self_us / 1000:>9.1f}")
+    print(f"\n{'module':<48}{'cumulative ms':>14}")
+    for name, _, cumulative_us in sorted(modules, key=lambda module: -module[2])[:top]:
+        print(f"{name:<48}{cumulative_us / 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes to time")
+    parser.add_argument("--top", type=int, default=15, help="Packages and modules to list")
+    args = parser.parse_args()
+    main(args.runs, args.top)
@@ -0,0 +1,114 @@
+"""
+Per-user velocity (server/velocity.py): looking a user up in the in-memory store against
+the same counts and volumes aggregated in PostgreSQL, the cost of rebuilding the store,
+and what the notifying insert trigger adds to a single row insert.
+
+Tops the Transactions table of DATABASE_URL up to --rows synthetic rows and takes the
+end of the seeded history as "now". Lookups are timed for --lookups random seeded users.
+Inserts are timed with the trigger enabled and disabled, in transactions that are rolled
+back: nothing is left behind, and the cost of queueing the notifications at commit is not
+included.
+
+    python benchmarks/bench_velocity.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+
+from common import SEED_INTERVAL_SECONDS, SEED_START, SEED_USERS, percentile, seed_transactions
+from server import queries, velocity
+
+USER_VELOCITY = """
+    SELECT count(*) FILTER (WHERE timestamp > %(now)s - interval '1 hour'),
+           sum(origin_amount) FILTER (WHERE timestamp > %(now)s - interval '1 hour'),
+           count(*) FILTER (WHERE timestamp > %(now)s - interval '24 hours'),
+           sum(origin_amount) FILTER (WHERE timestamp > %(now)s - interval '24 hours'),
+           count(*), sum(origin_amount)
+    FROM Transactions
+    WHERE origin_user_id = %(user_id)s AND timestamp > %(now)s - interval '7 days' AND timestamp <= %(now)s
+"""
+
+INSERT = """
+    INSERT INTO Transactions (transaction_id, type, timestamp, origin_user_id, origin_amount, origin_currency, destination_amount, destination_currency)
+    VALUES (%s, 'DEPOSIT', localtimestamp, %s, 10, 'USD', 10, 'USD')
+"""
+
+
+def summarize(timings: list) -> str:
+    timings.sort()
+    return f"{statistics.median(timings):>10.1f}{percentile(timings, 0.99):>10.1f}"
+
+
+def main(args):
+    conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+    seed_transactions(conn, args.rows)
+    cur = conn.cursor()
+    cur.execute("SELECT count(*) FROM Transactions WHERE timestamp >= %s", (SEED_START,))
+    now = datetime.fromisoformat(SEED_START) + timedelta(seconds=cur.fetchone()[0] * SEED_INTERVAL_SECONDS)
+    seconds = velocity.epoch_seconds(now)
+
+    started = time.perf_counter()
+    cur.execute(queries.VELOCITY_HISTORY, (now - timedelta(seconds=velocity.LONGEST_WINDOW_SECONDS),))
+    history = cur.fetchall()
+    queried = time.perf_counter() - started
+    store = velocity.VelocityStore()
+    started = time.perf_counter()
+    for user_id, minute, count, amount in history:
+        store.record(user_id, minute, count, amount)
+    recorded = time.perf_counter() - started
+    conn.rollback()
+    per_user = sum(sys.getsizeof(rings) for rings in store._users.values()) / max(len(store), 1)
+    print(f"rebuild: {len(history)} (user, minute) rows in {queried * 1000:.0f} ms + {recorded * 1000:.0f} ms recorded, "
+          f"{len(store)} users, {per_user:.0f} bytes of rings per user")
+
+    rng = random.Random(3)
+    users = [str(rng.randrange(SEED_USERS)) for _ in range(args.lookups)]
+    memory, repeated, postgres = [], [], []
+    for user_id in users:
+        # The first lookup of a user also expires its old buckets.
+        started = time.perf_counter_ns()
+        windows = store.get(user_id, seconds)
+        memory.append((time.perf_counter_ns() - started) / 1000)
+        started = time.perf_counter_ns()
+        store.get(user_id, seconds)
+        repeated.append((time.perf_counter_ns() - started) / 1000)
+        started = time.perf_counter_ns()
+        cur.execute(USER_VELOCITY, {"user_id": user_id, "now": now})
+        row = cur.fetchone()
+        postgres.append((time.perf_counter_ns() - started) / 1000)
+        if args.check and windows["7d"]["count"] != row[4]:
+            print(f"user {user_id}: 7d count {windows['7d']['count']} in memory, {row[4]} in PostgreSQL")
+    conn.rollback()
+    print(f"\n{'lookup':<16}{'median us':>10}{'p99 us':>10}")
+    print(f"{'memory, first':<16}{summarize(memory)}")
+    print(f"{'memory, again':<16}{summarize(repeated)}")
+    print(f"{'postgres':<16}{summarize(postgres)}")
+
+    print(f"\n{'insert':<16}{'median us':>10}{'p99 us':>10}")
+    for label, enabled in (("no trigger", False), ("with trigger", True)):
+        if not enabled:
+            cur.execute("ALTER TABLE Transactions DISABLE TRIGGER transactions_velocity_notify")
+        timings = []
+        for i in range(args.inserts):
+            started = time.perf_counter_ns()
+            cur.execute(INSERT, (-9_000_000 - i, users[i % len(users)]))
+            timings.append((time.perf_counter_ns() - started) / 1000)
+        conn.rollback()
+        print(f"{label:<16}{summarize(timings)}")
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Seed Transactions up to this many rows")
+    parser.add_argument("--lookups", type=int, default=10_000, help="Users looked up in memory and in PostgreSQL")
+    parser.add_argument("--inserts", type=int, default=5_000, help="Single row inserts timed per trigger setting")
+    parser.add_argument("--check", action="store_true", help="Report users whose 7d counts differ")
+    args = parser.parse_args()
+    main(args)
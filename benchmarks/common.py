@@ -0,0 +1,100 @@
+"""
+Helpers shared by the benchmark scripts: seeding Transactions and summarising latencies.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from datetime import datetime, timedelta  # noqa: E402
+
+from server import partitions, queries  # noqa: E402
+from server.devices import DeviceBatch  # noqa: E402
+from server.utils.ids import ID_EPOCH_MS, TIMESTAMP_SHIFT  # noqa: E402
+
+SEED_START = "2024-01-01"
+SEED_INTERVAL_SECONDS = 30
+SEED_CHUNK_ROWS = 1_000_000
+SEED_TYPES = ["WITHDRAW", "DEPOSIT", "TRANSFER", "EXTERNAL_PAYMENT", "REFUND", "OTHER"]
+SEED_USERS = 10007
+SEED_DEVICES = DeviceBatch(skip_known=False)
+SEED_DEVICE_ID = SEED_DEVICES.add({"ipAddress": "10.23.191.2", "batteryLevel": 95.0})
+
+# Row g is at SEED_START + g * 30s, so seeded ranges are predictable for any table size.
+# Its transaction_id is the id utils/ids.py would give it at that time (worker 0, first
+# of its millisecond): seeded timestamps are in the past, so no live worker reuses them.
+SEED = f"""
+    INSERT INTO Transactions (
+        transaction_id, type, timestamp, origin_user_id, destination_user_id,
+        origin_amount, origin_currency, origin_country,
+        destination_amount, destination_currency, destination_country,
+        promotion_code_used, reference, origin_device_id, destination_device_id, tags
+    )
+    SELECT
+        ((extract(epoch FROM timestamp '{SEED_START}' + g * interval '{SEED_INTERVAL_SECONDS} seconds') * 1000)::bigint - {ID_EPOCH_MS}) << {TIMESTAMP_SHIFT},
+        (ARRAY{SEED_TYPES})[1 + g %% 6],
+        timestamp '{SEED_START}' + g * interval '{SEED_INTERVAL_SECONDS} seconds',
+        (g %% {SEED_USERS})::text,
+        ((g * 7) %% {SEED_USERS})::text,
+        round((random() * 2000)::numeric, 2), 'USD', (ARRAY['DE', 'IN', 'US'])[1 + g %% 3],
+        round((random() * 2000)::numeric, 2), 'USD', (ARRAY['DE', 'IN', 'US'])[1 + (g / 3) %% 3],
+        false, 'seed', {SEED_DEVICE_ID}, NULL, '[{{"key": "customKey", "value": "customValue"}}]'
+    FROM generate_series(%(first)s, %(last)s) g
+"""
+
+
+def seed_transactions(conn, rows: int) -> int:
+    """
+    Tops Transactions up to at least `rows` rows, committing every SEED_CHUNK_ROWS.
+
+    :param conn: Open psycopg2 connection.
+    :param rows: Target table size.
+    :return: Number of rows inserted.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT count(*) FROM Transactions")
+    existing = cur.fetchone()[0]
+    missing = max(rows - existing, 0)
+    if missing:
+        cur.execute(queries.INSERT_DEVICES, SEED_DEVICES.params())
+        # Partitions for the seeded range first, so rows do not pile up in the default one.
+        start = datetime.fromisoformat(SEED_START)
+        partitions.create_partitions(cur, partitions.buckets_between(
+            start + timedelta(seconds=(existing + 1) * SEED_INTERVAL_SECONDS),
+            start + timedelta(seconds=(existing + missing) * SEED_INTERVAL_SECONDS),
+        ))
+        conn.commit()
+    for first in range(1, missing + 1, SEED_CHUNK_ROWS):
+        last = min(first + SEED_CHUNK_ROWS - 1, missing)
+        print(f"Seeding rows {existing + first}-{existing + last}...")
+        cur.execute(SEED, {"first": existing + first, "last": existing + last})
+        conn.commit()
+    if missing:
+        cur.execute("ANALYZE Transactions")
+        conn.commit()
+    cur.close()
+    return missing
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(latencies: list, elapsed: float, errors: int = 0) -> dict:
+    """
+    Summarises per-request latencies in seconds as milliseconds plus throughput.
+    """
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"requests": 0, "errors": errors, "elapsed_seconds": elapsed}
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 4),
+        "throughput": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
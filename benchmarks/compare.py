@@ -0,0 +1,65 @@
+"""
+Compares two bench_routes.py result files scenario by scenario.
+
+Prints throughput and p50/p95/p99 latency with the change from the baseline, and
+exits with status 1 when any scenario's p95 or throughput regressed by more than
+--threshold percent, so it can gate CI.
+
+    python benchmarks/compare.py benchmarks/results/before.json benchmarks/results/after.json
+"""
+import argparse
+import json
+import sys
+
+METRICS = [("throughput", "req/s", True), ("p50_ms", "p50", False), ("p95_ms", "p95", False), ("p99_ms", "p99", False)]
+GATED = {"throughput", "p95_ms"}
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        report = json.load(f)
+    return {(result["scenario"], result["concurrency"]): result for result in report["results"]}
+
+
+def change(old, new) -> float:
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list:
+    """
+    Prints one row per scenario present in both runs.
+
+    :return: Descriptions of the gated metrics that regressed beyond the threshold.
+    """
+    regressions = []
+    print(f"{'scenario':<28}{'conc':>5}" + "".join(f"{label:>20}" for _, label, _ in METRICS))
+    for key in sorted(baseline.keys() & candidate.keys()):
+        old, new = baseline[key], candidate[key]
+        cells = []
+        for metric, label, higher_is_better in METRICS:
+            delta = change(old.get(metric), new.get(metric))
+            if delta is None:
+                cells.append(f"{'-':>20}")
+                continue
+            cells.append(f"{new[metric]:>11.2f} ({delta:+6.1f}%)")
+            worse = -delta if higher_is_better else delta
+            if metric in GATED and worse > threshold:
+                regressions.append(f"{key[0]}@{key[1]} {label} {delta:+.1f}%")
+        print(f"{key[0]:<28}{key[1]:>5}" + "".join(cells))
+    for key in sorted(baseline.keys() ^ candidate.keys()):
+        print(f"{key[0]:<28}{key[1]:>5}  only in {'baseline' if key in baseline else 'candidate'}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed regression in percent")
+    args = parser.parse_args()
+    regressions = compare(load(args.baseline), load(args.candidate), args.threshold)
+    if regressions:
+        print("\nRegressions beyond {:.0f}%:\n  ".format(args.threshold) + "\n  ".join(regressions))
+        sys.exit(1)
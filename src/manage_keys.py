@@ -0,0 +1,33 @@
+import argparse
+import secrets
+from server import database
+from server.utils.utils import hash_key
+
+# Manages API keys. Only SHA-256 hashes are stored; a key is shown once, when generated.
+#
+#   python manage_keys.py add [key]     # generates a key when none is given
+#   python manage_keys.py revoke <key>
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add or revoke API keys")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_parser = subparsers.add_parser("add")
+    add_parser.add_argument("key", nargs="?")
+    revoke_parser = subparsers.add_parser("revoke")
+    revoke_parser.add_argument("key")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        key = args.key or secrets.token_urlsafe(32)
+        if database.add_key(hash_key(key)):
+            print(key)
+    elif args.command == "revoke":
+        if database.revoke_key(hash_key(args.key)):
+            print("Key revoked")
+        else:
+            print("Key not found")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import os
+import sys
+import psycopg2
+from server import archive, partitions
+
+# Runs partition maintenance once: creates upcoming partitions, gives rows in the
+# default partition partitions of their own, archives and detaches expired ones. The
+# API does this every PARTITION_CHECK_INTERVAL seconds; run it from cron when no API is
+# running, or to apply a retention right away.
+#
+#   python manage_partitions.py [--retention-days 365] [--archive-after-days 90]
+#   python manage_partitions.py --list
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create upcoming and archive or detach expired Transactions partitions")
+    parser.add_argument("--interval", choices=partitions.INTERVALS, default=partitions.PARTITION_INTERVAL)
+    parser.add_argument("--ahead-days", type=int, default=partitions.PARTITION_AHEAD_DAYS)
+    parser.add_argument("--retention-days", type=int, default=partitions.PARTITION_RETENTION_DAYS)
+    parser.add_argument("--archive-after-days", type=int, default=archive.ARCHIVE_AFTER_DAYS,
+                        help=f"Move older partitions to Parquet files under {archive.ARCHIVE_DIR}")
+    parser.add_argument("--list", action="store_true", help="Only list the partitions")
+    args = parser.parse_args()
+
+    database_url = os.getenv("DATABASE_URL")
+    if not args.list:
+        try:
+            result = partitions.run_maintenance(
+                database_url, interval=args.interval, ahead_days=args.ahead_days, retention_days=args.retention_days,
+                archive_after_days=args.archive_after_days,
+            )
+        except Exception as e:
+            print(f"Partition maintenance failed: {e}")
+            sys.exit(1)
+        for name in result["created"]:
+            print(f"Created {name}")
+        for name in result["archived"]:
+            print(f"Archived {name}")
+        for name in result["detached"]:
+            print(f"Detached {name}")
+
+    conn = psycopg2.connect(database_url)
+    try:
+        for name, start, end in partitions.list_partitions(conn.cursor()):
+            print(f"{name}  {start:%Y-%m-%d} .. {end:%Y-%m-%d}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
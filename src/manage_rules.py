@@ -0,0 +1,49 @@
+import argparse
+import os
+import sys
+from datetime import datetime
+import psycopg2
+from server import rules
+
+# Checks the rule definitions of RULES_FILE, and re-scores stored transactions against
+# them: after rules change, or for transactions stored before the rule engine ran.
+#
+#   python manage_rules.py check
+#   python manage_rules.py rescore 2024-01-01 2024-02-01     # start <= timestamp < end
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check rules and re-score stored transactions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("check")
+    rescore_parser = subparsers.add_parser("rescore")
+    rescore_parser.add_argument("start", type=datetime.fromisoformat)
+    rescore_parser.add_argument("end", type=datetime.fromisoformat)
+    rescore_parser.add_argument("--window-hours", type=int, default=rules.RESCORE_WINDOW_HOURS,
+                                help="Transactions updated per transaction, in hours of history")
+    args = parser.parse_args()
+
+    try:
+        engine = rules.engine()
+    except Exception as e:
+        print(f"Invalid rules in {rules.RULES_FILE}: {e}")
+        sys.exit(1)
+
+    if args.command == "check":
+        for definition in engine.definitions:
+            print(f"{definition.ruleId:<12}{definition.score:>6.1f}{' shadow' if definition.isShadow else '':<8}{definition.ruleName}")
+        return
+
+    conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+    try:
+        updated = rules.rescore(
+            conn, args.start, args.end, args.window_hours,
+            progress=lambda window_end, updated: print(f"Rescored up to {window_end}: {updated} transactions"),
+        )
+    finally:
+        conn.close()
+    print(f"Rescored {updated} transactions")
+
+
+if __name__ == "__main__":
+    main()
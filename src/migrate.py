@@ -0,0 +1,18 @@
+import os
+import sys
+from dotenv import load_dotenv
+from server.migrations import run_migrations
+
+# Applies pending schema migrations. Run once per deploy, before starting the API.
+
+if __name__ == "__main__":
+    load_dotenv()
+    try:
+        applied = run_migrations(os.getenv("DATABASE_URL"))
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        sys.exit(1)
+    for version, name in applied:
+        print(f"Applied migration {version}: {name}")
+    if not applied:
+        print("Schema is up to date")
@@ -0,0 +1,56 @@
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import uvicorn
+from dotenv import load_dotenv
+from server.migrations import run_migrations
+
+# Production entry point: applies pending migrations once, then serves the API from
+# --workers processes (default WEB_CONCURRENCY, else one per CPU). Nothing is opened
+# before the workers start: each one opens its own database pool, cache connection and
+# transaction id worker lease in the app lifespan, so no socket or id is shared between
+# processes. With more than one worker, metrics are aggregated through
+# PROMETHEUS_MULTIPROC_DIR, created here when it is not set.
+#
+#     python serve.py --workers 4
+
+
+def prepare_metrics_dir():
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        # Files of a previous run would be added to this one's counters.
+        for path in glob.glob(os.path.join(directory, "*.db")):
+            os.remove(path)
+    else:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Serve the API from several worker processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--skip-migrations", action="store_true", help="Migrations are applied by the deploy instead")
+    args = parser.parse_args()
+
+    if args.workers > 1 and os.getenv("ID_WORKER_ID"):
+        # Every worker would generate transaction ids with the same worker id.
+        print("ID_WORKER_ID pins one id worker; unset it to serve from several processes")
+        sys.exit(1)
+
+    if not args.skip_migrations:
+        try:
+            applied = run_migrations(os.getenv("DATABASE_URL"))
+        except Exception as e:
+            print(f"Migration failed: {e}")
+            sys.exit(1)
+        for version, name in applied:
+            print(f"Applied migration {version}: {name}")
+
+    if args.workers > 1:
+        prepare_metrics_dir()
+    uvicorn.run("server.app:app", host=args.host, port=args.port, workers=args.workers, proxy_headers=True)
@@ -1,20 +1,64 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from .utils.utils import read_markdown_file
+from .utils.auth import invalidate_key
 from server.routes.transaction import router as TransactionRouter
+from server import async_database, metrics, partitions, rules
+from server.load_generator import generator as load_generator
+from server.cache import transaction_cache
+from server.utils.ids import id_generator
+from server.velocity import velocity_store
+from psycopg_pool import PoolTimeout
 import logging
 
-readme_content = read_markdown_file("README.md")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # An invalid rules file stops the app here rather than failing every insert.
+    rules.engine()
+    # The async pool is bound to the serving event loop, so it is opened here and not at import.
+    await async_database.open_pool()
+    await transaction_cache.open()
+    if id_generator.worker_id is None:
+        id_generator.worker_id = await async_database.lease_id_worker()
+    # Keeps the API key cache coherent with keys added or revoked on other workers.
+    key_listener = asyncio.create_task(async_database.listen_key_changes(invalidate_key))
+    # Keeps Transactions partitioned ahead of the clock; one worker at a time does the work.
+    partition_maintenance = asyncio.create_task(partitions.maintain_periodically(async_database.DATABASE_URL))
+    # Per-user velocity is rebuilt before serving, then kept current from insert notifications.
+    velocity_loaded = asyncio.Event()
+    velocity_listener = asyncio.create_task(async_database.listen_velocity(velocity_store, velocity_loaded))
+    await velocity_loaded.wait()
+    yield
+    await load_generator.stop()
+    key_listener.cancel()
+    partition_maintenance.cancel()
+    velocity_listener.cancel()
+    await transaction_cache.close()
+    await async_database.close_pool()
+
 
 app = FastAPI(
     title="Flagright Task",
-    description=(lambda: readme_content if isinstance(readme_content, str) else "")(),
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 
+def openapi():
+    # The README is the API description; it is read with the first /openapi.json, not at import.
+    if app.openapi_schema is None:
+        readme_content = read_markdown_file("README.md")
+        app.description = readme_content if isinstance(readme_content, str) else ""
+    return FastAPI.openapi(app)
+
+
+app.openapi = openapi
+
+
 origins = ["*"]
 
 app.add_middleware(
@@ -25,8 +69,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+
 app.include_router(TransactionRouter,tags=["Transactions"])
 
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -50,6 +102,16 @@ async def http_exception_handler(request, exc):
         content={"detail": exc.detail},
     )
 
+# Every pooled connection stayed busy for DB_POOL_TIMEOUT; ask the client to retry
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request, exc):
+    logger.error(f"Database pool timeout: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database busy, retry later"},
+        headers={"Retry-After": "1"},
+    )
+
 # Custom exception handler for generic exceptions
 @app.exception_handler(Exception)
 async def generic_exception_handler(request, exc):
@@ -0,0 +1,298 @@
+import functools
+import os
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Optional
+from dotenv import load_dotenv
+from psycopg2 import sql
+
+load_dotenv()
+
+# Cold storage for old transactions. partitions.maintain() writes every partition that
+# ended ARCHIVE_AFTER_DAYS ago to Parquet files under ARCHIVE_DIR, one directory per
+# day (date=YYYY-MM-DD), then drops it. Rows within a file are in (timestamp, id) order
+# and compressed with zstd; row groups carry min/max statistics, so a scan reads only
+# the days of its range, only the columns it needs and only the row groups whose
+# timestamps can match.
+#
+# The watermark file records the end of the archived history: rows before it are read
+# from the archive, later rows from Transactions. It is moved forward after a
+# partition's files are written and before the partition is dropped, so a failed run
+# leaves rows in both places but never counts them twice; the next run rewrites the
+# same files. Rows inserted behind the watermark are not visible until the next run
+# archives them.
+#
+# pyarrow is imported on the first archive read or write, not with the app.
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS = int(os.environ["ARCHIVE_AFTER_DAYS"]) if os.getenv("ARCHIVE_AFTER_DAYS") else None
+ARCHIVE_CHUNK_SIZE = int(os.getenv("ARCHIVE_CHUNK_SIZE", "50000"))
+
+WATERMARK_FILE = "watermark"
+_DAY_PREFIX = "date="
+_DAY_MICROS = 86_400_000_000
+_EPOCH = datetime(1970, 1, 1)
+
+# Columns of an archive file, as (name, expression over a Transactions partition).
+# Timestamps are read as microseconds since the epoch, like queries.EXPORT_COLUMNS.
+ARCHIVE_COLUMNS = [
+    ("id", "id"),
+    ("transaction_id", "transaction_id"),
+    ("type", "type"),
+    ("timestamp", "(extract(epoch FROM timestamp) * 1000000)::bigint"),
+    ("origin_user_id", "origin_user_id"),
+    ("destination_user_id", "destination_user_id"),
+    ("origin_amount", "origin_amount::numeric(38, 18)"),
+    ("origin_currency", "origin_currency"),
+    ("origin_country", "origin_country"),
+    ("destination_amount", "destination_amount::numeric(38, 18)"),
+    ("destination_currency", "destination_currency"),
+    ("destination_country", "destination_country"),
+    ("promotion_code_used", "promotion_code_used"),
+    ("reference", "reference"),
+    ("origin_device_id", "origin_device_id"),
+    ("destination_device_id", "destination_device_id"),
+    ("tags", "tags::text"),
+    ("hit_rules", "hit_rules::text"),
+    ("risk_score", "risk_score"),
+    ("risk_level", "risk_level"),
+]
+
+SEARCH_COLUMNS = ["id", "transaction_id", "type", "timestamp", "origin_user_id", "origin_amount", "origin_currency", "origin_country"]
+SUMMARY_COLUMNS = ["type", "origin_amount"]
+
+
+@functools.cache
+def archive_schema():
+    import pyarrow as pa
+    amount = pa.decimal128(38, 18)  # amounts stay exact, as NUMERIC in Transactions
+    return pa.schema([
+        ("id", pa.int64()),
+        ("transaction_id", pa.int64()),
+        ("type", pa.string()),
+        ("timestamp", pa.timestamp("us")),
+        ("origin_user_id", pa.string()),
+        ("destination_user_id", pa.string()),
+        ("origin_amount", amount),
+        ("origin_currency", pa.string()),
+        ("origin_country", pa.string()),
+        ("destination_amount", amount),
+        ("destination_currency", pa.string()),
+        ("destination_country", pa.string()),
+        ("promotion_code_used", pa.bool_()),
+        ("reference", pa.string()),
+        ("origin_device_id", pa.int64()),
+        ("destination_device_id", pa.int64()),
+        ("tags", pa.string()),
+        # Files written before migration 9 have none of these; they read as nulls.
+        ("hit_rules", pa.string()),
+        ("risk_score", pa.float32()),
+        ("risk_level", pa.string()),
+    ])
+
+
+def watermark() -> Optional[datetime]:
+    """
+    The end of the archived history, or None when nothing is archived.
+    """
+    try:
+        with open(os.path.join(ARCHIVE_DIR, WATERMARK_FILE)) as file:
+            return datetime.fromisoformat(file.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def _replace(path: str, data: str):
+    # Readers see the old file or the new one, never a partial write.
+    with open(path + ".tmp", "w") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def advance_watermark(end: datetime):
+    current = watermark()
+    if current is None or end > current:
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        _replace(os.path.join(ARCHIVE_DIR, WATERMARK_FILE), end.isoformat())
+
+
+def split(start: datetime, end: datetime) -> tuple:
+    """
+    Where [start, end] divides between the archive and Transactions.
+
+    :return: (archived, hot_start): whether part of the range is archived, and the start
+        of the part left in Transactions, None when there is none.
+    """
+    horizon = watermark()
+    if horizon is None or _naive(start) >= horizon:
+        return False, start
+    return True, horizon if _naive(end) >= horizon else None
+
+
+def _naive(timestamp: datetime) -> datetime:
+    # Transactions.timestamp has no time zone; aware bounds are compared in UTC.
+    if timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _day_dir(day) -> str:
+    return os.path.join(ARCHIVE_DIR, f"{_DAY_PREFIX}{day:%Y-%m-%d}")
+
+
+def _record_batch(rows: list):
+    import pyarrow as pa
+    schema = archive_schema()
+    arrays = []
+    for field, values in zip(schema, zip(*rows)):
+        if field.name == "timestamp":
+            arrays.append(pa.array(values, pa.int64()).cast(field.type))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _DayWriter:
+    # One day's file, written under a temporary name and renamed when complete. The name
+    # comes from the ids it holds, so archiving the same rows again replaces the file
+    # and rows archived later for the same day get a file of their own.
+
+    def __init__(self, day):
+        import pyarrow.parquet as pq
+        os.makedirs(_day_dir(day), exist_ok=True)
+        self.day = day
+        self.path = os.path.join(_day_dir(day), "part.parquet.tmp")
+        self.writer = pq.ParquetWriter(self.path, archive_schema(), compression="zstd")
+        self.ids = []
+
+    def write(self, rows: list):
+        self.writer.write_batch(_record_batch(rows))
+        self.ids.extend((min(row[0] for row in rows), max(row[0] for row in rows)))
+
+    def close(self):
+        self.writer.close()
+        os.replace(self.path, os.path.join(_day_dir(self.day), f"{min(self.ids)}-{max(self.ids)}.parquet"))
+
+
+def write_archive(conn, table: str, chunk_size: int = ARCHIVE_CHUNK_SIZE) -> int:
+    """
+    Writes every row of `table`, a Transactions partition, to the day files of
+    ARCHIVE_DIR. Rows are read in chunks through a server-side cursor.
+
+    :param conn: Open psycopg2 connection, inside the caller's transaction.
+    :return: Number of rows written.
+    """
+    columns = sql.SQL(", ").join(sql.SQL(f"{expression} AS {name}") for name, expression in ARCHIVE_COLUMNS)
+    count, writer = 0, None
+    with conn.cursor(name="archive") as cur:
+        cur.execute(sql.SQL("SELECT {} FROM {} ORDER BY timestamp, id").format(columns, sql.Identifier(table)))
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            count += len(rows)
+            # Rows are in timestamp order; split the chunk where the day changes.
+            start = 0
+            for i in range(1, len(rows) + 1):
+                if i < len(rows) and rows[i][3] // _DAY_MICROS == rows[start][3] // _DAY_MICROS:
+                    continue
+                day = (_EPOCH + timedelta(microseconds=rows[start][3])).date()
+                if writer is not None and writer.day != day:
+                    writer.close()
+                    writer = None
+                if writer is None:
+                    writer = _DayWriter(day)
+                writer.write(rows[start:i])
+                start = i
+    if writer is not None:
+        writer.close()
+    return count
+
+
+def _days(start: datetime, end: datetime) -> list:
+    # (day, files) of the archived days from start to end, in order.
+    try:
+        names = os.listdir(ARCHIVE_DIR)
+    except FileNotFoundError:
+        return []
+    first, last = f"{_DAY_PREFIX}{start:%Y-%m-%d}", f"{_DAY_PREFIX}{end:%Y-%m-%d}"
+    days = []
+    for name in sorted(names):
+        if name.startswith(_DAY_PREFIX) and first <= name <= last:
+            directory = os.path.join(ARCHIVE_DIR, name)
+            files = sorted(os.path.join(directory, file) for file in os.listdir(directory) if file.endswith(".parquet"))
+            if files:
+                days.append((name, files))
+    return days
+
+
+def scan(start: datetime, end: datetime, columns: list, after: tuple = None):
+    """
+    Yields a table per archived day holding the rows with start <= timestamp <= end,
+    before the watermark, in (timestamp, id) order.
+
+    :param columns: Columns to read; timestamp and id are always read.
+    :param after: (timestamp, id) of the last row already returned; only later rows are read.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    horizon = watermark()
+    if horizon is None:
+        return
+    start, end = _naive(start), _naive(end)
+    if after is not None:
+        start = max(start, _naive(after[0]))
+    columns = list(dict.fromkeys(["timestamp", "id"] + columns))
+    timestamp = ds.field("timestamp")
+    bound = lambda value: pa.scalar(value, pa.timestamp("us"))
+    predicate = (timestamp >= bound(start)) & (timestamp <= bound(end)) & (timestamp < bound(horizon))
+    if after is not None:
+        predicate &= (timestamp > bound(_naive(after[0]))) | ((timestamp == bound(_naive(after[0]))) & (ds.field("id") > after[1]))
+    for _, files in _days(start, min(end, horizon)):
+        table = pq.read_table(files, columns=columns, filters=predicate, schema=archive_schema())
+        if table.num_rows:
+            # Files of one day can interleave, when rows were archived in separate runs.
+            yield table.sort_by([("timestamp", "ascending"), ("id", "ascending")]) if len(files) > 1 else table
+
+
+def search(start: datetime, end: datetime, limit: int = None, after: tuple = None) -> list:
+    """
+    Rows of a date range search from the archive as dicts of SEARCH_COLUMNS, at most
+    `limit` of them; days after the page is full are not read.
+    """
+    rows = []
+    for table in scan(start, end, SEARCH_COLUMNS, after):
+        if limit is not None:
+            table = table.slice(0, limit - len(rows))
+        rows.extend(table.select(SEARCH_COLUMNS).to_pylist())
+        if limit is not None and len(rows) >= limit:
+            break
+    return rows
+
+
+def iter_search(start: datetime, end: datetime, chunk_size: int):
+    """
+    Yields the rows of search() in lists of at most chunk_size, one archived day in memory at a time.
+    """
+    for table in scan(start, end, SEARCH_COLUMNS):
+        for batch in table.select(SEARCH_COLUMNS).to_batches(max_chunksize=chunk_size):
+            yield batch.to_pylist()
+
+
+def summarize(start: datetime, end: datetime) -> dict:
+    """
+    Count and total origin amount per type of the archived rows in [start, end].
+
+    :return: {type: [count, total_amount]}
+    """
+    totals = {}
+    for table in scan(start, end, SUMMARY_COLUMNS):
+        grouped = table.group_by("type").aggregate([("origin_amount", "count"), ("origin_amount", "sum")])
+        for row in grouped.to_pylist():
+            total = totals.setdefault(row["type"], [0, Decimal(0)])
+            total[0] += row["origin_amount_count"]
+            total[1] += row["origin_amount_sum"]
+    return totals
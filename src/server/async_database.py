@@ -0,0 +1,398 @@
+import asyncio
+import os
+import time
+import weakref
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from dotenv import load_dotenv
+import psycopg
+from psycopg.rows import tuple_row
+from psycopg.types.json import Jsonb, set_json_loads
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from server import archive, metrics, queries, velocity
+from server.devices import DeviceBatch
+from server.rows import load_json, mapped_row
+from server.metrics import timed_query
+from server.pool import POOL_CHECK_IDLE, POOL_MAX_IDLE, POOL_MAX_LIFETIME, POOL_MAX_SIZE, POOL_MIN_SIZE, POOL_TIMEOUT
+
+# Async counterpart of server.database used by the request handlers. The blocking
+# psycopg2 layer is kept for code that runs outside the event loop (scripts and tests).
+# Date range searches and reports also read the history moved to server.archive.
+
+load_dotenv()
+DATABASE_URL = os.getenv("DATABASE_URL")
+STREAM_CHUNK_SIZE = int(os.getenv("DB_STREAM_CHUNK_SIZE", "1000"))
+
+# Created by open_pool() inside the serving event loop; a closed pool cannot be reopened.
+pool = None
+
+
+# When each pooled connection was last returned; fresh connections are not in it.
+_returned_at = weakref.WeakKeyDictionary()
+
+
+async def _mark_returned(conn):
+    _returned_at[conn] = time.monotonic()
+
+
+async def _check_idle_connection(conn):
+    # Ping only connections idle long enough to have been dropped by a server or proxy.
+    returned_at = _returned_at.get(conn)
+    if returned_at is not None and time.monotonic() - returned_at > POOL_CHECK_IDLE:
+        await AsyncConnectionPool.check_connection(conn)
+
+
+async def _configure(conn):
+    set_json_loads(load_json, conn)
+
+
+async def open_pool():
+    """
+    Opens the pool and waits until its min_size connections are ready, so the first
+    requests do not pay for connecting. Checkouts wait up to DB_POOL_TIMEOUT.
+    """
+    global pool
+    pool = AsyncConnectionPool(
+        DATABASE_URL,
+        kwargs={"row_factory": mapped_row},  # every read returns dicts
+        configure=_configure,
+        min_size=POOL_MIN_SIZE,
+        max_size=POOL_MAX_SIZE,
+        timeout=POOL_TIMEOUT,
+        max_lifetime=POOL_MAX_LIFETIME,
+        max_idle=POOL_MAX_IDLE,
+        check=_check_idle_connection,
+        reset=_mark_returned,
+        open=False,
+    )
+    await pool.open(wait=True)
+    metrics.POOL_COLLECTOR.pools["async"] = pool
+
+
+async def close_pool():
+    await pool.close()
+
+
+@asynccontextmanager
+async def _connection():
+    # Raises PoolTimeout after DB_POOL_TIMEOUT; the functions below let it propagate
+    # so the app can answer 503 instead of an empty result.
+    started = time.perf_counter()
+    async with pool.connection() as conn:
+        metrics.POOL_CHECKOUT.observe(time.perf_counter() - started)
+        yield conn
+
+
+@timed_query
+async def insert_transaction(transaction_data: dict, transaction_id: str) -> dict:
+    """
+    Inserts a transaction and returns the stored row, read back by the same
+    INSERT ... RETURNING statement.
+    """
+    try:
+        devices = DeviceBatch()
+        async with _connection() as conn:
+            cur = await conn.execute(queries.INSERT_TRANSACTION, queries.insert_params(transaction_data, transaction_id, Jsonb, devices))
+            row = await cur.fetchone()
+        devices.stored()
+        return row
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        print(f"An error occurred while inserting transaction: {e}")
+        return None
+
+
+@timed_query
+async def copy_transactions(rows, devices: DeviceBatch) -> int:
+    """
+    Streams rows from an async iterator into Transactions with COPY, then stores the
+    devices they reference, all in one transaction. Errors propagate so the caller can
+    report the failed batch.
+
+    :param devices: Filled by queries.transaction_params while the rows are produced.
+    """
+    count = 0
+    async with _connection() as conn:
+        async with conn.cursor() as cur:
+            async with cur.copy(queries.COPY_TRANSACTIONS) as copy:
+                async for row in rows:
+                    await copy.write_row(row)
+                    count += 1
+            if devices.pending:
+                await cur.execute(queries.INSERT_DEVICES, devices.params())
+    devices.stored()
+    return count
+
+
+@timed_query
+async def get_transactions(transaction_id):
+    async with _connection() as conn:
+        cur = await conn.execute(queries.SELECT_TRANSACTION_BY_ID, (transaction_id,))
+        return await cur.fetchone()
+
+
+async def _fetchall(query: str, params: tuple) -> list:
+    try:
+        async with _connection() as conn:
+            cur = await conn.execute(query, params)
+            return await cur.fetchall()
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        print(f"An error occurred while searching for transactions: {e}")
+        return []
+
+
+async def _search(search_query: str, params: tuple, limit: int = None, after: tuple = None) -> list:
+    if limit is None:
+        return await _fetchall(search_query, params)
+    page_params = queries.search_page_params(params, after, limit)
+    return await _fetchall(queries.search_page_query(search_query, after is not None), page_params)
+
+
+async def _stream(search_query: str, params: tuple, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Yields the rows of a search in lists of at most chunk_size, read through a
+    server-side cursor so only one chunk is held in memory at a time.
+    """
+    async with _connection() as conn:
+        async with conn.cursor(name="search_stream") as cur:
+            await cur.execute(search_query, params)
+            while True:
+                rows = await cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+
+EXPORT_CHUNK_SIZE = int(os.getenv("DB_EXPORT_CHUNK_SIZE", "50000"))
+
+
+@timed_query
+async def export_transactions(filters: dict, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Yields the rows of queries.export_query as lists of plain tuples, at most chunk_size
+    at a time, through a binary server-side cursor.
+    """
+    query, params = queries.export_query(filters)
+    async with _connection() as conn:
+        async with conn.cursor(name="export", binary=True, row_factory=tuple_row) as cur:
+            await cur.execute(query, params)
+            while True:
+                rows = await cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+
+@timed_query
+async def search_transactions_by_amount(amount: float, limit: int = None, after: tuple = None) -> list:
+    return await _search(queries.SEARCH_TRANSACTIONS_BY_AMOUNT, (amount,), limit, after)
+
+
+@timed_query
+async def search_transactions_by_date_range(start_date: datetime, end_date: datetime, limit: int = None, after: tuple = None) -> list:
+    """
+    Archived rows come first, since they are older than every row in Transactions; a
+    page is filled from Transactions once the archived part of the range runs out.
+    """
+    archived, hot_start = archive.split(start_date, end_date)
+    if not archived:
+        return await _search(queries.SEARCH_TRANSACTIONS_BY_DATE_RANGE, (start_date, end_date), limit, after)
+    rows = []
+    if after is None or hot_start is None or after[0] < hot_start:
+        rows = await asyncio.to_thread(archive.search, start_date, end_date, limit, after)
+    if hot_start is None or (limit is not None and len(rows) == limit):
+        return rows
+    hot_after = after if after is not None and after[0] >= hot_start else None
+    hot_limit = None if limit is None else limit - len(rows)
+    return rows + await _search(queries.SEARCH_TRANSACTIONS_BY_DATE_RANGE, (hot_start, end_date), hot_limit, hot_after)
+
+
+@timed_query
+async def search_transactions_by_type(type: str, limit: int = None, after: tuple = None) -> list:
+    return await _search(queries.SEARCH_TRANSACTIONS_BY_TYPE, (type,), limit, after)
+
+
+@timed_query
+async def search_transactions_advanced(filters: dict, sort_by: str = "timestamp", descending: bool = False, limit: int = 100, after: tuple = None) -> list:
+    return await _fetchall(*queries.advanced_search_query(filters, sort_by, descending, limit, after))
+
+
+@timed_query
+def stream_transactions_by_amount(amount: float):
+    return _stream(queries.SEARCH_TRANSACTIONS_BY_AMOUNT, (amount,))
+
+
+@timed_query
+def stream_transactions_by_date_range(start_date: datetime, end_date: datetime):
+    archived, hot_start = archive.split(start_date, end_date)
+    if not archived:
+        return _stream(queries.SEARCH_TRANSACTIONS_BY_DATE_RANGE, (start_date, end_date))
+    return _stream_archived(start_date, end_date, hot_start)
+
+
+async def _stream_archived(start_date: datetime, end_date: datetime, hot_start: datetime):
+    # The archived rows, read one day at a time off the event loop, then those in Transactions.
+    chunks = archive.iter_search(start_date, end_date, STREAM_CHUNK_SIZE)
+    while True:
+        rows = await asyncio.to_thread(next, chunks, None)
+        if rows is None:
+            break
+        yield rows
+    if hot_start is not None:
+        hot = _stream(queries.SEARCH_TRANSACTIONS_BY_DATE_RANGE, (hot_start, end_date))
+        try:
+            async for rows in hot:
+                yield rows
+        finally:
+            await hot.aclose()
+
+
+@timed_query
+def stream_transactions_by_type(type: str):
+    return _stream(queries.SEARCH_TRANSACTIONS_BY_TYPE, (type,))
+
+
+@timed_query
+async def verify_key(key_hash: str):
+    """
+    Returns True or False for a known or unknown key hash, and None when the
+    lookup itself failed so the caller does not cache the outcome.
+    """
+    try:
+        async with _connection() as conn:
+            cur = await conn.execute(queries.VERIFY_KEY, (key_hash,))
+            return await cur.fetchone() is not None
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        print(f"An error occurred while verifying key: {e}")
+        return None
+
+
+async def lease_id_worker() -> int:
+    """
+    Takes the next worker id for utils/ids.py. Errors propagate: the app must not
+    generate ids without a worker id of its own.
+    """
+    async with _connection() as conn:
+        cur = await conn.execute(queries.NEXT_ID_WORKER)
+        return (await cur.fetchone())["nextval"]
+
+
+async def listen_key_changes(on_change, retry_delay: float = 5.0):
+    """
+    Calls on_change(key_hash) for every key added or revoked on any worker, using
+    LISTEN on a dedicated connection. on_change(None) is called after each
+    (re)connect, since notifications sent while disconnected are lost.
+    """
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(DATABASE_URL, autocommit=True) as conn:
+                await conn.execute(f"LISTEN {queries.KEY_CHANGED_CHANNEL}")
+                on_change(None)
+                async for notify in conn.notifies():
+                    on_change(notify.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"An error occurred while listening for key changes: {e}")
+        await asyncio.sleep(retry_delay)
+
+
+async def _load_velocity(store):
+    # On a connection of its own, so the listening one is not read until the snapshot
+    # is known; the aggregate is read as of that snapshot.
+    fresh = velocity.VelocityStore()
+    since = datetime.now() - timedelta(seconds=velocity.LONGEST_WINDOW_SECONDS)
+    async with await psycopg.AsyncConnection.connect(DATABASE_URL) as conn:
+        await conn.set_isolation_level(psycopg.IsolationLevel.REPEATABLE_READ)
+        await conn.set_read_only(True)
+        cur = await conn.execute(queries.CURRENT_SNAPSHOT)
+        snapshot = velocity.parse_snapshot((await cur.fetchone())[0])
+        async with conn.cursor(name="velocity_history") as cur:
+            await cur.execute(queries.VELOCITY_HISTORY, (since,))
+            while True:
+                rows = await cur.fetchmany(STREAM_CHUNK_SIZE)
+                if not rows:
+                    break
+                for user_id, minute, count, amount in rows:
+                    fresh.record(user_id, minute, count, amount)
+    store.replace(fresh, snapshot)
+
+
+async def listen_velocity(store, loaded: asyncio.Event = None, retry_delay: float = 5.0):
+    """
+    Keeps a velocity.VelocityStore current: rebuilds it from Transactions after each
+    (re)connect, then records every transactions_velocity notification, dropping idle
+    users every VELOCITY_PRUNE_INTERVAL. loaded is set after the first rebuild.
+    """
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(DATABASE_URL, autocommit=True) as conn:
+                # Listening before the snapshot is taken, so no commit falls in between.
+                await conn.execute(f"LISTEN {queries.VELOCITY_CHANNEL}")
+                await _load_velocity(store)
+                if loaded is not None:
+                    loaded.set()
+                while True:
+                    async for notify in conn.notifies(timeout=velocity.VELOCITY_PRUNE_INTERVAL):
+                        store.apply(notify.payload)
+                    store.prune()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"An error occurred while maintaining transaction velocity: {e}")
+        await asyncio.sleep(retry_delay)
+
+
+@timed_query
+async def get_transaction_summary(start_date: datetime, end_date: datetime) -> dict:
+    try:
+        archived, hot_start = archive.split(start_date, end_date)
+        summary = []
+        if hot_start is not None:
+            async with _connection() as conn:
+                cur = await conn.execute(queries.TRANSACTION_SUMMARY, (hot_start, end_date))
+                summary = await cur.fetchall()
+        if archived:
+            summary = _merge_summary(summary, await asyncio.to_thread(archive.summarize, start_date, end_date))
+        return summary
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        print(f"An error occurred while fetching transaction summary: {e}")
+        return []
+
+
+def _merge_summary(summary: list, totals: dict) -> list:
+    # Adds summary rows from Transactions to the {type: [count, total_amount]} of archive.summarize().
+    for row in summary:
+        total = totals.setdefault(queries._plain(row["type"]), [0, Decimal(0)])
+        total[0] += row["count"]
+        total[1] += row["total_amount"]
+    return [{"type": type, "count": count, "total_amount": total_amount} for type, (count, total_amount) in totals.items()]
+
+
+@timed_query
+async def get_total_transaction_amount(start_date: datetime, end_date: datetime) -> float:
+    try:
+        archived, hot_start = archive.split(start_date, end_date)
+        total_amount = None
+        if hot_start is not None:
+            async with _connection() as conn:
+                cur = await conn.execute(queries.TOTAL_TRANSACTION_AMOUNT, (hot_start, end_date))
+                total_amount = (await cur.fetchone())["total_amount"]
+        if archived:
+            totals = await asyncio.to_thread(archive.summarize, start_date, end_date)
+            if totals:
+                total_amount = (total_amount or 0) + sum(total for _, total in totals.values())
+        return total_amount if total_amount is not None else 0.0
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        print(f"An error occurred while fetching total transaction amount: {e}")
+        return 0.0
@@ -0,0 +1,116 @@
+import os
+import sys
+from cachetools import LRUCache
+from server import metrics
+
+# Read-through cache for GET /get_transactions/{transaction_id}. Transactions are never
+# updated once written, so entries need no invalidation. Entries are the serialized
+# response body: the local tier is bounded by their size in bytes, and a hit skips
+# both the pool and serialization. With TRANSACTION_CACHE_URL set, a Redis server is
+# used as a second, shared tier so workers reuse each other's entries.
+
+TRANSACTION_CACHE_BYTES = int(os.getenv("TRANSACTION_CACHE_BYTES", str(64 * 1024 * 1024)))  # 0 disables the local tier
+TRANSACTION_CACHE_URL = os.getenv("TRANSACTION_CACHE_URL")  # e.g. redis://localhost:6379/0
+TRANSACTION_CACHE_TTL = int(os.getenv("TRANSACTION_CACHE_TTL", "86400"))  # shared tier only; bounds Redis memory
+TRANSACTION_CACHE_TIMEOUT = float(os.getenv("TRANSACTION_CACHE_TIMEOUT", "0.25"))  # a slow shared tier is a miss
+
+
+class _BodyCache(LRUCache):
+    # LRUCache evicts through popitem(); counts those evictions.
+    def popitem(self):
+        item = super().popitem()
+        metrics.CACHE_EVICTIONS.inc()
+        return item
+
+
+class TransactionCache:
+    """
+    Two-tier cache of transaction response bodies, keyed by transaction_id. Errors in
+    the shared tier are printed and treated as misses, so Redis is never required.
+    """
+
+    def __init__(self, max_bytes: int = TRANSACTION_CACHE_BYTES, url: str = TRANSACTION_CACHE_URL):
+        self.url = url
+        self._local = _BodyCache(maxsize=max_bytes, getsizeof=sys.getsizeof) if max_bytes > 0 else None
+        self._shared = None
+
+    def __len__(self) -> int:
+        return len(self._local) if self._local is not None else 0
+
+    @property
+    def currsize(self) -> int:
+        """
+        Bytes held by the local tier.
+        """
+        return self._local.currsize if self._local is not None else 0
+
+    async def open(self):
+        if not self.url or self._shared is not None:
+            return
+        try:
+            import redis.asyncio as redis  # optional dependency, only needed for the shared tier
+            self._shared = redis.from_url(
+                self.url, socket_timeout=TRANSACTION_CACHE_TIMEOUT, socket_connect_timeout=TRANSACTION_CACHE_TIMEOUT,
+            )
+        except Exception as e:
+            print(f"Shared transaction cache disabled: {e}")
+
+    async def close(self):
+        if self._shared is not None:
+            await self._shared.aclose()
+            self._shared = None
+
+    async def get(self, transaction_id: int):
+        """
+        Returns the cached response body, or None on a miss in every tier.
+        """
+        if self._local is not None:
+            body = self._local.get(transaction_id)
+            metrics.CACHE_LOOKUPS.labels("local", "miss" if body is None else "hit").inc()
+            if body is not None:
+                return body
+        if self._shared is None:
+            return None
+        try:
+            body = await self._shared.get(self._key(transaction_id))
+        except Exception as e:
+            print(f"An error occurred while reading the shared transaction cache: {e}")
+            body = None
+        metrics.CACHE_LOOKUPS.labels("shared", "miss" if body is None else "hit").inc()
+        if body is not None:
+            self._store_local(transaction_id, body)
+        return body
+
+    async def put(self, transaction_id: int, body: bytes):
+        """
+        :param transaction_id: Public transaction id.
+        :param body: Serialized transaction, as returned by the route.
+        """
+        self._store_local(transaction_id, body)
+        if self._shared is None:
+            return
+        try:
+            await self._shared.set(self._key(transaction_id), body, ex=TRANSACTION_CACHE_TTL)
+        except Exception as e:
+            print(f"An error occurred while writing the shared transaction cache: {e}")
+
+    def clear(self):
+        if self._local is not None:
+            self._local.clear()
+
+    def _store_local(self, transaction_id: int, body: bytes):
+        if self._local is None:
+            return
+        try:
+            self._local[transaction_id] = body
+        except ValueError:
+            pass  # larger than the whole cache
+
+    @staticmethod
+    def _key(transaction_id: int) -> str:
+        return f"transaction:{transaction_id}"
+
+
+transaction_cache = TransactionCache()
+metrics.CACHE_SIZE.set_function(("entries",), lambda: len(transaction_cache))
+metrics.CACHE_SIZE.set_function(("bytes",), lambda: transaction_cache.currsize)
@@ -1,74 +1,27 @@
 from contextlib import contextmanager
 import os
-import psycopg2
-import psycopg2.pool
-from psycopg2.extras import Json
+from psycopg2.extras import Json, register_default_jsonb
 from datetime import datetime
 from dotenv import load_dotenv
-from server.models.transaction import TransactionType, Currency, Country, DeviceData, Tag
+from server.models.transaction import DeviceData, Tag
+from server import metrics, queries
+from server.devices import DeviceBatch
+from server.rows import load_json, map_rows
+from server.pool import ConnectionPool
 
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
-pool = psycopg2.pool.SimpleConnectionPool(1, 20, DATABASE_URL)
+# Shared by threads; getconn() waits up to DB_POOL_TIMEOUT for a connection when all are in use.
+# Connects on first use, so importing this module needs no database.
+pool = ConnectionPool(DATABASE_URL, lazy=True)
+metrics.POOL_COLLECTOR.pools["sync"] = pool
+register_default_jsonb(globally=True, loads=load_json)
 
 
 @contextmanager
 def get_db():
-    conn = None
-    try:
-        conn = pool.getconn()
+    with pool.connection() as conn:
         yield conn
-    finally:
-        if conn:
-            conn.cursor().close()
-            pool.putconn(conn)
-
-
-def create_tables():
-    conn = None
-    try:
-        conn = pool.getconn()
-        cur = conn.cursor()
-
-        
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS Keys (
-                key VARCHAR(255)
-            );
-        """)
-        
-        
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS Transactions (
-                id SERIAL PRIMARY KEY,
-                transaction_id NUMERIC,
-                type VARCHAR(50) NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                origin_user_id VARCHAR(50) ,
-                destination_user_id VARCHAR(50) ,
-                origin_amount NUMERIC NOT NULL,
-                origin_currency VARCHAR(3) NOT NULL,
-                origin_country VARCHAR(2) ,
-                destination_amount NUMERIC NOT NULL,
-                destination_currency VARCHAR(3) NOT NULL,
-                destination_country VARCHAR(2) ,
-                promotion_code_used BOOLEAN,
-                reference VARCHAR(255),
-                origin_device_data JSONB,
-                destination_device_data JSONB,
-                tags JSONB
-            );
-        """)
-
-        conn.commit()
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        print(f"An error occurred: {e}")
-    finally:
-        if conn:
-            cur.close()
-            pool.putconn(conn)
 
 
 def insert_transaction(transaction_data: dict, transaction_id: str) -> int:
@@ -78,35 +31,11 @@ def insert_transaction(transaction_data: dict, transaction_id: str) -> int:
         conn = pool.getconn()
         cur = conn.cursor()
 
-        cur.execute("""
-            INSERT INTO Transactions (
-                transaction_id, type, timestamp, origin_user_id, destination_user_id,
-                origin_amount, origin_currency, origin_country,
-                destination_amount, destination_currency, destination_country,
-                promotion_code_used, reference, origin_device_data,
-                destination_device_data, tags
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING transaction_id
-        """, (
-            transaction_id,
-            transaction_data["type"],
-            transaction_data["timestamp"],  # Use provided timestamp
-            transaction_data["originUserId"],
-            transaction_data.get("destinationUserId"),
-            transaction_data["originAmountDetails"]["transactionAmount"],
-            transaction_data["originAmountDetails"]["transactionCurrency"],
-            transaction_data["originAmountDetails"]["country"],
-            transaction_data["destinationAmountDetails"]["transactionAmount"],
-            transaction_data["destinationAmountDetails"]["transactionCurrency"],
-            transaction_data["destinationAmountDetails"]["country"],
-            transaction_data.get("promotionCodeUsed", False),
-            transaction_data.get("reference", ""),
-            Json(transaction_data.get("originDeviceData", {})),
-            Json(transaction_data.get("destinationDeviceData", {})),
-            Json(transaction_data.get("tags", []))
-        ))
+        devices = DeviceBatch()
+        cur.execute(queries.INSERT_TRANSACTION, queries.insert_params(transaction_data, transaction_id, Json, devices))
         
         conn.commit()
+        devices.stored()
         return transaction_id
 
     except Exception as e:
@@ -127,39 +56,39 @@ def get_transaction_by_id(transaction_id: int) -> dict:
         conn = pool.getconn()
         cur = conn.cursor()
 
-        cur.execute("""
-            SELECT * FROM Transactions WHERE transaction_id = %s
-        """, (transaction_id,))
+        cur.execute(queries.SELECT_TRANSACTION_BY_ID, (transaction_id,))
 
         transaction = cur.fetchone()
         if transaction is None:
             return None
 
-        column_names = [desc[0] for desc in cur.description]
-        transaction_dict = dict(zip(column_names, transaction))
+        transaction_dict = map_rows(cur, [transaction])[0]
 
         # Ensure all expected keys are present and set default values if missing
         transaction_dict["executedRules"] = transaction_dict.get("executed_rules", [])
         transaction_dict["hitRules"] = transaction_dict.get("hit_rules", [])
-        transaction_dict["riskScoreDetails"] = transaction_dict.get("risk_score_details", {
-            "trsScore": 0.0,
-            "trsRiskLevel": "LOW"
-        })
+        # Rows stored before the rule engine ran have no score until they are rescored.
+        if transaction_dict.get("risk_score") is not None:
+            transaction_dict["riskScoreDetails"] = {
+                "trsScore": transaction_dict["risk_score"],
+                "trsRiskLevel": transaction_dict["risk_level"],
+            }
+        else:
+            transaction_dict["riskScoreDetails"] = {"trsScore": 0.0, "trsRiskLevel": "LOW"}
         transaction_dict["status"] = transaction_dict.get("status", "Completed")
         transaction_dict["transactionId"] = str(transaction_dict["transaction_id"])
         transaction_dict["message"] = transaction_dict.get("message", "Transaction retrieved successfully")
 
-        # Convert to appropriate enums and nested structures
-        transaction_dict["type"] = TransactionType(transaction_dict["type"])
+        # Nested structures; the row mapper has already converted the enum columns
         transaction_dict["originAmountDetails"] = {
             "transactionAmount": transaction_dict["origin_amount"],
-            "transactionCurrency": Currency(transaction_dict["origin_currency"]),
-            "country": Country(transaction_dict["origin_country"]),
+            "transactionCurrency": transaction_dict["origin_currency"],
+            "country": transaction_dict["origin_country"],
         }
         transaction_dict["destinationAmountDetails"] = {
             "transactionAmount": transaction_dict["destination_amount"],
-            "transactionCurrency": Currency(transaction_dict["destination_currency"]),
-            "country": Country(transaction_dict["destination_country"]),
+            "transactionCurrency": transaction_dict["destination_currency"],
+            "country": transaction_dict["destination_country"],
         }
         transaction_dict["originDeviceData"] = transaction_dict.get("origin_device_data", DeviceData())
         transaction_dict["destinationDeviceData"] = transaction_dict.get("destination_device_data", DeviceData())
@@ -183,27 +112,10 @@ def get_transactions(transaction_id):
     conn = pool.getconn()
     try:
         with conn.cursor() as cur:
-            cur.execute("SELECT * FROM transactions WHERE transaction_id = %s", (transaction_id,))
+            cur.execute(queries.SELECT_TRANSACTION_BY_ID, (transaction_id,))
             row = cur.fetchone()
             if row:
-                return {
-                    "transaction_id": row[0],
-                    "type": row[1],
-                    "timestamp": row[2],
-                    "origin_user_id": row[3],
-                    "destination_user_id": row[4],
-                    "origin_amount": row[5],
-                    "origin_currency": row[6],
-                    "origin_country": row[7],
-                    "destination_amount": row[8],
-                    "destination_currency": row[9],
-                    "destination_country": row[10],
-                    "is_fraudulent": row[11],
-                    "metadata": row[12],
-                    "origin_device_data": row[13],
-                    "destination_device_data": row[14],
-                    "tags": row[15],
-                }
+                return map_rows(cur, [row])[0]
     finally:
         pool.putconn(conn)
     return None
@@ -216,13 +128,11 @@ def search_transactions_by_amount(amount: float) -> list:
         conn = pool.getconn()
         cur = conn.cursor()
 
-        query = """
-            SELECT * FROM Transactions WHERE origin_amount = %s
-        """
+        query = queries.SEARCH_TRANSACTIONS_BY_AMOUNT
         params = [amount]
 
         cur.execute(query, tuple(params))
-        transactions = cur.fetchall()
+        transactions = map_rows(cur, cur.fetchall())
 
         return transactions
 
@@ -241,13 +151,11 @@ def search_transactions_by_date_range(start_date: datetime, end_date: datetime)
         conn = pool.getconn()
         cur = conn.cursor()
 
-        query = """
-            SELECT * FROM Transactions WHERE timestamp >= %s AND timestamp <= %s
-        """
+        query = queries.SEARCH_TRANSACTIONS_BY_DATE_RANGE
         params = [start_date, end_date]
 
         cur.execute(query, tuple(params))
-        transactions = cur.fetchall()
+        transactions = map_rows(cur, cur.fetchall())
 
         return transactions
 
@@ -266,13 +174,11 @@ def search_transactions_by_type(type: str) -> list:
         conn = pool.getconn()
         cur = conn.cursor()
 
-        query = """
-            SELECT * FROM Transactions WHERE type = %s
-        """
+        query = queries.SEARCH_TRANSACTIONS_BY_TYPE
         params = [type]
 
         cur.execute(query, tuple(params))
-        transactions = cur.fetchall()
+        transactions = map_rows(cur, cur.fetchall())
 
         return transactions
 
@@ -289,12 +195,12 @@ def search_transactions_by_type(type: str) -> list:
 
 
 
-def verify_key(key: str):
+def verify_key(key_hash: str):
     conn = None
     try:
         conn = pool.getconn()
         cur = conn.cursor()
-        cur.execute("SELECT key FROM Keys WHERE key = %s", (key,))
+        cur.execute(queries.VERIFY_KEY, (key_hash,))
         key_exists = cur.fetchone() is not None
         return key_exists
     except Exception as e:
@@ -306,24 +212,63 @@ def verify_key(key: str):
             pool.putconn(conn)
 
 
+def add_key(key_hash: str) -> bool:
+    conn = None
+    cur = None
+    try:
+        conn = pool.getconn()
+        cur = conn.cursor()
+        cur.execute(queries.INSERT_KEY, (key_hash,))
+        cur.execute(queries.NOTIFY_KEY_CHANGED, (key_hash,))
+        conn.commit()
+        return True
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        print(f"An error occurred while adding key: {e}")
+        return False
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            pool.putconn(conn)
+
+
+def revoke_key(key_hash: str) -> bool:
+    conn = None
+    cur = None
+    try:
+        conn = pool.getconn()
+        cur = conn.cursor()
+        cur.execute(queries.DELETE_KEY, (key_hash,))
+        revoked = cur.rowcount > 0
+        # Delivered on commit; every worker drops the hash from its auth cache.
+        cur.execute(queries.NOTIFY_KEY_CHANGED, (key_hash,))
+        conn.commit()
+        return revoked
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        print(f"An error occurred while revoking key: {e}")
+        return False
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            pool.putconn(conn)
+
+
 def get_transaction_summary(start_date: datetime, end_date: datetime) -> dict:
     conn = None
     try:
         conn = pool.getconn()
         cur = conn.cursor()
 
-        query = """
-            SELECT type, COUNT(*) AS count, SUM(origin_amount) AS total_amount
-            FROM Transactions
-            WHERE timestamp >= %s AND timestamp <= %s
-            GROUP BY type
-        """
+        query = queries.TRANSACTION_SUMMARY
         params = [start_date, end_date]
 
         cur.execute(query, tuple(params))
-        result = cur.fetchall()
-
-        summary = [{"type": row[0], "count": row[1], "total_amount": row[2]} for row in result]
+        summary = map_rows(cur, cur.fetchall())
 
         return summary
 
@@ -342,11 +287,7 @@ def get_total_transaction_amount(start_date: datetime, end_date: datetime) -> fl
         conn = pool.getconn()
         cur = conn.cursor()
 
-        query = """
-            SELECT SUM(origin_amount)
-            FROM Transactions
-            WHERE timestamp >= %s AND timestamp <= %s
-        """
+        query = queries.TOTAL_TRANSACTION_AMOUNT
         params = [start_date, end_date]
 
         cur.execute(query, tuple(params))
@@ -364,9 +305,3 @@ def get_total_transaction_amount(start_date: datetime, end_date: datetime) -> fl
             cur.close()
         if conn:
             pool.putconn(conn)
-
-
-
-
-# Initialize tables
-create_tables()
@@ -0,0 +1,72 @@
+import hashlib
+import os
+from cachetools import LRUCache
+import orjson
+
+# Device data is stored once per distinct payload in the Devices table, keyed by a
+# content hash, and transactions reference it by that id. Ids are computed here rather
+# than in SQL so COPY batches can reference devices without a round trip; the payloads
+# a batch introduces are upserted in the same transaction (queries.INSERT_DEVICES).
+
+DEVICE_CACHE_SIZE = int(os.getenv("DEVICE_CACHE_SIZE", "100000"))
+
+# Ids of devices known to be stored, so repeat devices are not upserted again with every batch.
+known_devices = LRUCache(maxsize=DEVICE_CACHE_SIZE)
+
+
+def canonical_json(data) -> str:
+    # Sorted keys, so payloads that differ only in key order share a device.
+    return orjson.dumps(data, option=orjson.OPT_SORT_KEYS).decode()
+
+
+def _id(text: str) -> int:
+    # First 64 bits of the SHA-256 of the canonical payload, as a signed BIGINT.
+    return int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big", signed=True)
+
+
+def device_id(data):
+    """
+    Returns the id of a device payload, or None for a missing one.
+    """
+    if data is None:
+        return None
+    return _id(canonical_json(data))
+
+
+class DeviceBatch:
+    """
+    Collects the device payloads referenced by a batch of rows, to be stored with it.
+
+    :param skip_known: Leave out devices already in known_devices.
+    """
+
+    def __init__(self, skip_known: bool = True):
+        self.skip_known = skip_known
+        self.pending = {}  # device id -> canonical JSON
+
+    def add(self, data):
+        """
+        :return: The device id to store on the row, None for a missing payload.
+        """
+        if data is None:
+            return None
+        text = canonical_json(data)
+        key = _id(text)
+        if key not in self.pending and not (self.skip_known and key in known_devices):
+            self.pending[key] = text
+        return key
+
+    def params(self) -> tuple:
+        """
+        Parameters of queries.INSERT_DEVICES, in id order so concurrent batches lock
+        conflicting ids in the same order.
+        """
+        ids = sorted(self.pending)
+        return ids, [self.pending[key] for key in ids]
+
+    def stored(self):
+        """
+        Marks the batch's devices as stored; call once its transaction has committed.
+        """
+        for key in self.pending:
+            known_devices[key] = True
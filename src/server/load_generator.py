@@ -0,0 +1,186 @@
+import asyncio
+import itertools
+import random
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Literal, Optional
+import orjson
+from pydantic import BaseModel, Field
+from server.async_database import copy_transactions
+from server.devices import DeviceBatch
+from server.models.transaction import Country, Currency, DeviceData, Tag, TransactionType
+from server import queries
+from server.utils.ids import id_generator
+
+# Synthetic transaction generator behind /cron/start. Workers are tasks on the serving
+# event loop; each one inserts a batch with COPY on a fixed schedule, so the achieved
+# rate only falls short of the target when inserts are slower than the schedule.
+
+LATENCY_SAMPLES = 10000
+
+
+class LoadGeneratorConfig(BaseModel):
+    rate: float = Field(1.0, gt=0, description="Target transactions per second")
+    workers: int = Field(1, ge=1, le=64, description="Concurrent insert workers")
+    batch_size: int = Field(1, ge=1, le=10000, description="Transactions per insert")
+    type_weights: Dict[TransactionType, float] = Field(
+        default_factory=lambda: {type: 1.0 for type in TransactionType},
+        description="Relative frequency of each transaction type",
+    )
+    user_count: int = Field(100, ge=1, description="Users are drawn from ids 1..user_count")
+    user_skew: float = Field(0.0, ge=0, description="Zipf exponent of user activity; 0 is uniform")
+    amount_distribution: Literal["uniform", "lognormal"] = "uniform"
+    min_amount: float = Field(1.0, gt=0)
+    max_amount: float = Field(1000.0, gt=0)
+    amount_mu: float = Field(4.0, description="Mean of log(amount) for the lognormal distribution")
+    amount_sigma: float = Field(1.0, gt=0, description="Sigma of log(amount) for the lognormal distribution")
+    currency: Currency = Currency.USD
+    country: Country = Country.US
+
+
+def _json_text(value) -> str:
+    return orjson.dumps(value).decode()
+
+
+def _percentile(sorted_values: list, fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class LoadGenerator:
+    def __init__(self):
+        self.config = None
+        self.tasks = []
+        self.started_at = None
+        self.stopped_at = None
+        self.inserted = 0
+        self.failed_batches = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._stopping = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self.tasks)
+
+    def start(self, config: LoadGeneratorConfig):
+        if self.running:
+            return
+        self.config = config
+        self.inserted = 0
+        self.failed_batches = 0
+        self.latencies.clear()
+        self.started_at = time.monotonic()
+        self.stopped_at = None
+        self._stopping = asyncio.Event()
+
+        self._types = list(config.type_weights)
+        self._type_weights = list(itertools.accumulate(config.type_weights.values()))
+        self._user_weights = list(itertools.accumulate(
+            1 / rank ** config.user_skew for rank in range(1, config.user_count + 1)
+        ))
+        self._device_data = DeviceData().dict()
+        self._tags = [Tag().dict()]
+        self.tasks = [asyncio.create_task(self._worker(index)) for index in range(config.workers)]
+
+    async def stop(self):
+        # Workers finish their in-flight batch; cancelling mid-COPY would break the connection.
+        tasks, self.tasks = self.tasks, []
+        if not tasks:
+            return
+        self._stopping.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.stopped_at = time.monotonic()
+
+    def _amounts(self, k: int) -> list:
+        config = self.config
+        if config.amount_distribution == "lognormal":
+            return [round(min(max(random.lognormvariate(config.amount_mu, config.amount_sigma), config.min_amount), config.max_amount), 2) for _ in range(k)]
+        return [round(random.uniform(config.min_amount, config.max_amount), 2) for _ in range(k)]
+
+    def _batch(self) -> tuple:
+        config = self.config
+        k = config.batch_size
+        types = random.choices(self._types, cum_weights=self._type_weights, k=k)
+        users = random.choices(range(1, config.user_count + 1), cum_weights=self._user_weights, k=2 * k)
+        amounts = self._amounts(k)
+        now = datetime.now()
+        rows = []
+        devices = DeviceBatch()
+        for i in range(k):
+            amount_details = {
+                "transactionAmount": amounts[i],
+                "transactionCurrency": config.currency,
+                "country": config.country,
+            }
+            transaction_data = {
+                "type": types[i],
+                "timestamp": now,
+                "originUserId": str(users[2 * i]),
+                "destinationUserId": str(users[2 * i + 1]),
+                "originAmountDetails": amount_details,
+                "destinationAmountDetails": amount_details,
+                "originDeviceData": self._device_data,
+                "destinationDeviceData": self._device_data,
+                "tags": self._tags,
+            }
+            rows.append(queries.transaction_params(transaction_data, id_generator.next_id(), _json_text, devices))
+        return rows, devices
+
+    async def _insert(self, rows: list, devices: DeviceBatch):
+        async def row_iterator():
+            for row in rows:
+                yield row
+
+        await copy_transactions(row_iterator(), devices)
+
+    async def _worker(self, index: int):
+        loop = asyncio.get_running_loop()
+        interval = self.config.batch_size * self.config.workers / self.config.rate
+        # Stagger the workers evenly across one interval.
+        next_at = loop.time() + interval * index / self.config.workers
+        while not self._stopping.is_set():
+            delay = next_at - loop.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), delay)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+            elif delay < -10 * interval:
+                # Far behind schedule: skip the backlog instead of bursting to catch up.
+                next_at = loop.time()
+            next_at += interval
+
+            rows, devices = self._batch()
+            started = time.perf_counter()
+            try:
+                await self._insert(rows, devices)
+                self.inserted += len(rows)
+            except Exception as e:
+                self.failed_batches += 1
+                print(f"An error occurred while generating transactions: {e}")
+            self.latencies.append(time.perf_counter() - started)
+
+    def status(self) -> dict:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.stopped_at or time.monotonic()) - self.started_at
+        latencies = sorted(self.latencies)
+        return {
+            "running": self.running,
+            "config": self.config,
+            "elapsed_seconds": elapsed,
+            "inserted": self.inserted,
+            "failed_batches": self.failed_batches,
+            "target_rate": self.config.rate if self.config else None,
+            "achieved_rate": self.inserted / elapsed if elapsed else None,
+            "insert_latency_ms": {
+                name: (_percentile(latencies, fraction) or 0.0) * 1000
+                for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+            },
+        }
+
+
+generator = LoadGenerator()
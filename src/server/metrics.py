@@ -0,0 +1,195 @@
+import functools
+import inspect
+import os
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Prometheus metrics served at /metrics. Routes are labelled with their path template
+# and queries with the async_database function that ran them, so label cardinality is
+# fixed by the code, not by the traffic.
+#
+# Under `serve.py --workers N`, each worker writes its counters and histograms to
+# PROMETHEUS_MULTIPROC_DIR and /metrics sums them over all workers. Gauges computed at
+# scrape time (pool state, cache size) describe the worker that answered the scrape.
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+LATENCY_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency, until the last body chunk is sent",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Database call latency, including pool checkout",
+    ["query"], buckets=LATENCY_BUCKETS,
+)
+QUERY_ROWS = Histogram(
+    "db_query_rows", "Rows returned, or written by COPY, per database call",
+    ["query"], buckets=ROW_BUCKETS,
+)
+POOL_CHECKOUT = Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled connection",
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "transaction_cache_lookups", "Transaction cache lookups by tier and outcome",
+    ["tier", "result"],
+)
+CACHE_EVICTIONS = Counter(
+    "transaction_cache_evictions", "Entries evicted from the local transaction cache to stay within its size",
+)
+
+
+def render() -> bytes:
+    if not MULTIPROCESS:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    for collector in SCRAPE_COLLECTORS:
+        registry.register(collector)
+    return generate_latest(registry)
+
+
+def _row_count(result) -> int:
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    if isinstance(result, int) and not isinstance(result, bool):
+        return result  # copy_transactions returns the number of rows written
+    return 0 if result is None or result is False else 1
+
+
+def timed_query(func):
+    """
+    Records the latency and row count of an async_database function under its name.
+    Functions returning an async generator of row chunks are timed until the stream
+    is exhausted or closed, counting every row yielded.
+    """
+    duration = QUERY_DURATION.labels(func.__name__)
+    rows = QUERY_ROWS.labels(func.__name__)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            result = await func(*args, **kwargs)
+            duration.observe(time.perf_counter() - started)
+            rows.observe(_row_count(result))
+            return result
+        return wrapper
+
+    async def timed_stream(chunks):
+        started = time.perf_counter()
+        count = 0
+        try:
+            async for chunk in chunks:
+                count += len(chunk)
+                yield chunk
+        finally:
+            # Closing the inner generator now returns its connection to the pool.
+            await chunks.aclose()
+            duration.observe(time.perf_counter() - started)
+            rows.observe(count)
+
+    @functools.wraps(func)
+    def stream_wrapper(*args, **kwargs):
+        return timed_stream(func(*args, **kwargs))
+    return stream_wrapper
+
+
+class PoolCollector:
+    """
+    Reports the state of each registered connection pool at scrape time, from its
+    get_stats(). async_database registers its pool each time it opens one, since every
+    app lifespan opens a new pool.
+    """
+
+    def __init__(self):
+        self.pools = {}
+
+    def collect(self):
+        connections = GaugeMetricFamily("db_pool_connections", "Pooled connections by state", labels=["pool", "state"])
+        waiting = GaugeMetricFamily("db_pool_requests_waiting", "Requests queued for a connection", labels=["pool"])
+        timeouts = CounterMetricFamily("db_pool_timeouts", "Requests that gave up waiting for a connection", labels=["pool"])
+        lost = CounterMetricFamily("db_pool_connections_lost", "Connections found broken before reuse", labels=["pool"])
+        for name, pool in list(self.pools.items()):
+            stats = pool.get_stats()
+            size, idle = stats.get("pool_size", 0), stats.get("pool_available", 0)
+            connections.add_metric([name, "in_use"], size - idle)
+            connections.add_metric([name, "idle"], idle)
+            waiting.add_metric([name], stats.get("requests_waiting", 0))
+            timeouts.add_metric([name], stats.get("requests_errors", 0))
+            lost.add_metric([name], stats.get("connections_lost", 0))
+        yield connections
+        yield waiting
+        yield timeouts
+        yield lost
+
+
+class CallbackGauge:
+    """
+    Gauge whose values are read from callbacks at scrape time. Unlike Gauge.set_function
+    it works in multiprocess mode too, where gauges are otherwise read from files.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: list):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._callbacks = {}
+
+    def set_function(self, labelvalues: tuple, f):
+        self._callbacks[labelvalues] = f
+
+    def collect(self):
+        family = GaugeMetricFamily(self.name, self.documentation, labels=self.labelnames)
+        for labelvalues, f in list(self._callbacks.items()):
+            family.add_metric(list(labelvalues), float(f()))
+        yield family
+
+
+POOL_COLLECTOR = PoolCollector()
+CACHE_SIZE = CallbackGauge(
+    "transaction_cache_size", "Entries and bytes held by the local transaction cache",
+    ["unit"],
+)
+VELOCITY_USERS = CallbackGauge("velocity_users", "Users held by the in-memory velocity store", [])
+# Collectors of this process's state, rendered directly in multiprocess mode too.
+SCRAPE_COLLECTORS = (POOL_COLLECTOR, CACHE_SIZE, VELOCITY_USERS)
+for collector in SCRAPE_COLLECTORS:
+    REGISTRY.register(collector)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request. Unlike BaseHTTPMiddleware it does
+    not buffer streamed responses, and its cost is a clock read and a histogram update.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the shared scope dict.
+            route = scope.get("route")
+            REQUEST_DURATION.labels(
+                scope["method"], getattr(route, "path", "<unmatched>"), str(status)
+            ).observe(time.perf_counter() - started)
@@ -0,0 +1,415 @@
+from datetime import datetime
+import orjson
+import psycopg2
+from psycopg2.extras import execute_values
+from server import partitions
+from server.devices import device_id
+
+# Versioned schema migrations. Each entry is applied once, in order, inside its own
+# transaction, and recorded in schema_migrations. Run at deploy time with
+# `python migrate.py` (from src/), never on import. A step is a SQL statement, or a
+# function called with the migration cursor for work SQL cannot do.
+
+MIGRATIONS_LOCK_ID = 7240001  # pg_advisory_lock key, so concurrent deploys apply each migration once
+
+
+def _map_device_data(cur):
+    # Device ids are hashed in Python (devices.py), so existing payloads are hashed here
+    # too and land on the same ids as new inserts. Maps each distinct payload to its id.
+    cur.execute("CREATE TEMP TABLE device_map (data JSONB PRIMARY KEY, device_id BIGINT NOT NULL) ON COMMIT DROP")
+    payloads = cur.connection.cursor(name="device_payloads")
+    payloads.itersize = 10000
+    payloads.execute("""
+        SELECT data::text FROM (
+            SELECT origin_device_data AS data FROM Transactions
+            UNION
+            SELECT destination_device_data FROM Transactions
+        ) d
+        WHERE data IS NOT NULL AND data <> 'null'::jsonb
+    """)
+    while True:
+        texts = payloads.fetchmany(payloads.itersize)
+        if not texts:
+            break
+        execute_values(
+            cur, "INSERT INTO device_map (data, device_id) VALUES %s",
+            [(text, device_id(orjson.loads(text))) for (text,) in texts], template="(%s::jsonb, %s)",
+        )
+    payloads.close()
+
+
+def _partition_existing_rows(cur):
+    # Partitions for every interval holding a row, and the upcoming ones, before the copy.
+    buckets = partitions.upcoming_buckets(datetime.now()) | partitions.data_buckets(cur, "transactions_unpartitioned")
+    partitions.create_partitions(cur, buckets)
+
+MIGRATIONS = [
+    (1, "initial_schema", [
+        """
+        CREATE TABLE IF NOT EXISTS ApiKeys (
+            key_hash CHAR(64) PRIMARY KEY,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """,
+        # Keys used to hold plaintext API keys; hash them into ApiKeys and drop it.
+        """
+        DO $$
+        BEGIN
+            IF to_regclass('keys') IS NOT NULL THEN
+                INSERT INTO ApiKeys (key_hash)
+                SELECT encode(sha256(convert_to(key, 'UTF8')), 'hex') FROM Keys WHERE key IS NOT NULL
+                ON CONFLICT DO NOTHING;
+                DROP TABLE Keys;
+            END IF;
+        END $$;
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Transactions (
+            id SERIAL PRIMARY KEY,
+            transaction_id NUMERIC,
+            type VARCHAR(50) NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            origin_user_id VARCHAR(50) ,
+            destination_user_id VARCHAR(50) ,
+            origin_amount NUMERIC NOT NULL,
+            origin_currency VARCHAR(3) NOT NULL,
+            origin_country VARCHAR(2) ,
+            destination_amount NUMERIC NOT NULL,
+            destination_currency VARCHAR(3) NOT NULL,
+            destination_country VARCHAR(2) ,
+            promotion_code_used BOOLEAN,
+            reference VARCHAR(255),
+            origin_device_data JSONB,
+            destination_device_data JSONB,
+            tags JSONB
+        );
+        """,
+    ]),
+    (2, "transaction_indexes", [
+        # Fail with a readable message instead of a bare unique violation.
+        """
+        DO $$
+        DECLARE duplicates BIGINT;
+        BEGIN
+            SELECT count(*) INTO duplicates FROM (
+                SELECT transaction_id FROM Transactions GROUP BY transaction_id HAVING count(*) > 1
+            ) d;
+            IF duplicates > 0 THEN
+                RAISE EXCEPTION '% transaction_id values are used by more than one row; resolve them before creating the unique index', duplicates;
+            END IF;
+        END $$;
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS transactions_transaction_id_key ON Transactions (transaction_id);",
+        # Date range searches, and index-only scans for the summary and total reports.
+        "CREATE INDEX IF NOT EXISTS transactions_timestamp_idx ON Transactions (timestamp) INCLUDE (type, origin_amount);",
+        "CREATE INDEX IF NOT EXISTS transactions_type_timestamp_idx ON Transactions (type, timestamp);",
+        "CREATE INDEX IF NOT EXISTS transactions_origin_amount_timestamp_idx ON Transactions (origin_amount, timestamp);",
+    ]),
+    (3, "keyset_pagination_indexes", [
+        # Search pages are ordered by (timestamp, id); end every index on that key.
+        "CREATE INDEX IF NOT EXISTS transactions_timestamp_id_idx ON Transactions (timestamp, id) INCLUDE (type, origin_amount);",
+        "CREATE INDEX IF NOT EXISTS transactions_type_timestamp_id_idx ON Transactions (type, timestamp, id);",
+        "CREATE INDEX IF NOT EXISTS transactions_origin_amount_timestamp_id_idx ON Transactions (origin_amount, timestamp, id);",
+        "DROP INDEX IF EXISTS transactions_timestamp_idx;",
+        "DROP INDEX IF EXISTS transactions_type_timestamp_idx;",
+        "DROP INDEX IF EXISTS transactions_origin_amount_timestamp_idx;",
+    ]),
+    (4, "transaction_rollups", [
+        # Count and origin_amount sum per (bucket, type). Kept current by a statement-level
+        # trigger, so single inserts, COPY and the cron generator all feed them.
+        """
+        CREATE TABLE IF NOT EXISTS HourlyTransactionRollups (
+            bucket TIMESTAMP NOT NULL,
+            type VARCHAR(50) NOT NULL,
+            count BIGINT NOT NULL,
+            total_amount NUMERIC NOT NULL,
+            PRIMARY KEY (bucket, type)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS DailyTransactionRollups (
+            bucket TIMESTAMP NOT NULL,
+            type VARCHAR(50) NOT NULL,
+            count BIGINT NOT NULL,
+            total_amount NUMERIC NOT NULL,
+            PRIMARY KEY (bucket, type)
+        );
+        """,
+        # Buckets are upserted in key order so concurrent bulk inserts cannot deadlock.
+        """
+        CREATE OR REPLACE FUNCTION transactions_rollup_insert() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO HourlyTransactionRollups AS r (bucket, type, count, total_amount)
+            SELECT date_trunc('hour', timestamp), type, count(*), sum(origin_amount)
+            FROM new_rows WHERE timestamp IS NOT NULL
+            GROUP BY 1, 2 ORDER BY 1, 2
+            ON CONFLICT (bucket, type) DO UPDATE
+            SET count = r.count + EXCLUDED.count, total_amount = r.total_amount + EXCLUDED.total_amount;
+
+            INSERT INTO DailyTransactionRollups AS r (bucket, type, count, total_amount)
+            SELECT date_trunc('day', timestamp), type, count(*), sum(origin_amount)
+            FROM new_rows WHERE timestamp IS NOT NULL
+            GROUP BY 1, 2 ORDER BY 1, 2
+            ON CONFLICT (bucket, type) DO UPDATE
+            SET count = r.count + EXCLUDED.count, total_amount = r.total_amount + EXCLUDED.total_amount;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+        """,
+        # Creating the trigger locks out writers until commit, so the backfill below
+        # sees every row that the trigger will not.
+        "DROP TRIGGER IF EXISTS transactions_rollup_insert ON Transactions;",
+        """
+        CREATE TRIGGER transactions_rollup_insert AFTER INSERT ON Transactions
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION transactions_rollup_insert();
+        """,
+        """
+        INSERT INTO HourlyTransactionRollups (bucket, type, count, total_amount)
+        SELECT date_trunc('hour', timestamp), type, count(*), sum(origin_amount)
+        FROM Transactions WHERE timestamp IS NOT NULL GROUP BY 1, 2
+        ON CONFLICT DO NOTHING;
+        """,
+        """
+        INSERT INTO DailyTransactionRollups (bucket, type, count, total_amount)
+        SELECT date_trunc('day', timestamp), type, count(*), sum(origin_amount)
+        FROM Transactions WHERE timestamp IS NOT NULL GROUP BY 1, 2
+        ON CONFLICT DO NOTHING;
+        """,
+    ]),
+    (5, "user_id_indexes", [
+        # Advanced search matches a user on either side of the transaction (BitmapOr).
+        "CREATE INDEX IF NOT EXISTS transactions_origin_user_id_timestamp_id_idx ON Transactions (origin_user_id, timestamp, id);",
+        "CREATE INDEX IF NOT EXISTS transactions_destination_user_id_timestamp_id_idx ON Transactions (destination_user_id, timestamp, id);",
+    ]),
+    (6, "bigint_transaction_ids", [
+        # Time-ordered ids from utils/ids.py are 63 bit integers; store them as BIGINT so
+        # lookups compare int8 and new ids append to the right edge of the unique index.
+        """
+        DO $$
+        DECLARE invalid BIGINT;
+        BEGIN
+            SELECT count(*) INTO invalid FROM Transactions
+            WHERE transaction_id <> trunc(transaction_id)
+               OR transaction_id NOT BETWEEN -9223372036854775808 AND 9223372036854775807;
+            IF invalid > 0 THEN
+                RAISE EXCEPTION '% transaction_id values are not 64 bit integers; fix them before converting the column', invalid;
+            END IF;
+        END $$;
+        """,
+        # Rewrites the table and rebuilds its indexes under an exclusive lock.
+        "ALTER TABLE Transactions ALTER COLUMN transaction_id TYPE BIGINT USING transaction_id::bigint;",
+        # Each process takes the next value as its id worker; the sequence wraps at 1024 workers.
+        "CREATE SEQUENCE IF NOT EXISTS transaction_id_workers MINVALUE 0 MAXVALUE 1023 START 0 CYCLE;",
+    ]),
+    (7, "device_table", [
+        # Each distinct device payload is stored once; transactions reference it by id.
+        """
+        CREATE TABLE IF NOT EXISTS Devices (
+            device_id BIGINT PRIMARY KEY,
+            data JSONB NOT NULL
+        );
+        """,
+        "ALTER TABLE Transactions ADD COLUMN origin_device_id BIGINT, ADD COLUMN destination_device_id BIGINT;",
+        _map_device_data,
+        "INSERT INTO Devices (device_id, data) SELECT DISTINCT ON (device_id) device_id, data FROM device_map ORDER BY device_id ON CONFLICT DO NOTHING;",
+        # JSON nulls have no device and become SQL NULLs.
+        """
+        UPDATE Transactions t SET
+            origin_device_id = (SELECT device_id FROM device_map WHERE data = t.origin_device_data),
+            destination_device_id = (SELECT device_id FROM device_map WHERE data = t.destination_device_data)
+        WHERE t.origin_device_data IS NOT NULL OR t.destination_device_data IS NOT NULL;
+        """,
+        # The space is reused by new rows; run VACUUM FULL Transactions (or pg_repack) to return it.
+        "ALTER TABLE Transactions DROP COLUMN origin_device_data, DROP COLUMN destination_device_data;",
+    ]),
+    (8, "partitioned_transactions", [
+        # Range partitioning needs a timestamp on every row.
+        """
+        DO $$
+        DECLARE missing BIGINT;
+        BEGIN
+            SELECT count(*) INTO missing FROM Transactions WHERE timestamp IS NULL;
+            IF missing > 0 THEN
+                RAISE EXCEPTION '% transactions have no timestamp; set one before partitioning the table', missing;
+            END IF;
+        END $$;
+        """,
+        # Copies every row into the partitioned table under an exclusive lock.
+        "ALTER TABLE Transactions RENAME TO transactions_unpartitioned;",
+        "ALTER SEQUENCE transactions_id_seq OWNED BY NONE;",
+        # No primary key: unique constraints of a partitioned table must include the
+        # partition key. ids still come from the sequence.
+        """
+        CREATE TABLE Transactions (
+            id INTEGER NOT NULL DEFAULT nextval('transactions_id_seq'),
+            transaction_id BIGINT,
+            type VARCHAR(50) NOT NULL,
+            timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            origin_user_id VARCHAR(50),
+            destination_user_id VARCHAR(50),
+            origin_amount NUMERIC NOT NULL,
+            origin_currency VARCHAR(3) NOT NULL,
+            origin_country VARCHAR(2),
+            destination_amount NUMERIC NOT NULL,
+            destination_currency VARCHAR(3) NOT NULL,
+            destination_country VARCHAR(2),
+            promotion_code_used BOOLEAN,
+            reference VARCHAR(255),
+            tags JSONB,
+            origin_device_id BIGINT,
+            destination_device_id BIGINT
+        ) PARTITION BY RANGE (timestamp);
+        """,
+        "ALTER SEQUENCE transactions_id_seq OWNED BY Transactions.id;",
+        # Rows outside every partition land here until partitions.maintain() moves them.
+        "CREATE TABLE transactions_default PARTITION OF Transactions DEFAULT;",
+        _partition_existing_rows,
+        """
+        INSERT INTO Transactions (
+            id, transaction_id, type, timestamp, origin_user_id, destination_user_id,
+            origin_amount, origin_currency, origin_country,
+            destination_amount, destination_currency, destination_country,
+            promotion_code_used, reference, tags, origin_device_id, destination_device_id
+        )
+        SELECT
+            id, transaction_id, type, timestamp, origin_user_id, destination_user_id,
+            origin_amount, origin_currency, origin_country,
+            destination_amount, destination_currency, destination_country,
+            promotion_code_used, reference, tags, origin_device_id, destination_device_id
+        FROM transactions_unpartitioned;
+        """,
+        "DROP TABLE transactions_unpartitioned;",
+        # transaction_id stays unique across partitions here, and maps an id to the
+        # timestamp that locates its partition.
+        """
+        CREATE TABLE TransactionIds (
+            transaction_id BIGINT PRIMARY KEY,
+            timestamp TIMESTAMP NOT NULL
+        );
+        """,
+        "INSERT INTO TransactionIds (transaction_id, timestamp) SELECT transaction_id, timestamp FROM Transactions WHERE transaction_id IS NOT NULL;",
+        # The indexes of migrations 2, 3 and 5, created on every partition.
+        "CREATE UNIQUE INDEX transactions_transaction_id_key ON Transactions (transaction_id, timestamp);",
+        "CREATE INDEX transactions_timestamp_id_idx ON Transactions (timestamp, id) INCLUDE (type, origin_amount);",
+        "CREATE INDEX transactions_type_timestamp_id_idx ON Transactions (type, timestamp, id);",
+        "CREATE INDEX transactions_origin_amount_timestamp_id_idx ON Transactions (origin_amount, timestamp, id);",
+        "CREATE INDEX transactions_origin_user_id_timestamp_id_idx ON Transactions (origin_user_id, timestamp, id);",
+        "CREATE INDEX transactions_destination_user_id_timestamp_id_idx ON Transactions (destination_user_id, timestamp, id);",
+        # The rollup trigger of migration 4, now also recording ids. A duplicate id
+        # fails the whole statement, as the unique index on transaction_id did.
+        """
+        CREATE OR REPLACE FUNCTION transactions_rollup_insert() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO TransactionIds (transaction_id, timestamp)
+            SELECT transaction_id, timestamp FROM new_rows WHERE transaction_id IS NOT NULL;
+
+            INSERT INTO HourlyTransactionRollups AS r (bucket, type, count, total_amount)
+            SELECT date_trunc('hour', timestamp), type, count(*), sum(origin_amount)
+            FROM new_rows
+            GROUP BY 1, 2 ORDER BY 1, 2
+            ON CONFLICT (bucket, type) DO UPDATE
+            SET count = r.count + EXCLUDED.count, total_amount = r.total_amount + EXCLUDED.total_amount;
+
+            INSERT INTO DailyTransactionRollups AS r (bucket, type, count, total_amount)
+            SELECT date_trunc('day', timestamp), type, count(*), sum(origin_amount)
+            FROM new_rows
+            GROUP BY 1, 2 ORDER BY 1, 2
+            ON CONFLICT (bucket, type) DO UPDATE
+            SET count = r.count + EXCLUDED.count, total_amount = r.total_amount + EXCLUDED.total_amount;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+        """,
+        """
+        CREATE TRIGGER transactions_rollup_insert AFTER INSERT ON Transactions
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION transactions_rollup_insert();
+        """,
+        "ANALYZE Transactions;",
+    ]),
+    (9, "transaction_risk_scores", [
+        # Filled by server/rules.py as transactions are stored; NULL scores are from before
+        # the rules ran, until rescored. Constant defaults leave existing rows untouched.
+        "ALTER TABLE Transactions ADD COLUMN hit_rules JSONB NOT NULL DEFAULT '[]', ADD COLUMN risk_score REAL, ADD COLUMN risk_level VARCHAR(10);",
+    ]),
+    (10, "transaction_velocity_notify", [
+        # Sends the per-user, per-minute count and amount of each inserting statement to
+        # server/velocity.py, in chunks under the 8000 byte payload limit. Delivered on
+        # commit only; the xid lets a store rebuilt from a snapshot skip what it counted.
+        # Rows dated more than a week away from now are left out.
+        """
+        CREATE OR REPLACE FUNCTION transactions_velocity_notify() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('transactions_velocity', json_build_object(
+                'xid', pg_current_xact_id()::text::bigint,
+                'rows', json_agg(json_build_array(user_id, minute, count, amount))
+            )::text)
+            FROM (
+                SELECT origin_user_id AS user_id, extract(epoch FROM date_trunc('minute', timestamp))::bigint AS minute,
+                       count(*) AS count, sum(origin_amount) AS amount, (row_number() OVER () - 1) / 50 AS chunk
+                FROM new_rows
+                WHERE origin_user_id IS NOT NULL
+                AND timestamp > localtimestamp - interval '8 days' AND timestamp < localtimestamp + interval '1 day'
+                GROUP BY 1, 2
+            ) deltas
+            GROUP BY chunk;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql;
+        """,
+        """
+        CREATE TRIGGER transactions_velocity_notify AFTER INSERT ON Transactions
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION transactions_velocity_notify();
+        """,
+    ]),
+]
+
+
+def migrate(conn) -> list:
+    """
+    Applies every pending migration on a psycopg2 connection.
+
+    :param conn: Open psycopg2 connection; it is left open.
+    :return: (version, name) of each migration applied by this call.
+    """
+    applied_now = []
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK_ID,))
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        conn.commit()
+
+        cur.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cur.fetchall()}
+        for version, name, statements in MIGRATIONS:
+            if version in applied:
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(cur)
+                else:
+                    cur.execute(statement)
+            cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+            applied_now.append((version, name))
+        return applied_now
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK_ID,))
+        conn.commit()
+        cur.close()
+
+
+def run_migrations(database_url: str) -> list:
+    conn = psycopg2.connect(database_url)
+    try:
+        return migrate(conn)
+    finally:
+        conn.close()
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Any
+from typing_extensions import TypedDict, NotRequired
 from datetime import datetime, date
 from enum import Enum
 
@@ -125,3 +126,26 @@ class Transaction(BaseModel):
     originDeviceData: Optional[DeviceData] = None
     destinationDeviceData: Optional[DeviceData] = None
     tags: Optional[List[Tag]] = None
+
+
+# Plain-dict mirror of Transaction. Validating against it through a TypeAdapter checks
+# every field without instantiating models, which keeps bulk ingest cheap per row.
+class AmountDetailsRow(TypedDict):
+    transactionAmount: float
+    transactionCurrency: Currency
+    country: Country
+
+
+class TransactionRow(TypedDict):
+    type: TransactionType
+    transactionId: int
+    timestamp: datetime
+    originUserId: NotRequired[Optional[str]]
+    destinationUserId: NotRequired[Optional[str]]
+    originAmountDetails: AmountDetailsRow
+    destinationAmountDetails: AmountDetailsRow
+    promotionCodeUsed: NotRequired[Optional[bool]]
+    reference: NotRequired[Optional[str]]
+    originDeviceData: NotRequired[Optional[Dict[str, Any]]]
+    destinationDeviceData: NotRequired[Optional[Dict[str, Any]]]
+    tags: NotRequired[Optional[List[Dict[str, str]]]]
@@ -0,0 +1,241 @@
+import asyncio
+import os
+import re
+from datetime import datetime, timedelta
+import psycopg2
+from dotenv import load_dotenv
+from psycopg2 import sql
+from server import archive
+
+load_dotenv()
+
+# Transactions is range partitioned by timestamp (migration 8). maintain() keeps
+# partitions PARTITION_AHEAD_DAYS ahead of the clock, gives rows that landed in the
+# default partition (history imported from before the first partition, or beyond the
+# last) partitions of their own, and detaches partitions older than
+# PARTITION_RETENTION_DAYS. Detached partitions are left as plain tables named
+# transactions_pYYYYMMDD, with their ids and rollups removed from the live tables.
+# Partitions that ended ARCHIVE_AFTER_DAYS ago are first written to server.archive,
+# then detached and dropped.
+#
+# New partitions span PARTITION_INTERVAL ("day" or "month"); changing it only affects
+# partitions created afterwards.
+
+PARTITION_INTERVAL = os.getenv("PARTITION_INTERVAL", "month")
+PARTITION_AHEAD_DAYS = int(os.getenv("PARTITION_AHEAD_DAYS", "60"))
+PARTITION_RETENTION_DAYS = int(os.environ["PARTITION_RETENTION_DAYS"]) if os.getenv("PARTITION_RETENTION_DAYS") else None
+PARTITION_CHECK_INTERVAL = float(os.getenv("PARTITION_CHECK_INTERVAL", "3600"))  # seconds between runs in the app
+
+PARTITIONS_LOCK_ID = 7240002  # pg_try_advisory_xact_lock key, so one worker runs maintain() at a time
+DEFAULT_PARTITION = "transactions_default"
+INTERVALS = ("day", "month")
+
+_BOUND = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+PARTITIONS = """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+    FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'transactions'::regclass
+"""
+
+
+def bucket(timestamp: datetime, interval: str = PARTITION_INTERVAL) -> tuple:
+    """
+    The [start, end) range of `interval` containing timestamp.
+    """
+    if interval not in INTERVALS:
+        raise ValueError(f"partition interval must be one of {', '.join(INTERVALS)}")
+    start = datetime(timestamp.year, timestamp.month, 1 if interval == "month" else timestamp.day)
+    if interval == "day":
+        return start, start + timedelta(days=1)
+    return start, datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def partition_name(start: datetime) -> str:
+    return f"transactions_p{start:%Y%m%d}"
+
+
+def list_partitions(cur) -> list:
+    """
+    (name, start, end) of every range partition of Transactions, by start.
+    """
+    cur.execute(PARTITIONS)
+    partitions = []
+    for name, bound in cur.fetchall():
+        match = _BOUND.search(bound)
+        if match:
+            partitions.append((name, datetime.fromisoformat(match.group(1)), datetime.fromisoformat(match.group(2))))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def uncovered(start: datetime, end: datetime, partitions: list) -> list:
+    """
+    The parts of [start, end) that no partition covers, as (start, end) ranges.
+    """
+    ranges = []
+    for _, lo, hi in partitions:
+        if hi <= start or lo >= end:
+            continue
+        if lo > start:
+            ranges.append((start, lo))
+        start = max(start, hi)
+    if start < end:
+        ranges.append((start, end))
+    return ranges
+
+
+def create_partition(cur, start: datetime, end: datetime) -> str:
+    """
+    Creates the partition for [start, end). Rows of that range in the default partition
+    are moved into it first, since a partition cannot be created over them.
+    """
+    name = partition_name(start)
+    bounds = {"table": sql.Identifier(name), "start": sql.Literal(start), "end": sql.Literal(end)}
+    cur.execute(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE timestamp >= %s AND timestamp < %s)", (start, end))
+    if not cur.fetchone()[0]:
+        cur.execute(sql.SQL("CREATE TABLE {table} PARTITION OF Transactions FOR VALUES FROM ({start}) TO ({end})").format(**bounds))
+        return name
+    cur.execute(sql.SQL("CREATE TABLE {table} (LIKE Transactions INCLUDING DEFAULTS)").format(**bounds))
+    # The check lets ATTACH skip scanning the new partition for rows outside its range.
+    cur.execute(sql.SQL("ALTER TABLE {table} ADD CONSTRAINT partition_range CHECK (timestamp >= {start} AND timestamp < {end})").format(**bounds))
+    cur.execute(sql.SQL(f"""
+        WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= {{start}} AND timestamp < {{end}} RETURNING *)
+        INSERT INTO {{table}} SELECT * FROM moved
+    """).format(**bounds))
+    cur.execute(sql.SQL("ALTER TABLE Transactions ATTACH PARTITION {table} FOR VALUES FROM ({start}) TO ({end})").format(**bounds))
+    cur.execute(sql.SQL("ALTER TABLE {table} DROP CONSTRAINT partition_range").format(**bounds))
+    return name
+
+
+def create_partitions(cur, buckets: set) -> list:
+    """
+    Creates partitions for the parts of each (start, end) bucket no partition covers yet.
+
+    :return: Names of the partitions created.
+    """
+    created = []
+    for bucket_start, bucket_end in sorted(buckets):
+        for start, end in uncovered(bucket_start, bucket_end, list_partitions(cur)):
+            created.append(create_partition(cur, start, end))
+    return created
+
+
+def buckets_between(start: datetime, end: datetime, interval: str = PARTITION_INTERVAL) -> set:
+    """
+    Buckets covering every timestamp from start to end.
+    """
+    buckets = {bucket(start, interval)}
+    while max(buckets)[1] <= end:
+        buckets.add(bucket(max(buckets)[1], interval))
+    return buckets
+
+
+def upcoming_buckets(now: datetime, interval: str = PARTITION_INTERVAL, ahead_days: int = PARTITION_AHEAD_DAYS) -> set:
+    return buckets_between(now, now + timedelta(days=ahead_days), interval)
+
+
+def data_buckets(cur, table: str, interval: str = PARTITION_INTERVAL) -> set:
+    """
+    Buckets holding at least one row of `table`.
+    """
+    cur.execute(sql.SQL("SELECT DISTINCT date_trunc(%s, timestamp) FROM {}").format(sql.Identifier(table)), (interval,))
+    return {bucket(timestamp, interval) for (timestamp,) in cur.fetchall()}
+
+
+def detach_partition(cur, name: str, start: datetime, end: datetime):
+    """
+    Detaches a partition and removes its rows from TransactionIds and the rollups, so
+    the live tables agree with what is left. The partition is kept as a plain table.
+    """
+    table = sql.Identifier(name)
+    cur.execute(sql.SQL("ALTER TABLE Transactions DETACH PARTITION {}").format(table))
+    cur.execute(sql.SQL("DELETE FROM TransactionIds WHERE transaction_id IN (SELECT transaction_id FROM {})").format(table))
+    for rollups in ("HourlyTransactionRollups", "DailyTransactionRollups"):
+        cur.execute(f"DELETE FROM {rollups} WHERE bucket >= %s AND bucket < %s", (start, end))
+
+
+def archive_partition(cur, name: str, start: datetime, end: datetime) -> int:
+    """
+    Moves a partition to the archive: writes its rows, moves the watermark past them,
+    then detaches and drops it. Files are written before the transaction commits; if it
+    does not, the next run writes them again.
+
+    :return: Number of rows archived.
+    """
+    count = archive.write_archive(cur.connection, name)
+    archive.advance_watermark(end)
+    detach_partition(cur, name, start, end)
+    cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+    return count
+
+
+def maintain(conn, interval: str = PARTITION_INTERVAL, ahead_days: int = PARTITION_AHEAD_DAYS,
+             retention_days: int = PARTITION_RETENTION_DAYS, now: datetime = None,
+             archive_after_days: int = archive.ARCHIVE_AFTER_DAYS) -> dict:
+    """
+    Creates upcoming partitions and partitions for rows in the default partition, then
+    archives and detaches expired ones, in one transaction. Does nothing while another
+    process is maintaining partitions.
+
+    :param conn: Open psycopg2 connection; it is left open.
+    :param retention_days: Partitions ending this many days ago are detached; None keeps all.
+    :param archive_after_days: Partitions ending this many days ago are archived; None archives none.
+    :return: Names of the partitions created, archived and detached.
+    """
+    now = now or datetime.now()
+    result = {"created": [], "archived": [], "detached": []}
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (PARTITIONS_LOCK_ID,))
+        if not cur.fetchone()[0]:
+            conn.rollback()
+            return result
+        # Attaching and detaching lock Transactions; give up rather than queue queries behind them.
+        cur.execute("SET LOCAL lock_timeout = '5s'")
+
+        buckets = upcoming_buckets(now, interval, ahead_days) | data_buckets(cur, DEFAULT_PARTITION, interval)
+        result["created"] = create_partitions(cur, buckets)
+
+        if archive_after_days is not None:
+            cutoff = now - timedelta(days=archive_after_days)
+            for name, start, end in list_partitions(cur):
+                if end <= cutoff:
+                    archive_partition(cur, name, start, end)
+                    result["archived"].append(name)
+
+        if retention_days is not None:
+            cutoff = now - timedelta(days=retention_days)
+            for name, start, end in list_partitions(cur):
+                if end <= cutoff:
+                    detach_partition(cur, name, start, end)
+                    result["detached"].append(name)
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def run_maintenance(database_url: str, **kwargs) -> dict:
+    conn = psycopg2.connect(database_url)
+    try:
+        return maintain(conn, **kwargs)
+    finally:
+        conn.close()
+
+
+async def maintain_periodically(database_url: str, interval: float = PARTITION_CHECK_INTERVAL):
+    """
+    Runs maintenance at startup and every `interval` seconds until cancelled; a failed
+    run is logged and retried at the next one.
+    """
+    while True:
+        try:
+            result = await asyncio.to_thread(run_maintenance, database_url)
+            if any(result.values()):
+                print(f"Partitions created: {result['created']}, archived: {result['archived']}, detached: {result['detached']}")
+        except Exception as e:
+            print(f"An error occurred while maintaining partitions: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,246 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+# Pool settings, shared by the psycopg2 pool below (database.py) and the psycopg 3 pool
+# in async_database.py so both behave the same under load.
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "20"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # longest wait for a free connection
+POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))
+POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "600"))  # idle connections above min size are closed after this
+POOL_CHECK_IDLE = float(os.getenv("DB_POOL_CHECK_IDLE", "5"))  # connections idle longer are pinged before reuse
+
+
+class PoolTimeout(PoolError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 connection pool. getconn() waits up to `timeout` seconds for a
+    connection when all max_size are in use, instead of raising at once like
+    psycopg2.pool.SimpleConnectionPool. Connections are pinged before reuse when they
+    have been idle for more than check_idle seconds, replaced after max_lifetime, and
+    closed after max_idle above min_size. min_size connections are opened up front, or
+    with the first getconn() when the pool is created with lazy=True.
+    """
+
+    def __init__(self, dsn: str, min_size: int = POOL_MIN_SIZE, max_size: int = POOL_MAX_SIZE,
+                 timeout: float = POOL_TIMEOUT, max_lifetime: float = POOL_MAX_LIFETIME,
+                 max_idle: float = POOL_MAX_IDLE, check_idle: float = POOL_CHECK_IDLE, open: bool = True,
+                 lazy: bool = False):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_idle = check_idle
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, returned_at); reused LIFO so surplus connections go idle and are reaped
+        self._expires_at = {}  # every open connection -> monotonic deadline
+        self._size = 0  # open connections plus those being opened
+        self._waiting = 0
+        self._closed = True
+        self._stop = None
+        self._stats = dict.fromkeys(
+            ["requests_num", "requests_wait_ms", "requests_errors", "connections_num", "connections_errors", "connections_lost"], 0
+        )
+        self._lazy = lazy and open
+        if open and not lazy:
+            self.open()
+
+    def open(self):
+        with self._cond:
+            if not self._closed:
+                return
+            self._closed = False
+            self._stop = threading.Event()
+        self._fill()
+        threading.Thread(target=self._maintain, args=(self._stop,), name="db-pool-maintenance", daemon=True).start()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        if self._stop is not None:
+            self._stop.set()
+        for conn in idle:
+            self._discard(conn)
+
+    closeall = close
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def getconn(self, timeout: float = None):
+        """
+        :param timeout: Seconds to wait for a connection; defaults to the pool timeout.
+        :raises PoolTimeout: When no connection became available in time.
+        """
+        if self._lazy:
+            self._lazy = False
+            self.open()
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        with self._cond:
+            self._stats["requests_num"] += 1
+        while True:
+            conn, returned_at = self._acquire(deadline, timeout)
+            if conn is None:
+                conn = self._connect()
+            elif not self._usable(conn, returned_at):
+                self._discard(conn)
+                continue
+            with self._cond:
+                self._stats["requests_wait_ms"] += int((time.monotonic() - started) * 1000)
+            return conn
+
+    def putconn(self, conn, close: bool = False):
+        if not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+        if close or conn.closed or self._expired(conn):
+            self._discard(conn)
+            return
+        with self._cond:
+            if not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+        self._discard(conn)
+
+    def get_stats(self) -> dict:
+        """
+        Current pool state and cumulative counters, with the keys psycopg_pool uses.
+        """
+        with self._cond:
+            return dict(
+                self._stats,
+                pool_min=self.min_size,
+                pool_max=self.max_size,
+                pool_size=self._size,
+                pool_available=len(self._idle),
+                requests_waiting=self._waiting,
+            )
+
+    def _acquire(self, deadline: float, timeout: float) -> tuple:
+        # Returns an idle (conn, returned_at), or (None, None) with a slot reserved for a new connection.
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["requests_errors"] += 1
+                    raise PoolTimeout(f"couldn't get a connection after {timeout:.1f} sec")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    def _connect(self):
+        # Opens a connection into a slot already counted in _size.
+        try:
+            conn = psycopg2.connect(self.dsn)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._stats["connections_errors"] += 1
+                self._cond.notify()
+            raise
+        # Jitter, so connections opened together are not all replaced at once.
+        lifetime = self.max_lifetime * random.uniform(0.9, 1.0)
+        with self._cond:
+            self._expires_at[conn] = time.monotonic() + lifetime
+            self._stats["connections_num"] += 1
+        return conn
+
+    def _expired(self, conn) -> bool:
+        return time.monotonic() >= self._expires_at.get(conn, 0)
+
+    def _usable(self, conn, returned_at: float) -> bool:
+        if self._expired(conn):
+            return False
+        if not conn.closed and time.monotonic() - returned_at < self.check_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            with self._cond:
+                self._stats["connections_lost"] += 1
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            if self._expires_at.pop(conn, None) is not None:
+                self._size -= 1
+            self._cond.notify()
+
+    def _fill(self):
+        # Opens connections until min_size are open; errors are left to the next call.
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            conn = self._connect()
+            self.putconn(conn)
+
+    def _maintain(self, stop: threading.Event):
+        interval = max(min(self.max_idle, self.max_lifetime) / 4, 1)
+        while not stop.wait(interval):
+            now = time.monotonic()
+            stale = []
+            with self._cond:
+                keep = deque()
+                surplus = self._size - self.min_size
+                # Oldest returns first, so the least recently used connections are reaped.
+                for conn, returned_at in self._idle:
+                    if now >= self._expires_at.get(conn, 0) or (surplus > 0 and now - returned_at > self.max_idle):
+                        stale.append(conn)
+                        surplus -= 1
+                    else:
+                        keep.append((conn, returned_at))
+                self._idle = keep
+            for conn in stale:
+                self._discard(conn)
+            try:
+                self._fill()
+            except Exception as e:
+                print(f"An error occurred while refilling the connection pool: {e}")
@@ -0,0 +1,327 @@
+from enum import Enum
+from server import rules
+from server.devices import DeviceBatch, canonical_json
+
+# SQL shared by the blocking (psycopg2) and async (psycopg 3) data-access layers.
+# Both drivers use the same %s placeholder style, so the statements are written once.
+
+# Device payloads are stored once in Devices (see devices.py). Parameters are the ids
+# and canonical JSON texts of DeviceBatch.params().
+INSERT_DEVICES = """
+    INSERT INTO Devices (device_id, data)
+    SELECT * FROM unnest(%s::bigint[], %s::text[]::jsonb[]) ORDER BY 1
+    ON CONFLICT DO NOTHING
+"""
+
+# Columns of a transaction as the API returns it, with the device data joined back in.
+# Queries whose results never include device data select from Transactions alone.
+_TRANSACTION_COLUMNS = """
+    t.id, t.transaction_id, t.type, t.timestamp, t.origin_user_id, t.destination_user_id,
+    t.origin_amount, t.origin_currency, t.origin_country,
+    t.destination_amount, t.destination_currency, t.destination_country,
+    t.promotion_code_used, t.reference"""
+
+# Stores the transaction and its devices in one statement. The new devices are not
+# visible to a join in the same statement, so the device data is returned from the
+# parameters. Built by insert_params().
+INSERT_TRANSACTION = f"""
+    WITH devices AS ({INSERT_DEVICES})
+    INSERT INTO Transactions AS t (
+        transaction_id, type, timestamp, origin_user_id, destination_user_id,
+        origin_amount, origin_currency, origin_country,
+        destination_amount, destination_currency, destination_country,
+        promotion_code_used, reference, origin_device_id,
+        destination_device_id, tags, hit_rules, risk_score, risk_level
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    RETURNING {_TRANSACTION_COLUMNS},
+        %s::jsonb AS origin_device_data, %s::jsonb AS destination_device_data, t.tags,
+        t.hit_rules, t.risk_score, t.risk_level
+"""
+
+# Same column order as INSERT_TRANSACTION, so rows built by transaction_params can be
+# copied. The batch's DeviceBatch is stored with INSERT_DEVICES in the same transaction.
+COPY_TRANSACTIONS = """
+    COPY Transactions (
+        transaction_id, type, timestamp, origin_user_id, destination_user_id,
+        origin_amount, origin_currency, origin_country,
+        destination_amount, destination_currency, destination_country,
+        promotion_code_used, reference, origin_device_id,
+        destination_device_id, tags, hit_rules, risk_score, risk_level
+    ) FROM STDIN
+"""
+
+# Worker id for utils/ids.py, leased once per process.
+NEXT_ID_WORKER = """
+    SELECT nextval('transaction_id_workers')
+"""
+
+# TransactionIds gives the timestamp of the id. Compared through a subquery, which runs
+# before the scan starts, it prunes every partition but the one holding the row.
+SELECT_TRANSACTION_BY_ID = f"""
+    SELECT {_TRANSACTION_COLUMNS},
+        od.data AS origin_device_data, dd.data AS destination_device_data, t.tags,
+        t.hit_rules, t.risk_score, t.risk_level
+    FROM Transactions t
+    LEFT JOIN Devices od ON od.device_id = t.origin_device_id
+    LEFT JOIN Devices dd ON dd.device_id = t.destination_device_id
+    WHERE (t.transaction_id, t.timestamp) = (SELECT transaction_id, timestamp FROM TransactionIds WHERE transaction_id = %s)
+"""
+
+SEARCH_TRANSACTIONS_BY_AMOUNT = """
+    SELECT * FROM Transactions WHERE origin_amount = %s::numeric
+"""
+
+SEARCH_TRANSACTIONS_BY_DATE_RANGE = """
+    SELECT * FROM Transactions WHERE timestamp >= %s AND timestamp <= %s
+"""
+
+SEARCH_TRANSACTIONS_BY_TYPE = """
+    SELECT * FROM Transactions WHERE type = %s
+"""
+
+def search_page_query(search_query: str, after: bool) -> str:
+    """
+    Adds keyset pagination on (timestamp, id) to one of the SEARCH_TRANSACTIONS_* statements.
+    Parameters are those of search_page_params().
+    """
+    query = search_query.rstrip()
+    if after:
+        # The planner cannot prune partitions on a row comparison; the plain bound lets it
+        # skip the partitions before the previous page.
+        query += " AND timestamp >= %s AND (timestamp, id) > (%s, %s)"
+    return query + " ORDER BY timestamp, id LIMIT %s"
+
+
+def search_page_params(params: tuple, after: tuple, limit: int) -> tuple:
+    """
+    The search parameters, then the (timestamp, id) of the previous page when set, then the limit.
+    """
+    if after is None:
+        return params + (limit,)
+    return params + (after[0],) + tuple(after) + (limit,)
+
+
+# Filters of the advanced search, applied in this order. Each value is bound to every
+# %s of its predicate. All of them can use an index except country, which only filters.
+# Amounts are cast to NUMERIC: psycopg binds floats as float8, and comparing the NUMERIC
+# column to a float8 casts the column instead and rules out its index.
+ADVANCED_SEARCH_FILTERS = [
+    ("amount", "origin_amount = %s::numeric"),
+    ("min_amount", "origin_amount >= %s::numeric"),
+    ("max_amount", "origin_amount <= %s::numeric"),
+    ("start_date", "timestamp >= %s"),
+    ("end_date", "timestamp <= %s"),
+    ("type", "type = %s"),
+    ("user_id", "(origin_user_id = %s OR destination_user_id = %s)"),
+    ("country", "(origin_country = %s OR destination_country = %s)"),
+]
+
+ADVANCED_SEARCH_SORT_COLUMNS = {"timestamp": "timestamp", "origin_amount": "origin_amount"}
+
+
+def advanced_search_query(filters: dict, sort_by: str = "timestamp", descending: bool = False, limit: int = 100, after: tuple = None) -> tuple:
+    """
+    Builds one parameterized statement for any combination of ADVANCED_SEARCH_FILTERS,
+    ordered by (sort column, id) with keyset pagination.
+
+    :param filters: Filter name to value; None values are skipped.
+    :param after: (sort value, id) of the last row of the previous page.
+    :return: (sql, params)
+    """
+    clauses, params = _filter_clauses(filters)
+    column = ADVANCED_SEARCH_SORT_COLUMNS[sort_by]
+    operator, direction = ("<", "DESC") if descending else (">", "ASC")
+    if after is not None:
+        if column == "timestamp":
+            # Lets the planner prune the partitions before the previous page, as in search_page_query.
+            clauses.append(f"timestamp {operator}= %s")
+            params.append(after[0])
+        clauses.append(f"({column}, id) {operator} (%s, %s)")
+        params.extend(after)
+
+    where = " AND ".join(clauses) or "TRUE"
+    query = f"SELECT * FROM Transactions WHERE {where} ORDER BY {column} {direction}, id {direction} LIMIT %s"
+    return query, tuple(params) + (limit,)
+
+
+def _filter_clauses(filters: dict) -> tuple:
+    # WHERE clauses and parameters for the ADVANCED_SEARCH_FILTERS set in `filters`.
+    clauses, params = [], []
+    for name, predicate in ADVANCED_SEARCH_FILTERS:
+        value = filters.get(name)
+        if value is None:
+            continue
+        clauses.append(predicate)
+        params.extend([_plain(value)] * predicate.count("%s"))
+    return clauses, params
+
+
+# Columns of /transactions/export, as (name, expression). Every value is a plain int,
+# float, bool or str, so rows load without building datetime or Decimal objects:
+# timestamps are microseconds since the epoch and amounts are read as float8.
+EXPORT_COLUMNS = [
+    ("transaction_id", "transaction_id"),
+    ("type", "type"),
+    ("timestamp", "(extract(epoch FROM timestamp) * 1000000)::bigint"),
+    ("origin_user_id", "origin_user_id"),
+    ("destination_user_id", "destination_user_id"),
+    ("origin_amount", "origin_amount::float8"),
+    ("origin_currency", "origin_currency"),
+    ("origin_country", "origin_country"),
+    ("destination_amount", "destination_amount::float8"),
+    ("destination_currency", "destination_currency"),
+    ("destination_country", "destination_country"),
+    ("promotion_code_used", "promotion_code_used"),
+    ("reference", "reference"),
+]
+
+
+def export_query(filters: dict) -> tuple:
+    """
+    Selects EXPORT_COLUMNS for any combination of ADVANCED_SEARCH_FILTERS, in
+    (timestamp, id) order.
+
+    :return: (sql, params)
+    """
+    clauses, params = _filter_clauses(filters)
+    columns = ", ".join(f"{expression} AS {name}" for name, expression in EXPORT_COLUMNS)
+    where = " AND ".join(clauses) or "TRUE"
+    return f"SELECT {columns} FROM Transactions WHERE {where} ORDER BY timestamp, id", tuple(params)
+
+
+VERIFY_KEY = """
+    SELECT 1 FROM ApiKeys WHERE key_hash = %s
+"""
+
+INSERT_KEY = """
+    INSERT INTO ApiKeys (key_hash) VALUES (%s) ON CONFLICT DO NOTHING
+"""
+
+DELETE_KEY = """
+    DELETE FROM ApiKeys WHERE key_hash = %s
+"""
+
+KEY_CHANGED_CHANNEL = "api_keys_changed"
+
+NOTIFY_KEY_CHANGED = f"""
+    SELECT pg_notify('{KEY_CHANGED_CHANNEL}', %s)
+"""
+
+# Sent by the Transactions insert trigger of migration 10 on commit, for server/velocity.py.
+VELOCITY_CHANNEL = "transactions_velocity"
+
+CURRENT_SNAPSHOT = """
+    SELECT pg_current_snapshot()::text
+"""
+
+# Recent history of the velocity store, per user and minute as the trigger sends it.
+VELOCITY_HISTORY = """
+    SELECT origin_user_id, extract(epoch FROM date_trunc('minute', timestamp))::bigint, count(*), sum(origin_amount)::float8
+    FROM Transactions
+    WHERE origin_user_id IS NOT NULL AND timestamp > %s
+    GROUP BY 1, 2
+"""
+
+# Splits [start, end] into whole days and whole hours, answered from the rollup tables,
+# and the partial hours at either edge, which are the only raw rows scanned. Each part
+# is a plain range on its own index. Yields (type, count, total_amount) per part.
+_REPORT_PARTS = """
+    WITH edges AS (
+        SELECT lo, hi,
+               CASE WHEN date_trunc('hour', lo) = lo THEN lo ELSE date_trunc('hour', lo) + interval '1 hour' END AS hour_lo,
+               date_trunc('hour', hi) AS hour_hi,
+               CASE WHEN date_trunc('day', lo) = lo THEN lo ELSE date_trunc('day', lo) + interval '1 day' END AS day_lo,
+               date_trunc('day', hi) AS day_hi
+        FROM (SELECT %s::timestamp AS lo, %s::timestamp AS hi) r
+    ),
+    bounds AS (
+        SELECT lo, hi, day_lo, day_hi,
+               -- whole hours before and after the whole days (all of them when there are none)
+               hour_lo AS h1_lo,
+               CASE WHEN day_lo < day_hi THEN day_lo ELSE hour_hi END AS h1_hi,
+               CASE WHEN day_lo < day_hi THEN day_hi ELSE hour_hi END AS h2_lo,
+               hour_hi AS h2_hi,
+               -- raw rows in [lo, raw1_hi) and [raw2_lo, hi]
+               CASE WHEN hour_lo < hour_hi THEN hour_lo ELSE hi END AS raw1_hi,
+               CASE WHEN hour_lo < hour_hi THEN hour_hi ELSE hi END AS raw2_lo
+        FROM edges
+    ),
+    parts AS (
+        SELECT d.type, d.count, d.total_amount FROM bounds b
+        JOIN DailyTransactionRollups d ON d.bucket >= b.day_lo AND d.bucket < b.day_hi
+        UNION ALL
+        SELECT h.type, h.count, h.total_amount FROM bounds b
+        JOIN HourlyTransactionRollups h ON h.bucket >= b.h1_lo AND h.bucket < b.h1_hi
+        UNION ALL
+        SELECT h.type, h.count, h.total_amount FROM bounds b
+        JOIN HourlyTransactionRollups h ON h.bucket >= b.h2_lo AND h.bucket < b.h2_hi
+        UNION ALL
+        SELECT t.type, 1, t.origin_amount FROM bounds b
+        JOIN Transactions t ON t.timestamp >= b.lo AND t.timestamp < b.raw1_hi
+        UNION ALL
+        SELECT t.type, 1, t.origin_amount FROM bounds b
+        JOIN Transactions t ON t.timestamp >= b.raw2_lo AND t.timestamp <= b.hi
+    )
+"""
+
+TRANSACTION_SUMMARY = _REPORT_PARTS + """
+    SELECT type, SUM(count)::BIGINT AS count, SUM(total_amount) AS total_amount
+    FROM parts
+    GROUP BY type
+"""
+
+TOTAL_TRANSACTION_AMOUNT = _REPORT_PARTS + """
+    SELECT SUM(total_amount) AS total_amount
+    FROM parts
+"""
+
+
+def _plain(value):
+    # psycopg 3 dumps Enum members by name, psycopg2 by value; always send the value.
+    return value.value if isinstance(value, Enum) else value
+
+
+def transaction_params(transaction_data: dict, transaction_id, json, devices: DeviceBatch) -> tuple:
+    """
+    Builds one COPY_TRANSACTIONS row, with the transaction's assessment by the rule engine.
+
+    :param transaction_data: Transaction model dumped to a dict.
+    :param transaction_id: Public transaction id to store.
+    :param json: Driver specific JSON adapter (psycopg2 ``Json`` or psycopg ``Jsonb``).
+    :param devices: Collects the row's device payloads, to be stored with the batch.
+    """
+    origin = transaction_data["originAmountDetails"]
+    destination = transaction_data["destinationAmountDetails"]
+    hit_rules, risk_score, risk_level = rules.engine().assess(transaction_data)
+    return (
+        transaction_id,
+        _plain(transaction_data["type"]),
+        transaction_data["timestamp"],  # Use provided timestamp
+        transaction_data.get("originUserId"),
+        transaction_data.get("destinationUserId"),
+        origin["transactionAmount"],
+        _plain(origin["transactionCurrency"]),
+        _plain(origin["country"]),
+        destination["transactionAmount"],
+        _plain(destination["transactionCurrency"]),
+        _plain(destination["country"]),
+        transaction_data.get("promotionCodeUsed", False),
+        transaction_data.get("reference", ""),
+        devices.add(transaction_data.get("originDeviceData", {})),
+        devices.add(transaction_data.get("destinationDeviceData", {})),
+        json(transaction_data.get("tags", [])),
+        json(hit_rules),
+        risk_score,
+        risk_level,
+    )
+
+
+def insert_params(transaction_data: dict, transaction_id, json, devices: DeviceBatch) -> tuple:
+    """
+    Builds the parameter tuple for INSERT_TRANSACTION; arguments as for transaction_params.
+    Call devices.stored() once the insert has committed.
+    """
+    row = transaction_params(transaction_data, transaction_id, json, devices)
+    returned = [transaction_data.get(key, {}) for key in ("originDeviceData", "destinationDeviceData")]
+    return devices.params() + row + tuple(None if data is None else canonical_json(data) for data in returned)
+
@@ -1,13 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, Form, Path, Query
+from fastapi import APIRouter, Depends, HTTPException, Form, Path, Query, Request
 from pydantic import BaseModel, Field, validator
-from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
+from psycopg_pool import PoolTimeout
 from ..utils.auth import get_api_key
-from ..database import insert_transaction, get_transaction_by_id, get_transactions, search_transactions_by_amount, search_transactions_by_date_range, search_transactions_by_type, get_total_transaction_amount, get_transaction_summary
+from ..async_database import copy_transactions, export_transactions, insert_transaction, get_transactions, search_transactions_by_amount, search_transactions_by_date_range, search_transactions_by_type, search_transactions_advanced, stream_transactions_by_amount, stream_transactions_by_date_range, stream_transactions_by_type, get_total_transaction_amount, get_transaction_summary
+from ..utils.pagination import MAX_PAGE_SIZE, SearchPage, decode_cursor, encode_cursor
+from ..utils.serialization import FastJSONResponse, dumps, ndjson_line
+from ..cache import transaction_cache
+from ..devices import DeviceBatch
+from ..rows import SEARCH_RESULT_FIELDS, projection
+from ..load_generator import LoadGeneratorConfig, generator as load_generator
+from ..utils.export import EXPORT_FORMATS, encode_export
+from ..utils.ids import id_generator
+from ..velocity import WINDOWS, velocity_store
+from ..utils.ingest import BulkIngestReport, iter_copy_rows, iter_json_array_records, iter_ndjson_records
 from server.models.transaction import TransactionResponseDetails, Transaction, AmountDetails, Currency, Country, TransactionType, DeviceData, Tag
-import random
 from datetime import datetime
-import threading
-import time
+from decimal import Decimal
+from typing import Dict, List, Literal, Optional, Union
 
 router = APIRouter()
 
@@ -31,67 +41,115 @@ class ReportRequest(BaseModel):
             raise ValueError('end_date must be after start_date')
         return end_date
 
+class AdvancedSearchRequest(BaseModel):
+    amount: Optional[float] = Field(None, description="Exact origin amount")
+    min_amount: Optional[float] = Field(None, description="Minimum origin amount")
+    max_amount: Optional[float] = Field(None, description="Maximum origin amount")
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    type: Optional[TransactionType] = None
+    user_id: Optional[str] = Field(None, description="Origin or destination user id")
+    country: Optional[Country] = Field(None, description="Origin or destination country")
+    sort_by: Literal["timestamp", "origin_amount"] = "timestamp"
+    sort_order: Literal["asc", "desc"] = "asc"
+    limit: int = Field(100, gt=0, le=MAX_PAGE_SIZE)
+    cursor: Optional[str] = Field(None, description="next_cursor of the previous page")
+
+    @validator('user_id')
+    def blank_user_id_as_unset(cls, user_id):
+        return user_id or None
+
+    def filters(self) -> dict:
+        return self.dict(include={"amount", "min_amount", "max_amount", "start_date", "end_date", "type", "user_id", "country"})
+
+    def after(self) -> Optional[tuple]:
+        if not self.cursor:
+            return None
+        return decode_cursor(self.cursor, datetime.fromisoformat if self.sort_by == "timestamp" else Decimal)
+
+
+class ExportRequest(ReportRequest):
+    format: Literal["arrow", "parquet"] = Field("arrow", description="Arrow IPC stream or Parquet file")
+    type: Optional[TransactionType] = None
+    user_id: Optional[str] = Field(None, description="Origin or destination user id")
+    country: Optional[Country] = Field(None, description="Origin or destination country")
+    min_amount: Optional[float] = Field(None, description="Minimum origin amount")
+    max_amount: Optional[float] = Field(None, description="Maximum origin amount")
+
+    @validator('user_id')
+    def blank_user_id_as_unset(cls, user_id):
+        return user_id or None
+
+    def filters(self) -> dict:
+        return self.dict(include={"start_date", "end_date", "type", "user_id", "country", "min_amount", "max_amount"})
+
+
 class CronStatus(BaseModel):
     status: str
 
 
-cron_running = False
-cron_thread = None
+# Response schemas. Routes return FastJSONResponse directly, so these only document
+# the responses; rows are not re-validated on the way out.
+class SearchResult(BaseModel):
+    transaction_id: int
+    type: str
+    timestamp: datetime
+    origin_user_id: Optional[str]
+    origin_amount: float
+    origin_currency: str
+    origin_country: Optional[str]
+
+
+class SearchResultPage(BaseModel):
+    transactions: List[SearchResult]
+    next_cursor: Optional[str] = Field(None, description="Cursor of the next page; null on the last page")
+
+
+class TransactionSummaryRow(BaseModel):
+    type: str
+    count: int
+    total_amount: float
+
+
+class TotalAmount(BaseModel):
+    total_amount: float
+
+
+class VelocityWindow(BaseModel):
+    count: int
+    volume: float = Field(..., description="Sum of origin amounts, in their own currencies")
+
+
+class UserVelocity(BaseModel):
+    user_id: str
+    windows: Dict[Literal[tuple(name for name, _, _ in WINDOWS)], VelocityWindow]
+
 
-def generate_transaction():
-    while cron_running:
-        try:
-            transaction_data = Transaction(
-                type=TransactionType(random.choice(["WITHDRAW", "DEPOSIT", "TRANSFER", "EXTERNAL_PAYMENT", "REFUND", "OTHER"])),
-                transactionId=random.randint(100000, 999999),
-                timestamp=datetime.now(),
-                originUserId=str(random.randint(1, 100)),
-                destinationUserId=str(random.randint(1, 100)),
-                originAmountDetails=AmountDetails(
-                    transactionAmount=random.uniform(1, 1000),
-                    transactionCurrency=Currency("USD"),
-                    country=Country("US")
-                ),
-                destinationAmountDetails=AmountDetails(
-                    transactionAmount=random.uniform(1, 1000),
-                    transactionCurrency=Currency("USD"),
-                    country=Country("US")
-                ),
-                originDeviceData=DeviceData(),
-                destinationDeviceData=DeviceData(),
-                tags=[Tag()]
-            )
-            insert_transaction(transaction_data.dict(), transaction_data.transactionId)
-            time.sleep(1)
-        except Exception as e:
-            print(f"An error occurred while generating transaction: {e}")
-            
-            
-            
 @router.post("/cron/start", response_model=CronStatus, dependencies=[Depends(get_api_key)])
-async def start_cron():
-    global cron_running, cron_thread
-    if not cron_running:
-        cron_running = True
-        cron_thread = threading.Thread(target=generate_transaction)
-        cron_thread.start()
+async def start_cron(config: Optional[LoadGeneratorConfig] = None):
+    """
+    Starts generating synthetic transactions. Without a body this inserts one
+    transaction per second, like the original cron job.
+    """
+    load_generator.start(config or LoadGeneratorConfig())
     return {"status": "CRON job started"}
 
 @router.post("/cron/stop", response_model=CronStatus, dependencies=[Depends(get_api_key)])
 async def stop_cron():
-    global cron_running
-    cron_running = False
-    if cron_thread:
-        cron_thread.join()
+    await load_generator.stop()
     return {"status": "CRON job stopped"}
 
+@router.get("/cron/status", dependencies=[Depends(get_api_key)])
+async def cron_status():
+    return load_generator.status()
+
 
 @router.post("/create_transactions", dependencies=[Depends(get_api_key)])
 async def create_transaction(transaction_request: TransactionRequest):
     try:
         transaction_data = Transaction(
             type=transaction_request.type,
-            transactionId=random.randint(100000, 999999),
+            transactionId=id_generator.next_id(),
             timestamp=datetime.now(),
             originUserId=transaction_request.sender_id,
             destinationUserId=transaction_request.destination_id,
@@ -110,116 +168,209 @@ async def create_transaction(transaction_request: TransactionRequest):
             tags=[Tag()]
         )
         
-        transaction_id = insert_transaction(transaction_data.dict(), transaction_data.transactionId)
+        transaction_data = await insert_transaction(transaction_data.dict(), transaction_data.transactionId)
         
-        if not transaction_id:
+        if not transaction_data:
             raise HTTPException(status_code=400, detail="Transaction could not be created")
 
-        transaction_data = get_transactions(transaction_id)
-        if not transaction_data:
-            raise HTTPException(status_code=404, detail="Transaction not found")
-        
-        return jsonable_encoder(transaction_data)
+        # Analysts usually look a transaction up right after it is created.
+        body = dumps(transaction_data)
+        await transaction_cache.put(int(transaction_data["transaction_id"]), body)
+        return Response(body, media_type="application/json")
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/transactions/bulk", dependencies=[Depends(get_api_key)])
+async def bulk_create_transactions(request: Request):
+    """
+    Ingests a JSON array or an NDJSON body (Content-Type: application/x-ndjson) of
+    Transaction objects with a single COPY. Invalid rows are skipped and reported.
+    """
+    try:
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            records = iter_ndjson_records(request.stream())
+        else:
+            records = iter_json_array_records(await request.body())
+
+        report = BulkIngestReport()
+        devices = DeviceBatch()
+        inserted = await copy_transactions(iter_copy_rows(records, report, devices), devices)
+        return {
+            "inserted": inserted,
+            "rejected_count": report.rejected_count,
+            "rejected": report.rejected,
+        }
+    except PoolTimeout:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/get_transactions/{transaction_id}", dependencies=[Depends(get_api_key)])
 async def retrieve_transaction(transaction_id: int):
+    """
+    Served from the transaction cache when possible; misses read the database and
+    fill the cache. Missing transactions are not cached, they may be created later.
+    """
     try:
-        transaction_data = get_transactions(transaction_id)
-        if not transaction_data:
-            raise HTTPException(status_code=404, detail="Transaction not found")
-        
-        return jsonable_encoder(transaction_data)
+        body = await transaction_cache.get(transaction_id)
+        if body is None:
+            transaction_data = await get_transactions(transaction_id)
+            if not transaction_data:
+                raise HTTPException(status_code=404, detail="Transaction not found")
+            body = dumps(transaction_data)
+            await transaction_cache.put(transaction_id, body)
+
+        return Response(body, media_type="application/json")
+    except PoolTimeout:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/search_transaction_by_amount", dependencies=[Depends(get_api_key)])
-async def transactions_by_amount(amount: float = Query(..., description="The amount to search for transactions")):
+@router.get("/search_transaction_by_amount", response_model=Union[List[SearchResult], SearchResultPage], dependencies=[Depends(get_api_key)])
+async def transactions_by_amount(amount: float = Query(..., description="The amount to search for transactions"), page: SearchPage = Depends()):
     try:
-        transactions = search_transactions_by_amount(amount)
-        if not transactions:
-            raise HTTPException(status_code=404, detail="No transactions found")
-        
-        return [format_search_result(transaction) for transaction in transactions]
+        if page.stream:
+            return search_stream_response(stream_transactions_by_amount(amount))
+        transactions = await search_transactions_by_amount(amount, page.limit, page.after())
+        return search_response(transactions, page)
+    except PoolTimeout:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/search_transaction_by_date_range", dependencies=[Depends(get_api_key)])
+@router.get("/search_transaction_by_date_range", response_model=Union[List[SearchResult], SearchResultPage], dependencies=[Depends(get_api_key)])
 async def transactions_by_date_range(
     start_date: datetime = Query(..., description="Start date for the date range"),
-    end_date: datetime = Query(..., description="End date for the date range")
+    end_date: datetime = Query(..., description="End date for the date range"),
+    page: SearchPage = Depends()
 ):
     try:
-        transactions = search_transactions_by_date_range(start_date, end_date)
-        if not transactions:
-            raise HTTPException(status_code=404, detail="No transactions found")
-        
-        return [format_search_result(transaction) for transaction in transactions]
+        if page.stream:
+            return search_stream_response(stream_transactions_by_date_range(start_date, end_date))
+        transactions = await search_transactions_by_date_range(start_date, end_date, page.limit, page.after())
+        return search_response(transactions, page)
+    except PoolTimeout:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/search_transaction_by_type", dependencies=[Depends(get_api_key)])
-async def transactions_by_type(type: str = Query(..., description="The type of transactions to search for")):
+@router.get("/search_transaction_by_type", response_model=Union[List[SearchResult], SearchResultPage], dependencies=[Depends(get_api_key)])
+async def transactions_by_type(type: str = Query(..., description="The type of transactions to search for"), page: SearchPage = Depends()):
     try:
-        transactions = search_transactions_by_type(type)
-        if not transactions:
-            raise HTTPException(status_code=404, detail="No transactions found")
-        
-        return [format_search_result(transaction) for transaction in transactions]
+        if page.stream:
+            return search_stream_response(stream_transactions_by_type(type))
+        transactions = await search_transactions_by_type(type, page.limit, page.after())
+        return search_response(transactions, page)
+    except PoolTimeout:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/transactions/search_advanced", response_model=SearchResultPage, dependencies=[Depends(get_api_key)])
+async def transactions_search_advanced(search_request: AdvancedSearchRequest = Depends()):
+    """
+    Searches with any combination of filters in a single query, sorted and paginated in SQL.
+    """
+    try:
+        transactions = await search_transactions_advanced(
+            search_request.filters(),
+            search_request.sort_by,
+            search_request.sort_order == "desc",
+            search_request.limit,
+            search_request.after(),
+        )
+        next_cursor = None
+        if len(transactions) == search_request.limit:
+            last = transactions[-1]
+            next_cursor = encode_cursor(last[search_request.sort_by], last["id"])
+        return FastJSONResponse({
+            "transactions": [format_search_result(transaction) for transaction in transactions],
+            "next_cursor": next_cursor,
+        })
+    except PoolTimeout:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/transactions/summary", dependencies=[Depends(get_api_key)])
+@router.get("/transactions/export", dependencies=[Depends(get_api_key)])
+async def export_transactions_route(export_request: ExportRequest = Depends()):
+    """
+    Streams every transaction in [start_date, end_date] matching the optional filters,
+    in (timestamp, id) order, as an Arrow IPC stream or a Parquet file. Rows are read
+    in chunks from a server-side cursor, so memory does not grow with the export.
+    """
+    media_type, extension = EXPORT_FORMATS[export_request.format]
+    return StreamingResponse(
+        encode_export(export_transactions(export_request.filters()), export_request.format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="transactions.{extension}"'},
+    )
+
+
+@router.get("/transactions/summary", response_model=List[TransactionSummaryRow], dependencies=[Depends(get_api_key)])
 async def transaction_summary(report_request: ReportRequest = Depends()):
     try:
-        summary = get_transaction_summary(report_request.start_date, report_request.end_date)
-        return summary
+        summary = await get_transaction_summary(report_request.start_date, report_request.end_date)
+        return FastJSONResponse(summary)
+    except PoolTimeout:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/transactions/total_amount", dependencies=[Depends(get_api_key)])
+@router.get("/transactions/total_amount", response_model=TotalAmount, dependencies=[Depends(get_api_key)])
 async def total_transaction_amount(report_request: ReportRequest = Depends()):
     try:
-        total_amount = get_total_transaction_amount(report_request.start_date, report_request.end_date)
-        return {"total_amount": total_amount}
+        total_amount = await get_total_transaction_amount(report_request.start_date, report_request.end_date)
+        return FastJSONResponse({"total_amount": total_amount})
+    except PoolTimeout:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.get("/users/{user_id}/velocity", response_model=UserVelocity, dependencies=[Depends(get_api_key)])
+async def user_velocity(user_id: str = Path(..., description="Origin user id")):
+    # Answered from memory; see server/velocity.py.
+    return FastJSONResponse({"user_id": user_id, "windows": velocity_store.get(user_id)})
+
+
+format_search_result = projection(SEARCH_RESULT_FIELDS)
+
+
+def search_response(transactions, page: SearchPage):
+    """
+    Without a limit, keeps the original response: a plain list, 404 when empty.
+    With a limit, returns one page and the cursor of the next one (None on the last page).
+    """
+    if page.limit is None:
+        if not transactions:
+            raise HTTPException(status_code=404, detail="No transactions found")
+        return FastJSONResponse([format_search_result(transaction) for transaction in transactions])
+
+    next_cursor = None
+    if len(transactions) == page.limit:
+        last = transactions[-1]
+        next_cursor = encode_cursor(last["timestamp"], last["id"])
+    return FastJSONResponse({
+        "transactions": [format_search_result(transaction) for transaction in transactions],
+        "next_cursor": next_cursor,
+    })
+
+
+def search_stream_response(chunks):
+    async def lines():
+        try:
+            async for rows in chunks:
+                yield b"".join(ndjson_line(format_search_result(row)) for row in rows)
+        finally:
+            # Releases the server-side cursor and pooled connection if the client goes away.
+            await chunks.aclose()
 
-def format_transaction_details(transaction_data):
-    return {
-        "id": transaction_data[0],
-        "transaction_id": transaction_data[1],
-        "type": transaction_data[2],
-        "timestamp": transaction_data[3],
-        "origin_user_id": transaction_data[4],
-        "destination_user_id": transaction_data[5],
-        "origin_amount": transaction_data[6],
-        "origin_currency": transaction_data[7],
-        "origin_country": transaction_data[8],
-        "destination_amount": transaction_data[9],
-        "destination_currency": transaction_data[10],
-        "destination_country": transaction_data[11],
-        "promotion_code_used": transaction_data[12],
-        "reference": transaction_data[13],
-        "origin_device_data": transaction_data[14],
-        "destination_device_data": transaction_data[15],
-        "tags": transaction_data[16]
-    }
-    
-    
-def format_search_result(transaction_data):
-    return {
-        "transaction_id": transaction_data[1],
-        "type": transaction_data[2],
-        "timestamp": transaction_data[3],
-        "origin_user_id": transaction_data[4],
-        "origin_amount": transaction_data[6],
-        "origin_currency": transaction_data[7],
-        "origin_country": transaction_data[8]
-    }
\ No newline at end of file
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
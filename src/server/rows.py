@@ -0,0 +1,105 @@
+import functools
+import os
+import orjson
+from psycopg.pq import ExecStatus
+from psycopg.rows import no_result
+from server.models.transaction import Country, Currency, TransactionType
+
+# Row mapping shared by every read path. A mapper is generated once per query shape
+# (the column names in cursor.description, plus an optional projection) and reused
+# for every row, so mapping a row is a single dict literal. Enum columns are looked
+# up in a value -> member dict and JSONB values are parsed once per distinct value.
+
+ENUM_COLUMNS = {
+    "type": TransactionType,
+    "origin_currency": Currency,
+    "destination_currency": Currency,
+    "origin_country": Country,
+    "destination_country": Country,
+}
+
+# Fields of a search result, in response order.
+SEARCH_RESULT_FIELDS = (
+    "transaction_id", "type", "timestamp", "origin_user_id", "origin_amount", "origin_currency", "origin_country",
+)
+
+JSON_CACHE_SIZE = int(os.getenv("JSON_CACHE_SIZE", "4096"))
+
+_mappers = {}
+_ROW_STATUSES = (ExecStatus.TUPLES_OK, ExecStatus.SINGLE_TUPLE, ExecStatus.COMMAND_OK)
+
+
+@functools.lru_cache(maxsize=JSON_CACHE_SIZE)
+def _load_json(data):
+    return orjson.loads(data)
+
+
+def load_json(data):
+    """
+    JSON loads for JSONB columns, memoized on the raw text: device data and tags repeat
+    across many rows. Rows with equal JSONB share the parsed value, so do not mutate it.
+    """
+    if isinstance(data, memoryview):
+        data = bytes(data)
+    return _load_json(data)
+
+
+def _compile(names: tuple, fields: tuple):
+    index = {name: i for i, name in enumerate(names)}
+    namespace = {}
+    items = []
+    for name in fields:
+        value = f"row[{index[name]}]"
+        enum = ENUM_COLUMNS.get(name)
+        if enum is not None:
+            # Unknown values (rows written before a member was removed) pass through as is.
+            namespace[f"_{name}"] = {member.value: member for member in enum}
+            value = f"_{name}.get({value}, {value})"
+        items.append(f"{name!r}: {value}")
+    source = "def mapper(row):\n    return {" + ", ".join(items) + "}\n"
+    exec(source, namespace)
+    return namespace["mapper"]
+
+
+def compile_mapper(names: tuple, fields: tuple = None):
+    """
+    Returns the cached row -> dict function for rows with these column names.
+
+    :param names: Column names of the result, in order.
+    :param fields: Columns to keep, in output order; all of them when None.
+    """
+    key = (names, fields)
+    mapper = _mappers.get(key)
+    if mapper is None:
+        mapper = _mappers[key] = _compile(names, names if fields is None else fields)
+    return mapper
+
+
+def mapped_row(cursor):
+    """
+    psycopg 3 row factory returning each row as a dict, through compile_mapper.
+    """
+    # Names come from the raw result, like psycopg's dict_row: cursor.description
+    # builds a Column object per column on every access.
+    result = cursor.pgresult
+    if result is None or result.status not in _ROW_STATUSES or not result.nfields:  # COPY, or no result
+        return no_result
+    return compile_mapper(tuple(result.fname(i).decode() for i in range(result.nfields)))
+
+
+def map_rows(cursor, rows: list, fields: tuple = None) -> list:
+    """
+    Maps rows fetched from a psycopg2 cursor, whose description it uses.
+    """
+    mapper = compile_mapper(tuple(column.name for column in cursor.description), fields)
+    return [mapper(row) for row in rows]
+
+
+def projection(fields: tuple):
+    """
+    Returns a function picking fields from mapped rows, for rows that are already dicts.
+    """
+    source = "def project(row):\n    return {" + ", ".join(f"{name!r}: row[{name!r}]" for name in fields) + "}\n"
+    namespace = {}
+    exec(source, namespace)
+    return namespace["project"]
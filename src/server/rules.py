@@ -0,0 +1,277 @@
+import functools
+import os
+from datetime import datetime, timedelta
+from typing import List, Literal, Optional, Union
+import orjson
+from dotenv import load_dotenv
+from pydantic import BaseModel, Field, TypeAdapter, model_validator
+from server.models.transaction import Actions, NatureValues, RiskLevel, Rule
+from server.rows import ENUM_COLUMNS
+
+load_dotenv()
+
+# Transaction monitoring rules. Definitions are read from RULES_FILE, a JSON list of
+# RuleDefinition, and compiled once into a single generated function over a transaction
+# dict, which scores every transaction as it is stored, and into one SQL statement,
+# which re-scores stored transactions in bulk (rescore()). Conditions of a rule must all
+# hold; a condition on a missing value does not, as in SQL.
+#
+# A transaction's risk score is the sum of the scores of the rules it hits, capped at
+# MAX_RISK_SCORE. Shadow rules are recorded as hits but not scored.
+
+RULES_FILE = os.getenv("RULES_FILE", os.path.join(os.path.dirname(__file__), "rules.json"))
+RESCORE_WINDOW_HOURS = int(os.getenv("RESCORE_WINDOW_HOURS", "24"))
+
+MAX_RISK_SCORE = 100.0
+# Lowest score of each risk level, highest level first.
+RISK_LEVELS = [
+    (80.0, RiskLevel.VERY_HIGH),
+    (60.0, RiskLevel.HIGH),
+    (40.0, RiskLevel.MEDIUM),
+    (20.0, RiskLevel.LOW),
+    (0.0, RiskLevel.VERY_LOW),
+]
+
+# Fields a condition can test, as (expression over a Transaction dict, Transactions
+# column, value type).
+RULE_FIELDS = {
+    "type": ('t["type"]', "type", str),
+    "origin_user_id": ('t.get("originUserId")', "origin_user_id", str),
+    "destination_user_id": ('t.get("destinationUserId")', "destination_user_id", str),
+    "origin_amount": ('t["originAmountDetails"]["transactionAmount"]', "origin_amount", float),
+    "origin_currency": ('t["originAmountDetails"]["transactionCurrency"]', "origin_currency", str),
+    "origin_country": ('t["originAmountDetails"]["country"]', "origin_country", str),
+    "destination_amount": ('t["destinationAmountDetails"]["transactionAmount"]', "destination_amount", float),
+    "destination_currency": ('t["destinationAmountDetails"]["transactionCurrency"]', "destination_currency", str),
+    "destination_country": ('t["destinationAmountDetails"]["country"]', "destination_country", str),
+    "promotion_code_used": ('t.get("promotionCodeUsed")', "promotion_code_used", bool),
+    "reference": ('t.get("reference")', "reference", str),
+}
+
+# Comparison operators, and their SQL.
+OPERATORS = {"==": "=", "!=": "<>", "<": "<", "<=": "<=", ">": ">", ">=": ">=", "in": "= ANY", "not_in": "<> ALL"}
+_ORDERING = ("<", "<=", ">", ">=")
+_LISTS = ("in", "not_in")
+
+Scalar = Union[bool, float, str]
+
+
+class Condition(BaseModel):
+    field: Literal[tuple(RULE_FIELDS)]
+    op: Literal[tuple(OPERATORS)]
+    value: Union[Scalar, List[Scalar]]
+
+    @model_validator(mode="after")
+    def check_value(self):
+        kind = RULE_FIELDS[self.field][2]
+        values = self.value if isinstance(self.value, list) else [self.value]
+        if (self.op in _LISTS) != isinstance(self.value, list) or not values:
+            raise ValueError(f"{self.op} takes {'a non-empty list' if self.op in _LISTS else 'a single value'}")
+        if self.op in _ORDERING and kind is not float:
+            raise ValueError(f"{self.field} cannot be compared with {self.op}")
+        for value in values:
+            if kind is float and (isinstance(value, bool) or not isinstance(value, (int, float))):
+                raise ValueError(f"{self.field} is compared with numbers")
+            if kind is not float and type(value) is not kind:
+                raise ValueError(f"{self.field} is compared with {kind.__name__} values")
+        enum = ENUM_COLUMNS.get(self.field)
+        if enum is not None:
+            unknown = set(values) - {member.value for member in enum}
+            if unknown:
+                raise ValueError(f"unknown {self.field} values: {', '.join(sorted(unknown))}")
+        return self
+
+
+class RuleDefinition(BaseModel):
+    ruleId: str
+    ruleInstanceId: Optional[str] = None
+    ruleName: str
+    ruleDescription: str = ""
+    ruleAction: Actions = Actions.FLAG
+    nature: Optional[NatureValues] = None
+    labels: List[str] = []
+    hitDirections: Optional[List[str]] = None
+    isShadow: bool = False
+    score: float = Field(0.0, ge=0, le=MAX_RISK_SCORE, description="Added to the risk score of the transactions it hits")
+    conditions: List[Condition] = Field(..., min_length=1)
+
+    def hit(self) -> dict:
+        """
+        The Rule recorded on a transaction this rule hits, as JSON-ready values.
+        """
+        return Rule(
+            ruleInstanceId=self.ruleInstanceId or self.ruleId,
+            ruleName=self.ruleName,
+            ruleDescription=self.ruleDescription,
+            ruleAction=self.ruleAction,
+            ruleHit=True,
+            ruleId=self.ruleId,
+            hitDirections=self.hitDirections,
+            falsePositiveDetails=None,
+            sanctionsDetails=None,
+            isOngoingScreeningHit=False,
+            labels=self.labels,
+            nature=self.nature,
+            isShadow=self.isShadow,
+        ).model_dump(mode="json")
+
+
+rule_definitions_adapter = TypeAdapter(List[RuleDefinition])
+
+
+def risk_level(score: float) -> str:
+    for lowest, level in RISK_LEVELS:
+        if score >= lowest:
+            return level.value
+    return RISK_LEVELS[-1][1].value
+
+
+def _python_condition(name: str, condition: Condition) -> str:
+    value = f"f_{condition.field}"
+    if condition.op == "in":
+        return f"{value} in {name}"
+    if condition.op == "not_in":
+        return f"({value} is not None and {value} not in {name})"
+    if condition.op == "==":
+        return f"{value} == {name}"
+    return f"({value} is not None and {value} {condition.op} {name})"
+
+
+def _compile_matches(definitions: list):
+    # One function testing every rule: each field is read once, each value is a
+    # constant of the function's namespace. Lists are tuples, compared with ==, so
+    # enum members match their values.
+    namespace = {}
+    fields = []
+    tests = []
+    for i, definition in enumerate(definitions):
+        clauses = []
+        for j, condition in enumerate(definition.conditions):
+            name = f"_v{i}_{j}"
+            namespace[name] = tuple(condition.value) if isinstance(condition.value, list) else condition.value
+            clauses.append(_python_condition(name, condition))
+            if condition.field not in fields:
+                fields.append(condition.field)
+        tests.append(f"    if {' and '.join(clauses)}:\n        hits.append({i})\n")
+    source = "def matches(t):\n"
+    source += "".join(f"    f_{field} = {RULE_FIELDS[field][0]}\n" for field in fields)
+    source += "    hits = []\n" + "".join(tests) + "    return hits\n"
+    exec(source, namespace)
+    return namespace["matches"]
+
+
+def _sql_condition(condition: Condition) -> str:
+    # Amounts are bound as NUMERIC, so they compare exactly like the column.
+    column, kind = RULE_FIELDS[condition.field][1:]
+    cast = "::numeric" if kind is float else ""
+    if condition.op in _LISTS:
+        return f"t.{column} {OPERATORS[condition.op]}(%s{cast + '[]' if cast else ''})"
+    return f"t.{column} {OPERATORS[condition.op]} %s{cast}"
+
+
+class RuleEngine:
+    """
+    Rule definitions compiled for evaluation, once per process.
+    """
+
+    def __init__(self, definitions: list):
+        self.definitions = definitions
+        self._hits = [definition.hit() for definition in definitions]
+        self._scores = [0.0 if definition.isShadow else definition.score for definition in definitions]
+        self._matches = _compile_matches(definitions)
+
+    def assess(self, transaction: dict) -> tuple:
+        """
+        Runs every rule on a transaction.
+
+        :param transaction: Transaction model dumped to a dict, or a validated TransactionRow.
+        :return: (hit rules, risk score, risk level)
+        """
+        indexes = self._matches(transaction)
+        if not indexes:
+            return [], 0.0, RISK_LEVELS[-1][1].value
+        score = min(sum(self._scores[i] for i in indexes), MAX_RISK_SCORE)
+        return [self._hits[i] for i in indexes], score, risk_level(score)
+
+    @functools.cached_property
+    def rescore_query(self) -> tuple:
+        """
+        (sql, params) of an UPDATE storing the assessment of every transaction with
+        start <= timestamp < end; bind start and end after params.
+        """
+        if not self.definitions:
+            return f"UPDATE Transactions SET hit_rules = '[]', risk_score = 0, risk_level = '{risk_level(0.0)}' WHERE timestamp >= %s AND timestamp < %s", ()
+        # Parameters in the order they appear: the recorded hits, then the condition values.
+        params = [orjson.dumps(hit).decode() for hit in self._hits]
+        hits = []
+        for definition in self.definitions:
+            hits.append(" AND ".join(_sql_condition(condition) for condition in definition.conditions))
+            params.extend(condition.value for condition in definition.conditions)
+        flags = ", ".join(f"h{i}" for i in range(len(hits)))
+        rules = ", ".join(f"CASE WHEN h{i} THEN %s::jsonb END" for i in range(len(hits)))
+        score = " + ".join(f"CASE WHEN h{i} THEN {score!r} ELSE 0 END" for i, score in enumerate(self._scores))
+        level = " ".join(f"WHEN score >= {lowest!r} THEN '{level.value}'" for lowest, level in RISK_LEVELS)
+        # Each condition is evaluated once per row, in the innermost subquery.
+        query = f"""
+            UPDATE Transactions t SET (hit_rules, risk_score, risk_level) = (
+                SELECT hits, score, CASE {level} ELSE '{RISK_LEVELS[-1][1].value}' END
+                FROM (
+                    SELECT to_jsonb(array_remove(ARRAY[{rules}], NULL)) AS hits, least({score}, {MAX_RISK_SCORE!r}) AS score
+                    FROM (VALUES ({", ".join(f"coalesce({hit}, false)" for hit in hits)})) AS h ({flags})
+                ) s
+            )
+            WHERE t.timestamp >= %s AND t.timestamp < %s
+        """
+        return query, tuple(params)
+
+    def rescore_window(self, cur, start: datetime, end: datetime) -> int:
+        """
+        Re-scores the transactions with start <= timestamp < end in one statement.
+
+        :return: Number of transactions updated.
+        """
+        query, params = self.rescore_query
+        cur.execute(query, params + (start, end))
+        return cur.rowcount
+
+
+def load_rules(path: str = None) -> list:
+    with open(path or RULES_FILE, "rb") as file:
+        definitions = rule_definitions_adapter.validate_json(file.read())
+    ids = [definition.ruleInstanceId or definition.ruleId for definition in definitions]
+    duplicates = {rule_id for rule_id in ids if ids.count(rule_id) > 1}
+    if duplicates:
+        raise ValueError(f"duplicate rule instance ids: {', '.join(sorted(duplicates))}")
+    return definitions
+
+
+@functools.cache
+def engine() -> RuleEngine:
+    """
+    The engine for RULES_FILE, loaded and compiled on first use.
+    """
+    return RuleEngine(load_rules())
+
+
+def rescore(conn, start: datetime, end: datetime, window_hours: int = RESCORE_WINDOW_HOURS, progress=None) -> int:
+    """
+    Re-scores stored transactions with start <= timestamp < end against the current
+    rules, one window at a time, each in its own transaction so locks and dead rows
+    stay bounded.
+
+    :param conn: Open psycopg2 connection.
+    :param progress: Called with (window end, rows updated so far) after each window.
+    :return: Number of transactions updated.
+    """
+    rules = engine()
+    updated = 0
+    with conn.cursor() as cur:
+        window_start = start
+        while window_start < end:
+            window_end = min(window_start + timedelta(hours=window_hours), end)
+            updated += rules.rescore_window(cur, window_start, window_end)
+            conn.commit()
+            if progress:
+                progress(window_end, updated)
+            window_start = window_end
+    return updated
@@ -1,15 +1,50 @@
 import os
 from fastapi import Security, HTTPException, status
 from fastapi.security import APIKeyHeader
-import pandas as pd
-from ..database import verify_key
+from cachetools import TTLCache
+from ..async_database import verify_key
+from .utils import hash_key
 
 
 API_KEY_NAME = "access_token"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
 
+# Verified key hashes, so the hot path is a sha256 and a dict lookup instead of a query.
+# Unknown keys are cached too, for a shorter time and in a separate bounded cache so
+# a flood of bad keys cannot evict the good ones.
+KEY_CACHE_SIZE = int(os.getenv("API_KEY_CACHE_SIZE", "10000"))
+valid_key_cache = TTLCache(maxsize=KEY_CACHE_SIZE, ttl=float(os.getenv("API_KEY_CACHE_TTL", "300")))
+invalid_key_cache = TTLCache(maxsize=KEY_CACHE_SIZE, ttl=float(os.getenv("API_KEY_NEGATIVE_CACHE_TTL", "30")))
+
+
+def invalidate_key(key_hash: str = None):
+  """
+  Drops a key hash from both caches, or everything when key_hash is None.
+  Wired to the api_keys_changed notification channel in the app lifespan.
+  """
+  if key_hash is None:
+    valid_key_cache.clear()
+    invalid_key_cache.clear()
+  else:
+    valid_key_cache.pop(key_hash, None)
+    invalid_key_cache.pop(key_hash, None)
+
 
 async def get_api_key(api_key: str = Security(api_key_header)):
-  if not verify_key(api_key):
+  if not api_key:
     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                         detail="Invalid API Key")
+
+  key_hash = hash_key(api_key)
+  if key_hash in valid_key_cache:
+    return
+  if key_hash not in invalid_key_cache:
+    is_valid = await verify_key(key_hash)
+    if is_valid:
+      valid_key_cache[key_hash] = True
+      return
+    if is_valid is False:
+      invalid_key_cache[key_hash] = True
+
+  raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                      detail="Invalid API Key")
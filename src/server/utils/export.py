@@ -0,0 +1,113 @@
+import asyncio
+import functools
+
+# Columnar encoding for /transactions/export. Each chunk of row tuples from
+# async_database.export_transactions is transposed into one Arrow array per column and
+# written as a record batch (Arrow IPC) or row group (Parquet); the encoded bytes are
+# handed to the response as they are produced, so memory stays at about one chunk.
+# export_schema() lists the columns of queries.EXPORT_COLUMNS, in the same order.
+# pyarrow is imported on the first export, not with the app.
+
+
+@functools.cache
+def export_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("transaction_id", pa.int64()),
+        ("type", pa.string()),
+        ("timestamp", pa.timestamp("us")),
+        ("origin_user_id", pa.string()),
+        ("destination_user_id", pa.string()),
+        ("origin_amount", pa.float64()),
+        ("origin_currency", pa.string()),
+        ("origin_country", pa.string()),
+        ("destination_amount", pa.float64()),
+        ("destination_currency", pa.string()),
+        ("destination_country", pa.string()),
+        ("promotion_code_used", pa.bool_()),
+        ("reference", pa.string()),
+    ])
+
+
+EXPORT_FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+class _ChunkSink:
+    # Write-only file for pyarrow writers; drain() returns what was written since the last call.
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def record_batch(rows: list):
+    """
+    Builds a record batch from row tuples in EXPORT_COLUMNS order.
+    """
+    import pyarrow as pa
+    schema = export_schema()
+    columns = zip(*rows)
+    arrays = []
+    for field, values in zip(schema, columns):
+        if field.type == pa.timestamp("us"):
+            arrays.append(pa.array(values, pa.int64()).cast(field.type))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _write(writer, rows: list):
+    writer.write_batch(record_batch(rows))
+
+
+def _open_writer(export_format: str, sink: _ChunkSink):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if export_format == "parquet":
+        return pq.ParquetWriter(sink, export_schema(), compression="zstd")
+    return pa.ipc.new_stream(sink, export_schema())
+
+
+async def encode_export(chunks, export_format: str):
+    """
+    Yields the encoded export, one piece per chunk of rows. An empty export is still a
+    valid file with the schema.
+
+    :param chunks: Async iterator of row tuple lists, closed when done.
+    :param export_format: One of EXPORT_FORMATS.
+    """
+    sink = _ChunkSink()
+    try:
+        # The first export also imports pyarrow, off the event loop with the rest.
+        writer = await asyncio.to_thread(_open_writer, export_format, sink)
+        async for rows in chunks:
+            # Converting and compressing a chunk takes tens of milliseconds; keep it off the event loop.
+            await asyncio.to_thread(_write, writer, rows)
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+    finally:
+        await chunks.aclose()
@@ -0,0 +1,71 @@
+import orjson
+from pydantic import TypeAdapter, ValidationError
+from server.models.transaction import TransactionRow
+from server import queries
+from server.devices import DeviceBatch
+
+transaction_row_adapter = TypeAdapter(TransactionRow)
+
+# Only this many rejections are echoed back; the count always covers all of them.
+MAX_REPORTED_REJECTIONS = 1000
+
+
+def _json_text(value) -> str:
+    return orjson.dumps(value).decode()
+
+
+async def iter_ndjson_records(stream):
+    """
+    Yields one raw JSON document per non-empty line of an NDJSON byte stream,
+    without holding more than one chunk of the body in memory.
+    """
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+async def iter_json_array_records(body: bytes):
+    records = orjson.loads(body)
+    if not isinstance(records, list):
+        raise ValueError("Request body must be a JSON array of transactions")
+    for record in records:
+        yield record
+
+
+class BulkIngestReport:
+    def __init__(self):
+        self.rejected_count = 0
+        self.rejected = []
+
+    def reject(self, row: int, errors: list):
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REPORTED_REJECTIONS:
+            self.rejected.append({"row": row, "errors": errors})
+
+
+async def iter_copy_rows(records, report: BulkIngestReport, devices: DeviceBatch):
+    """
+    Validates raw records (bytes or already decoded objects) against TransactionRow
+    and yields COPY rows for the valid ones; invalid rows are recorded on the report
+    and the devices of valid ones on `devices`.
+    """
+    row_number = 0
+    async for record in records:
+        try:
+            if isinstance(record, bytes):
+                row = transaction_row_adapter.validate_json(record)
+            else:
+                row = transaction_row_adapter.validate_python(record)
+        except ValidationError as e:
+            report.reject(row_number, [
+                {"loc": list(error["loc"]), "msg": error["msg"]} for error in e.errors()
+            ])
+        else:
+            yield queries.transaction_params(row, row["transactionId"], _json_text, devices)
+        row_number += 1
@@ -0,0 +1,35 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Optional
+import orjson
+from pydantic import BaseModel, Field
+
+MAX_PAGE_SIZE = 1000
+
+
+class SearchPage(BaseModel):
+    limit: Optional[int] = Field(None, gt=0, le=MAX_PAGE_SIZE, description="Page size; enables cursor pagination")
+    cursor: Optional[str] = Field(None, description="next_cursor of the previous page")
+    stream: bool = Field(False, description="Stream every match as NDJSON instead of returning a page")
+
+    def after(self) -> Optional[tuple]:
+        return decode_cursor(self.cursor) if self.cursor else None
+
+
+def encode_cursor(value, id: int) -> str:
+    """
+    Returns an opaque cursor pointing just after the row with this (sort value, id).
+    """
+    payload = orjson.dumps([value, id], default=str)
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, parse_value=datetime.fromisoformat) -> tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, id = orjson.loads(base64.urlsafe_b64decode(padded))
+        return parse_value(value), int(id)
+    except (binascii.Error, ArithmeticError, ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
@@ -1,5 +1,6 @@
 from fastapi import UploadFile, HTTPException
 import base64
+import hashlib
 import logging
 import random
 import string
@@ -16,4 +17,14 @@ def read_markdown_file(file_path: str):
             return file.read()
     except FileNotFoundError:
         print(f"The file {file_path} was not found.")
-        return None
\ No newline at end of file
+        return None
+
+
+def hash_key(key: str) -> str:
+    """
+    Returns the hex SHA-256 digest under which an API key is stored.
+
+    :param key: Plaintext API key.
+    :return: 64 character hex digest.
+    """
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
@@ -0,0 +1,202 @@
+import os
+from array import array
+from datetime import datetime
+import orjson
+from dotenv import load_dotenv
+from server import metrics
+
+load_dotenv()
+
+# Per-user transaction velocity, held in memory: how many transactions each originUserId
+# sent, and their total origin amount, over the last hour, day and week. Each user has
+# one flat array of ring buffers, one ring of time buckets per window. A window covers
+# its current bucket and the size - 1 before it, so "1h" spans between 55 and 60 minutes.
+# Amounts are summed as stored, without currency conversion.
+#
+# The store is rebuilt from Transactions when the app starts, then kept current by the
+# transactions_velocity notifications that the Transactions insert trigger sends on
+# commit (migration 10). Every insert path is covered, on every worker, and queries never
+# touch PostgreSQL. Transactions dated ahead of the clock are not counted.
+
+VELOCITY_PRUNE_INTERVAL = float(os.getenv("VELOCITY_PRUNE_INTERVAL", "300"))  # seconds between sweeps of idle users
+
+# (name, bucket width in seconds, buckets), shortest window first.
+WINDOWS = (
+    ("1h", 300, 12),
+    ("24h", 3600, 24),
+    ("7d", 6 * 3600, 28),
+)
+LONGEST_WINDOW_SECONDS = max(width * size for _, width, size in WINDOWS)
+MAX_CLOCK_SKEW = 60  # seconds a transaction may be dated ahead of this process's clock
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def epoch_seconds(timestamp: datetime) -> int:
+    """
+    Seconds since 1970 of a naive timestamp, read as Transactions stores it.
+    """
+    return int((timestamp - _EPOCH).total_seconds())
+
+
+def parse_snapshot(text: str) -> tuple:
+    """
+    (xmin, xmax, in-progress xids) of a pg_current_snapshot() value.
+    """
+    xmin, xmax, xip = text.split(":")
+    return int(xmin), int(xmax), frozenset(int(xid) for xid in xip.split(",") if xid)
+
+
+def visible_in_snapshot(xid: int, snapshot: tuple) -> bool:
+    """
+    Whether the transaction xid had committed when the snapshot was taken, as
+    pg_visible_in_snapshot() answers for a transaction that committed.
+    """
+    xmin, xmax, xip = snapshot
+    return xid < xmin or (xid < xmax and xid not in xip)
+
+
+def _ring_sum(rings: array, offset: int, size: int, first: int, last: int) -> float:
+    # Sum of the slots of buckets first..last, which wrap around the ring at most once.
+    if last < first:
+        return 0.0
+    start = offset + first % size
+    end = start + last - first + 1
+    if end <= offset + size:
+        return sum(rings[start:end])
+    return sum(rings[start:offset + size]) + sum(rings[offset:end - size])
+
+
+class VelocityStore:
+    """
+    Rolling count and volume per originUserId. Each user's rings are one array of
+    doubles holding, per window: its latest bucket, its count and volume totals, then
+    the count and the amount of each bucket. Reading a user expires the buckets that
+    fell out of its windows, so lookups only read the totals.
+    """
+
+    def __init__(self):
+        self._users = {}
+        self._snapshot = None
+        self._layout = []
+        offset = 0
+        for name, width, size in WINDOWS:
+            self._layout.append((name, width, size, offset, array("d", bytes(8 * size))))
+            offset += 3 + 2 * size
+        self._length = offset
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    @staticmethod
+    def _advance(rings: array, size: int, base: int, empty: array, bucket: int):
+        # Moves a window's latest bucket forward, emptying the slots of the buckets
+        # skipped, and taking them off the totals.
+        counts, amounts = base + 3, base + 3 + size
+        latest = int(rings[base])
+        if bucket - latest >= size:
+            rings[counts:counts + size] = empty
+            rings[amounts:amounts + size] = empty
+            rings[base + 1] = rings[base + 2] = 0.0
+        else:
+            for skipped in range(latest + 1, bucket + 1):
+                slot = skipped % size
+                rings[base + 1] -= rings[counts + slot]
+                rings[base + 2] -= rings[amounts + slot]
+                rings[counts + slot] = rings[amounts + slot] = 0.0
+            if not rings[base + 1]:
+                rings[base + 2] = 0.0  # no rounding left behind by the subtractions
+        rings[base] = bucket
+
+    def record(self, user_id: str, seconds: int, count: int, amount: float):
+        """
+        Adds count transactions totalling amount, dated seconds since 1970.
+        """
+        rings = self._users.get(user_id)
+        if rings is None:
+            rings = self._users[user_id] = array("d", bytes(8 * self._length))
+        for _, width, size, base, empty in self._layout:
+            bucket = seconds // width
+            latest = rings[base]
+            if bucket > latest:
+                self._advance(rings, size, base, empty, bucket)
+            elif bucket <= latest - size:
+                continue  # older than this window
+            slot = base + 3 + bucket % size
+            rings[slot] += count
+            rings[slot + size] += amount
+            rings[base + 1] += count
+            rings[base + 2] += amount
+
+    def get(self, user_id: str, seconds: int = None) -> dict:
+        """
+        {window: {"count", "volume"}} of a user, as of seconds since 1970 (now by default).
+        """
+        if seconds is None:
+            seconds = epoch_seconds(datetime.now())
+        rings = self._users.get(user_id)
+        result = {}
+        for name, width, size, base, empty in self._layout:
+            if rings is None:
+                result[name] = {"count": 0, "volume": 0.0}
+                continue
+            bucket = seconds // width
+            latest = int(rings[base])
+            if bucket > latest:
+                self._advance(rings, size, base, empty, bucket)
+            elif bucket < latest:
+                # As of a time before the latest transaction: the buckets up to it.
+                first = latest - size + 1
+                result[name] = {
+                    "count": int(_ring_sum(rings, base + 3, size, first, bucket)),
+                    "volume": _ring_sum(rings, base + 3 + size, size, first, bucket),
+                }
+                continue
+            result[name] = {"count": int(rings[base + 1]), "volume": rings[base + 2]}
+        return result
+
+    def apply(self, payload: str, seconds: int = None) -> int:
+        """
+        Records a transactions_velocity notification, unless its transaction is
+        already counted in the snapshot the store was rebuilt from.
+
+        :return: Number of (user, minute) deltas recorded.
+        """
+        message = orjson.loads(payload)
+        if self._snapshot is not None and visible_in_snapshot(message["xid"], self._snapshot):
+            return 0
+        if seconds is None:
+            seconds = epoch_seconds(datetime.now())
+        recorded = 0
+        for user_id, minute, count, amount in message["rows"]:
+            if seconds - LONGEST_WINDOW_SECONDS < minute <= seconds + MAX_CLOCK_SKEW:
+                self.record(user_id, minute, count, amount)
+                recorded += 1
+        return recorded
+
+    def replace(self, other: "VelocityStore", snapshot: tuple):
+        """
+        Takes the users of a store rebuilt from the database as of snapshot.
+        """
+        self._users = other._users
+        self._snapshot = snapshot
+
+    def prune(self, seconds: int = None) -> int:
+        """
+        Drops the users without transactions in any window.
+
+        :return: Number of users dropped.
+        """
+        if seconds is None:
+            seconds = epoch_seconds(datetime.now())
+        idle = [
+            user_id for user_id, rings in self._users.items()
+            if all(rings[base] <= seconds // width - size for _, width, size, base, _ in self._layout)
+        ]
+        for user_id in idle:
+            del self._users[user_id]
+        return len(idle)
+
+
+velocity_store = VelocityStore()
+metrics.VELOCITY_USERS.set_function((), lambda: len(velocity_store))
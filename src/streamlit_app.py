@@ -12,10 +12,21 @@ load_dotenv()
 BASE_URL = "http://localhost:8000"
 API_KEY = os.getenv("API_KEY")
 
+# Seconds a page of search results is reused before it is fetched again
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", "60"))
+
+SORT_ORDERS = {"Ascending": "asc", "Descending": "desc"}
+
+# One HTTP session for the whole app, so reruns reuse its keep-alive connections
+@st.cache_resource
+def http_session():
+    session = requests.Session()
+    session.headers["access_token"] = API_KEY
+    return session
+
 # Utility function to fetch data from the API
 def fetch_data(endpoint, params=None):
-    headers = {"access_token": API_KEY}
-    response = requests.get(f"{BASE_URL}/{endpoint}", params=params, headers=headers)
+    response = http_session().get(f"{BASE_URL}/{endpoint}", params=params)
     if response.status_code == 200:
         data = response.json()
         if not data:
@@ -27,14 +38,25 @@ def fetch_data(endpoint, params=None):
 
 # Utility function to post data to the API
 def post_data(endpoint, data=None):
-    headers = {"access_token": API_KEY, "Content-Type": "application/x-www-form-urlencoded"}
-    response = requests.post(f"{BASE_URL}/{endpoint}", data=data, headers=headers)
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    response = http_session().post(f"{BASE_URL}/{endpoint}", data=data, headers=headers)
     if response.status_code == 200:
         return response.json()
     else:
         st.error(f"Failed to post data: {response.status_code} {response.text}")
         return None
 
+# One page of search results, sorted and paginated by the API. Cached per filter set,
+# sort, page size and cursor; failed requests raise and are not cached.
+@st.cache_data(ttl=PAGE_CACHE_TTL, show_spinner=False)
+def fetch_page(filters, sort_by, sort_order, limit, cursor=None):
+    params = dict(filters, sort_by=sort_by, sort_order=sort_order, limit=limit)
+    if cursor:
+        params["cursor"] = cursor
+    response = http_session().get(f"{BASE_URL}/transactions/search_advanced", params=params)
+    response.raise_for_status()
+    return response.json()
+
 # Utility function to format the fetched data into a DataFrame
 def format_data(data):
     return pd.DataFrame(data)
@@ -42,96 +64,99 @@ def format_data(data):
 def convert_df_to_csv(df):
     return df.to_csv(index=False).encode('utf-8')
 
-# Function to display data with pagination and sorting
-def display_paginated_sorted_data(data, sort_by, sort_order, current_page=1, items_per_page=5):
-    if data.empty:
-        st.warning("No elements found")
-        return
+# Starts a new search from its first page; unset filters are left out rather than sent as empty values
+def start_search(filters):
+    st.session_state.filters = {key: value for key, value in filters.items() if value not in (None, "")}
+    st.session_state.cursors = [None]
+    st.session_state.current_page = 1
 
-    if sort_by not in data.columns:
-        st.error(f"Cannot sort by {sort_by}. Column not found in data.")
+# Function to display the current page of the search
+def display_current_page(sort_by, sort_order, items_per_page):
+    page = st.session_state.current_page
+    try:
+        data = fetch_page(st.session_state.filters, sort_by, sort_order, items_per_page, st.session_state.cursors[page - 1])
+    except requests.HTTPError as e:
+        st.error(f"{e.response.text}")
+        return
+    except requests.RequestException as e:
+        st.error(f"{e}")
         return
 
-    if sort_order == "Ascending":
-        sorted_data = data.sort_values(by=sort_by, ascending=True)
-    else:
-        sorted_data = data.sort_values(by=sort_by, ascending=False)
-    
-    start_idx = (current_page - 1) * items_per_page
-    end_idx = start_idx + items_per_page
-    paginated_data = sorted_data[start_idx:end_idx]
+    # The cursor of the next page is kept, so Previous and Next only fetch one page each
+    if data["next_cursor"] and len(st.session_state.cursors) == page:
+        st.session_state.cursors.append(data["next_cursor"])
+
+    if not data["transactions"]:
+        st.warning("No elements found")
+        return
     st.title("The Transactions are :")
-    st.dataframe(paginated_data)
-    return len(sorted_data)
+    st.dataframe(format_data(data["transactions"]))
+
+def previous_page():
+    st.session_state.current_page -= 1
+
+def next_page():
+    st.session_state.current_page += 1
 
 # Initialize session state variables
-if "current_page" not in st.session_state:
+if "filters" not in st.session_state:
+    st.session_state.filters = None
+    st.session_state.cursors = [None]
     st.session_state.current_page = 1
-if "total_items" not in st.session_state:
-    st.session_state.total_items = 0
-if "df" not in st.session_state:
-    st.session_state.df = pd.DataFrame()
 
 # Sorting controls
 sort_by = st.sidebar.selectbox("Sort By", ["origin_amount", "timestamp"])
-sort_order = st.sidebar.selectbox("Sort Order", ["Ascending", "Descending"])
+sort_order = SORT_ORDERS[st.sidebar.selectbox("Sort Order", list(SORT_ORDERS))]
 
 # Pagination controls
 items_per_page = st.sidebar.number_input("Items per page", min_value=1, max_value=100, value=10)
 
+# Cursors belong to one sort and page size; start over from the first page when they change
+if st.session_state.get("page_shape") != (sort_by, sort_order, items_per_page):
+    st.session_state.page_shape = (sort_by, sort_order, items_per_page)
+    st.session_state.cursors = [None]
+    st.session_state.current_page = 1
+
 # Sidebar filters
 st.sidebar.header("Filters")
 
 amount = st.sidebar.number_input("Amount", min_value=0.0, step=0.01)
 if st.sidebar.button("Search by Amount"):
-    data = fetch_data("/search_transaction_by_amount", {"amount": amount})
-    st.session_state.df = format_data(data)
-    st.session_state.total_items = display_paginated_sorted_data(st.session_state.df, sort_by, sort_order, st.session_state.current_page, items_per_page)
+    start_search({"amount": amount})
 
 start_date = st.sidebar.date_input("Start Date")
 end_date = st.sidebar.date_input("End Date")
 if st.sidebar.button("Search by Date Range"):
-    data = fetch_data("/search_transaction_by_date_range", {"start_date": start_date, "end_date": end_date})
-    st.session_state.df = format_data(data)
-    st.session_state.total_items = display_paginated_sorted_data(st.session_state.df, sort_by, sort_order, st.session_state.current_page, items_per_page)
+    start_search({"start_date": start_date, "end_date": end_date})
 
 transaction_type = st.sidebar.selectbox("Transaction Type", ["WITHDRAW", "DEPOSIT", "TRANSFER", "EXTERNAL_PAYMENT", "REFUND", "OTHER"])
 if st.sidebar.button("Search by Type"):
-    data = fetch_data("/search_transaction_by_type", {"type": transaction_type})
-    st.session_state.df = format_data(data)
-    st.session_state.total_items = display_paginated_sorted_data(st.session_state.df, sort_by, sort_order, st.session_state.current_page, items_per_page)
+    start_search({"type": transaction_type})
 
 user_id = st.sidebar.text_input("User ID")
 country = st.sidebar.text_input("Country")
 if st.sidebar.button("Advanced Search"):
-    params = {
-        "amount": amount,
+    start_search({
+        "amount": amount or None,
         "start_date": start_date,
         "end_date": end_date,
         "type": transaction_type,
         "user_id": user_id,
         "country": country
-    }
-    data = fetch_data("transactions/search_advanced", params)
-    st.session_state.df = format_data(data)
-    st.session_state.total_items = display_paginated_sorted_data(st.session_state.df, sort_by, sort_order, st.session_state.current_page, items_per_page)
+    })
 
-# Pagination buttons
-if st.session_state.total_items > items_per_page:
+if st.session_state.filters is not None:
+    display_current_page(sort_by, sort_order, items_per_page)
+
+    # Pagination buttons
+    page = st.session_state.current_page
     col1, col2, col3 = st.columns([1, 1, 1])
     with col1:
-        if st.button("Previous"):
-            if st.session_state.current_page > 1:
-                st.session_state.current_page -= 1
-                display_paginated_sorted_data(st.session_state.df, sort_by, sort_order, st.session_state.current_page, items_per_page)
+        st.button("Previous", on_click=previous_page, disabled=page == 1)
+    with col2:
+        st.write(f"Page {page}")
     with col3:
-        if st.button("Next"):
-            if st.session_state.current_page * items_per_page < st.session_state.total_items:
-                st.session_state.current_page += 1
-                display_paginated_sorted_data(st.session_state.df, sort_by, sort_order, st.session_state.current_page, items_per_page)
-
-if not st.session_state.df.empty:
-    display_paginated_sorted_data(st.session_state.df, sort_by, sort_order, st.session_state.current_page, items_per_page)
+        st.button("Next", on_click=next_page, disabled=len(st.session_state.cursors) <= page)
 
 # Main dashboard
 st.title("Transaction Dashboard")
@@ -158,6 +183,8 @@ if submitted:
     }
     result = post_data("create_transactions", transaction_data)
     if result:
+        # Cached pages may be missing the new transaction
+        fetch_page.clear()
         st.success("Transaction created successfully")
 
 # Control CRON job
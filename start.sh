@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# Apply schema migrations before serving
+python src/migrate.py || exit 1
+
 # Start the FastAPI server
 uvicorn server.app:app --host 0.0.0.0 --port 8000 --reload &
 
@@ -20,6 +20,13 @@ def mock_db():
 
 load_dotenv()
 
+
+@pytest.fixture(scope='session', autouse=True)
+def migrate_db():
+    # The app no longer creates its schema on import; bring the test database up to date.
+    from server.migrations import run_migrations
+    run_migrations(os.getenv("DATABASE_URL"))
+
 @pytest.fixture(scope="module")
 def test_client():
     client = TestClient(app)
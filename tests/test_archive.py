@@ -0,0 +1,90 @@
+import os
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from fastapi.testclient import TestClient
+from src.server.database import get_db
+from server import archive, partitions
+from server.app import app
+
+ROWS = [
+    ("1992-03-10 09:00", "DEPOSIT", "10.50"),
+    ("1992-03-10 18:30", "REFUND", "4.25"),
+    ("1992-03-11 00:00", "DEPOSIT", "100"),
+    ("1992-03-31 23:59:59", "DEPOSIT", "0.01"),
+]
+
+INSERT = """
+    INSERT INTO {table} (transaction_id, type, timestamp, origin_amount, origin_currency, destination_amount, destination_currency)
+    VALUES (%s, %s, %s, %s, 'USD', 1, 'USD')
+"""
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_archive_partition(archive_dir):
+    # Rolled back, so only the files remain.
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            for i, (timestamp, type, amount) in enumerate(ROWS):
+                cur.execute(INSERT.format(table="Transactions"), (-9101 - i, type, timestamp, amount))
+            start, end = datetime(1992, 3, 1), datetime(1992, 4, 1)
+            partitions.create_partitions(cur, {(start, end)})
+            assert partitions.archive_partition(cur, "transactions_p19920301", start, end) == len(ROWS)
+
+            cur.execute("SELECT to_regclass('transactions_p19920301'), (SELECT count(*) FROM TransactionIds WHERE transaction_id <= -9101 AND transaction_id > -9110)")
+            assert cur.fetchone() == (None, 0)
+        conn.rollback()
+
+    assert archive.watermark() == end
+    assert sorted(os.listdir(archive_dir)) == ["date=1992-03-10", "date=1992-03-11", "date=1992-03-31", "watermark"]
+
+    rows = archive.search(datetime(1992, 1, 1), datetime(1993, 1, 1))
+    assert [row["transaction_id"] for row in rows] == [-9101, -9102, -9103, -9104]
+    assert rows[0]["timestamp"] == datetime(1992, 3, 10, 9) and rows[0]["origin_amount"] == Decimal("10.5")
+    page = archive.search(datetime(1992, 1, 1), datetime(1993, 1, 1), limit=2, after=(rows[1]["timestamp"], rows[1]["id"]))
+    assert [row["transaction_id"] for row in page] == [-9103, -9104]
+    assert archive.search(datetime(1992, 3, 10, 12), datetime(1992, 3, 11)) == rows[1:3]
+
+    assert archive.summarize(datetime(1992, 3, 10), datetime(1992, 3, 31)) == {"DEPOSIT": [2, Decimal("110.5")], "REFUND": [1, Decimal("4.25")]}
+    assert archive.split(datetime(1992, 3, 15), datetime(1992, 5, 1)) == (True, end)
+    assert archive.split(datetime(1992, 3, 15), datetime(1992, 3, 20)) == (True, None)
+    assert archive.split(datetime(1992, 4, 15), datetime(1992, 5, 1)) == (False, datetime(1992, 4, 15))
+
+
+def test_routes_merge_archive(archive_dir):
+    headers = {"access_token": "valid_api_key"}
+    params = {"start_date": "1993-03-01T00:00:00", "end_date": "2100-01-01T00:00:00"}
+    with TestClient(app) as client:
+        summary = {row["type"]: row["count"] for row in client.get("/transactions/summary", params=params, headers=headers).json()}
+        total = client.get("/transactions/total_amount", params=params, headers=headers).json()["total_amount"]
+        streamed = client.get("/search_transaction_by_date_range", params=dict(params, stream=True), headers=headers).text.splitlines()
+
+        # Archives copies of ROWS a year later, without touching Transactions.
+        with get_db() as conn:
+            with conn.cursor() as cur:
+                cur.execute("CREATE TEMP TABLE archive_source (LIKE Transactions INCLUDING DEFAULTS) ON COMMIT DROP")
+                for i, (timestamp, type, amount) in enumerate(ROWS):
+                    cur.execute(INSERT.format(table="archive_source"), (-9201 - i, type, timestamp.replace("1992", "1993"), amount))
+                archive.write_archive(conn, "archive_source")
+            conn.rollback()
+        archive.advance_watermark(datetime(1993, 4, 1))
+
+        merged = {row["type"]: row["count"] for row in client.get("/transactions/summary", params=params, headers=headers).json()}
+        assert merged.get("DEPOSIT") == summary.get("DEPOSIT", 0) + 3
+        assert merged.get("REFUND") == summary.get("REFUND", 0) + 1
+        merged_total = client.get("/transactions/total_amount", params=params, headers=headers).json()["total_amount"]
+        assert merged_total == pytest.approx(total + 114.76)
+
+        first = client.get("/search_transaction_by_date_range", params=dict(params, limit=3), headers=headers).json()
+        assert [row["transaction_id"] for row in first["transactions"]] == [-9201, -9202, -9203]
+        second = client.get("/search_transaction_by_date_range", params=dict(params, limit=3, cursor=first["next_cursor"]), headers=headers).json()
+        assert second["transactions"][0]["transaction_id"] == -9204
+        assert len(second["transactions"]) == min(3, 1 + len(streamed))
+
+        lines = client.get("/search_transaction_by_date_range", params=dict(params, stream=True), headers=headers).text.splitlines()
+        assert len(lines) == len(streamed) + len(ROWS)
@@ -0,0 +1,34 @@
+import asyncio
+import sys
+from prometheus_client import REGISTRY
+from src.server.cache import TransactionCache
+
+
+def evictions() -> float:
+    return REGISTRY.get_sample_value("transaction_cache_evictions_total") or 0.0
+
+
+def test_local_tier_is_bounded_by_bytes():
+    body = b"x" * 100
+    cache = TransactionCache(max_bytes=sys.getsizeof(body) * 3, url=None)
+    before = evictions()
+    for transaction_id in range(4):
+        asyncio.run(cache.put(transaction_id, body))
+    assert len(cache) == 3
+    assert cache.currsize <= sys.getsizeof(body) * 3
+    assert evictions() == before + 1
+    assert asyncio.run(cache.get(0)) is None  # least recently used
+    assert asyncio.run(cache.get(3)) == body
+
+
+def test_oversized_entry_is_not_cached():
+    cache = TransactionCache(max_bytes=64, url=None)
+    asyncio.run(cache.put(1, b"x" * 1000))
+    assert asyncio.run(cache.get(1)) is None
+
+
+def test_disabled_local_tier():
+    cache = TransactionCache(max_bytes=0, url=None)
+    asyncio.run(cache.put(1, b"{}"))
+    assert asyncio.run(cache.get(1)) is None
+    assert len(cache) == 0
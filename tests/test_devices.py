@@ -0,0 +1,32 @@
+from src.server.devices import DeviceBatch, device_id, known_devices
+
+DEVICE = {"ipAddress": "10.23.191.2", "batteryLevel": 95.0, "vpnUsed": False}
+
+
+def test_device_id_ignores_key_order():
+    reordered = dict(reversed(list(DEVICE.items())))
+    assert device_id(reordered) == device_id(DEVICE)
+    assert device_id({**DEVICE, "vpnUsed": True}) != device_id(DEVICE)
+    assert -2 ** 63 <= device_id(DEVICE) < 2 ** 63
+    assert device_id(None) is None
+
+
+def test_batch_collects_each_device_once():
+    batch = DeviceBatch(skip_known=False)
+    other = {**DEVICE, "ipAddress": "10.0.0.1"}
+    ids = [batch.add(DEVICE), batch.add(other), batch.add(DEVICE), batch.add(None)]
+    assert ids[0] == ids[2] and ids[3] is None
+    device_ids, texts = batch.params()
+    assert device_ids == sorted(ids[:2])
+    assert len(texts) == 2
+
+
+def test_batch_skips_stored_devices():
+    device = {**DEVICE, "deviceIdentifier": "test_batch_skips_stored_devices"}
+    first = DeviceBatch()
+    first.add(device)
+    first.stored()
+    assert device_id(device) in known_devices
+    second = DeviceBatch()
+    assert second.add(device) == device_id(device)
+    assert second.pending == {}
@@ -0,0 +1,39 @@
+import asyncio
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.server.queries import EXPORT_COLUMNS
+from src.server.utils.export import encode_export, export_schema, record_batch
+
+ROW = (1, "DEPOSIT", 1704067200000000, "1", "2", 10.5, "USD", "US", 9.75, "EUR", "DE", False, "ref")
+
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _collect(export_format, *chunks):
+    return b"".join([piece async for piece in encode_export(_chunks(*chunks), export_format)])
+
+
+def test_schema_matches_export_columns():
+    assert export_schema().names == [name for name, _ in EXPORT_COLUMNS]
+
+
+def test_record_batch_converts_timestamps():
+    batch = record_batch([ROW])
+    assert batch.num_rows == 1
+    assert batch.column("timestamp")[0].as_py() == datetime(2024, 1, 1)
+    assert batch.column("destination_amount")[0].as_py() == 9.75
+
+
+def test_encode_export_streams_each_chunk():
+    data = asyncio.run(_collect("arrow", [ROW], [ROW, ROW]))
+    table = pa.ipc.open_stream(data).read_all()
+    assert table.num_rows == 3
+    assert table.schema == export_schema()
+    data = asyncio.run(_collect("parquet", [ROW], [ROW, ROW]))
+    assert pq.read_table(pa.BufferReader(data)).num_rows == 3
@@ -0,0 +1,45 @@
+from datetime import datetime
+import pytest
+from src.server.utils import ids
+from src.server.utils.ids import MAX_SEQUENCE, SEQUENCE_BITS, IdGenerator, id_timestamp, min_id_at
+
+
+def test_ids_are_unique_and_increasing():
+    generator = IdGenerator(worker_id=5)
+    generated = [generator.next_id() for _ in range(20000)]
+    assert generated == sorted(generated)
+    assert len(set(generated)) == len(generated)
+    assert all(0 < value < 2 ** 63 for value in generated)
+    assert all((value >> SEQUENCE_BITS) & 1023 == 5 for value in generated)
+
+
+def test_workers_do_not_collide(monkeypatch):
+    monkeypatch.setattr(ids.time, "time", lambda: 1_700_000_000.0)
+    first, second = IdGenerator(worker_id=1), IdGenerator(worker_id=2)
+    assert {first.next_id() for _ in range(100)}.isdisjoint({second.next_id() for _ in range(100)})
+
+
+def test_sequence_overflow_and_clock_going_back(monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(ids.time, "time", lambda: now[0])
+    generator = IdGenerator(worker_id=0)
+    generated = [generator.next_id() for _ in range(MAX_SEQUENCE + 2)]
+    now[0] -= 5  # clock stepped back
+    generated += [generator.next_id() for _ in range(10)]
+    assert generated == sorted(generated)
+    assert len(set(generated)) == len(generated)
+
+
+def test_id_encodes_its_creation_time():
+    generator = IdGenerator(worker_id=3)
+    before = datetime.now()
+    value = generator.next_id()
+    assert min_id_at(before.replace(microsecond=0)) <= value
+    assert abs((id_timestamp(value) - before).total_seconds()) < 1
+
+
+def test_requires_worker_id():
+    with pytest.raises(RuntimeError):
+        IdGenerator().next_id()
+    with pytest.raises(ValueError):
+        IdGenerator(worker_id=1024)
@@ -0,0 +1,42 @@
+import psycopg
+import pytest
+from src.server import queries
+from src.server.async_database import DATABASE_URL
+
+START_DATE = "2023-01-01T00:00:00"
+END_DATE = "2023-12-31T23:59:59"
+
+# Every query issued by the API, with representative parameters.
+QUERIES = [
+    (queries.SELECT_TRANSACTION_BY_ID, (123456,)),
+    (queries.SEARCH_TRANSACTIONS_BY_AMOUNT, (100.0,)),
+    (queries.SEARCH_TRANSACTIONS_BY_DATE_RANGE, (START_DATE, END_DATE)),
+    (queries.SEARCH_TRANSACTIONS_BY_TYPE, ("DEPOSIT",)),
+    (queries.TRANSACTION_SUMMARY, (START_DATE, END_DATE)),
+    (queries.TOTAL_TRANSACTION_AMOUNT, (START_DATE, END_DATE)),
+    (queries.VERIFY_KEY, ("0" * 64,)),
+    queries.advanced_search_query({"type": "DEPOSIT", "start_date": START_DATE, "end_date": END_DATE}),
+    queries.advanced_search_query({"min_amount": 10, "max_amount": 20}, sort_by="origin_amount"),
+    queries.advanced_search_query({"user_id": "1", "country": "US"}, descending=True),
+]
+
+
+def plan_uses_index(plan: dict) -> bool:
+    if "Index" in plan["Node Type"]:
+        return True
+    return any(plan_uses_index(child) for child in plan.get("Plans", []))
+
+
+@pytest.mark.parametrize("query, params", QUERIES)
+def test_query_uses_index(query, params):
+    # Bound with psycopg 3 like async_database.py: parameters are sent separately and
+    # typed from the Python value, so a float compared to a NUMERIC column shows up here.
+    with psycopg.connect(DATABASE_URL) as conn:
+        with conn.cursor() as cur:
+            # Test tables are tiny, so a sequential scan would win on cost; only
+            # check that an index exists that the planner is able to use.
+            cur.execute("SET LOCAL enable_seqscan = off")
+            cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = cur.fetchone()[0][0]["Plan"]
+        conn.rollback()
+    assert plan_uses_index(plan), plan
@@ -1,11 +1,14 @@
+import json
+import time
 import pytest
 from fastapi.testclient import TestClient
 from src.server.app import app  # Adjust import according to your project structure
 
 @pytest.fixture(scope="module")
 def test_client():
-    client = TestClient(app)
-    return client
+    # Entering the client runs the app lifespan, which opens the async connection pool.
+    with TestClient(app) as client:
+        yield client
 
 def test_read_main(test_client):
     response = test_client.get("/")
@@ -46,3 +49,118 @@ def test_get_total_transaction_amount(test_client):
     }
     response = test_client.get("/transactions/total_amount", params=params, headers={"access_token": "valid_api_key"})
     assert response.status_code == 200
+
+def test_bulk_create_transactions(test_client):
+    row = {
+        "type": "DEPOSIT",
+        "transactionId": time.time_ns() // 1000,  # transaction_id is unique
+        "timestamp": "2022-06-01T12:00:00",
+        "originUserId": "1",
+        "destinationUserId": "2",
+        "originAmountDetails": {"transactionAmount": 10.0, "transactionCurrency": "USD", "country": "US"},
+        "destinationAmountDetails": {"transactionAmount": 10.0, "transactionCurrency": "USD", "country": "US"},
+    }
+    invalid_row = dict(row, type="NOT_A_TYPE")
+    body = "\n".join(json.dumps(r) for r in [row, invalid_row])
+    response = test_client.post(
+        "/transactions/bulk",
+        content=body,
+        headers={"access_token": "valid_api_key", "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 1
+    assert response.json()["rejected"][0]["row"] == 1
+
+def test_invalid_api_key(test_client):
+    params = {
+        "start_date": "2023-01-01T00:00:00Z",
+        "end_date": "2023-12-31T23:59:59Z"
+    }
+    for _ in range(2):  # the second request is answered from the negative cache
+        response = test_client.get("/transactions/total_amount", params=params, headers={"access_token": "not_a_key"})
+        assert response.status_code == 403
+
+def test_search_transactions_pagination(test_client):
+    params = {"start_date": "2000-01-01T00:00:00", "end_date": "2100-01-01T00:00:00", "limit": 2}
+    headers = {"access_token": "valid_api_key"}
+    response = test_client.get("/search_transaction_by_date_range", params=params, headers=headers)
+    assert response.status_code == 200
+    first_page = response.json()
+    if first_page["next_cursor"]:
+        params["cursor"] = first_page["next_cursor"]
+        second_page = test_client.get("/search_transaction_by_date_range", params=params, headers=headers).json()
+        first_ids = {t["transaction_id"] for t in first_page["transactions"]}
+        assert not first_ids & {t["transaction_id"] for t in second_page["transactions"]}
+
+def test_search_transactions_stream(test_client):
+    params = {"type": "DEPOSIT", "stream": True}
+    response = test_client.get("/search_transaction_by_type", params=params, headers={"access_token": "valid_api_key"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    for line in response.text.splitlines():
+        assert json.loads(line)["type"] == "DEPOSIT"
+
+def test_search_advanced(test_client):
+    params = {"type": "DEPOSIT", "max_amount": 1000, "sort_by": "origin_amount", "sort_order": "desc", "limit": 5}
+    response = test_client.get("/transactions/search_advanced", params=params, headers={"access_token": "valid_api_key"})
+    assert response.status_code == 200
+    transactions = response.json()["transactions"]
+    assert all(t["type"] == "DEPOSIT" for t in transactions)
+    amounts = [t["origin_amount"] for t in transactions]
+    assert amounts == sorted(amounts, reverse=True)
+
+def test_metrics(test_client):
+    test_client.get("/search_transaction_by_type", params={"type": "DEPOSIT", "stream": True}, headers={"access_token": "valid_api_key"})
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    assert 'http_request_duration_seconds_count{method="GET",route="/search_transaction_by_type",status="200"}' in response.text
+    assert 'db_query_duration_seconds_count{query="stream_transactions_by_type"}' in response.text
+    assert 'db_pool_connections{pool="async",state="idle"}' in response.text
+
+def test_get_transaction_cached(test_client):
+    from prometheus_client import REGISTRY
+
+    def queries():
+        return REGISTRY.get_sample_value("db_query_duration_seconds_count", {"query": "get_transactions"}) or 0.0
+
+    transaction_data = {"amount": 12.5, "sender_id": "1", "destination_id": "2", "type": "DEPOSIT", "currency": "USD", "country": "US"}
+    created = test_client.post("/create_transactions", json=transaction_data, headers={"access_token": "valid_api_key"}).json()
+    before = queries()
+    response = test_client.get(f"/get_transactions/{created['transaction_id']}", headers={"access_token": "valid_api_key"})
+    assert response.status_code == 200
+    assert response.json() == created
+    assert queries() == before  # filled by create_transaction, served without the pool
+
+def test_get_transaction_joins_device_data(test_client):
+    from prometheus_client import REGISTRY
+    from server.cache import transaction_cache  # the instance the app imported
+
+    def queries():
+        return REGISTRY.get_sample_value("db_query_duration_seconds_count", {"query": "get_transactions"}) or 0.0
+
+    transaction_data = {"amount": 7.5, "sender_id": "3", "destination_id": "4", "type": "TRANSFER", "currency": "USD", "country": "US"}
+    created = test_client.post("/create_transactions", json=transaction_data, headers={"access_token": "valid_api_key"}).json()
+    transaction_cache.clear()
+    before = queries()
+    response = test_client.get(f"/get_transactions/{created['transaction_id']}", headers={"access_token": "valid_api_key"})
+    assert response.status_code == 200
+    assert queries() == before + 1
+    assert response.json() == created
+    assert response.json()["origin_device_data"]["deviceModel"] == "Zenphone M2 Pro Max"
+
+def test_export_transactions(test_client):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    params = {"start_date": "2000-01-01T00:00:00", "end_date": "2100-01-01T00:00:00"}
+    headers = {"access_token": "valid_api_key"}
+    rows = len(test_client.get("/search_transaction_by_date_range", params=dict(params, stream=True), headers=headers).text.splitlines())
+    response = test_client.get("/transactions/export", params=dict(params, format="arrow"), headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    assert pa.ipc.open_stream(response.content).read_all().num_rows == rows
+    response = test_client.get("/transactions/export", params=dict(params, format="parquet"), headers=headers)
+    assert pq.read_table(pa.BufferReader(response.content)).num_rows == rows
+    # No matches is still a readable file with the schema.
+    empty = test_client.get("/transactions/export", params={"start_date": "1990-01-01T00:00:00", "end_date": "1990-01-02T00:00:00"}, headers=headers)
+    assert pa.ipc.open_stream(empty.content).read_all().num_rows == 0
@@ -0,0 +1,58 @@
+from datetime import datetime
+import pytest
+from src.server.database import get_db
+from src.server import partitions, queries
+
+
+def test_bucket():
+    assert partitions.bucket(datetime(2024, 12, 31, 23, 59), "month") == (datetime(2024, 12, 1), datetime(2025, 1, 1))
+    assert partitions.bucket(datetime(2024, 2, 29, 12), "day") == (datetime(2024, 2, 29), datetime(2024, 3, 1))
+    with pytest.raises(ValueError):
+        partitions.bucket(datetime(2024, 1, 1), "week")
+
+
+def test_buckets_between():
+    assert partitions.buckets_between(datetime(2024, 11, 15), datetime(2025, 1, 1), "month") == {
+        (datetime(2024, 11, 1), datetime(2024, 12, 1)),
+        (datetime(2024, 12, 1), datetime(2025, 1, 1)),
+        (datetime(2025, 1, 1), datetime(2025, 2, 1)),
+    }
+
+
+def test_uncovered():
+    existing = [("a", datetime(2024, 1, 10), datetime(2024, 1, 20))]
+    assert partitions.uncovered(datetime(2024, 1, 1), datetime(2024, 2, 1), existing) == [
+        (datetime(2024, 1, 1), datetime(2024, 1, 10)),
+        (datetime(2024, 1, 20), datetime(2024, 2, 1)),
+    ]
+    assert partitions.uncovered(datetime(2024, 1, 12), datetime(2024, 1, 18), existing) == []
+
+
+def test_rows_in_default_partition_move_and_detach():
+    # Rolled back: the partition, the row, its id and rollups.
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO Transactions (transaction_id, type, timestamp, origin_amount, origin_currency, destination_amount, destination_currency)"
+                " VALUES (-9001, 'DEPOSIT', '1991-05-17 10:00', 12, 'USD', 12, 'USD')"
+            )
+            cur.execute("SELECT tableoid::regclass::text FROM Transactions WHERE transaction_id = -9001")
+            assert cur.fetchone()[0] == partitions.DEFAULT_PARTITION
+
+            created = partitions.create_partitions(cur, {partitions.bucket(datetime(1991, 5, 17), "month")})
+            assert created == ["transactions_p19910501"]
+            cur.execute("SELECT tableoid::regclass::text FROM Transactions WHERE transaction_id = -9001")
+            assert cur.fetchone()[0] == "transactions_p19910501"
+            cur.execute(queries.SELECT_TRANSACTION_BY_ID, (-9001,))
+            assert cur.fetchone() is not None
+
+            partitions.detach_partition(cur, "transactions_p19910501", datetime(1991, 5, 1), datetime(1991, 6, 1))
+            cur.execute(queries.SELECT_TRANSACTION_BY_ID, (-9001,))
+            assert cur.fetchone() is None
+            cur.execute("SELECT count(*) FROM TransactionIds WHERE transaction_id = -9001")
+            assert cur.fetchone()[0] == 0
+            cur.execute("SELECT count(*) FROM DailyTransactionRollups WHERE bucket >= '1991-05-01' AND bucket < '1991-06-01'")
+            assert cur.fetchone()[0] == 0
+            cur.execute("SELECT count(*) FROM transactions_p19910501")
+            assert cur.fetchone()[0] == 1
+        conn.rollback()
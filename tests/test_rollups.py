@@ -0,0 +1,47 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from src.server.database import get_db
+from src.server import queries
+
+RAW_SUMMARY = """
+    SELECT type, COUNT(*), SUM(origin_amount) FROM Transactions
+    WHERE timestamp >= %s AND timestamp <= %s GROUP BY type
+"""
+
+BASE = datetime(1990, 1, 1)
+
+
+@pytest.fixture
+def seeded_cursor():
+    # Everything happens in one transaction that is rolled back, rollups included.
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            rng = random.Random(7)
+            for i in range(300):
+                cur.execute(
+                    "INSERT INTO Transactions (transaction_id, type, timestamp, origin_amount, origin_currency, destination_amount, destination_currency)"
+                    " VALUES (%s, %s, %s, %s, 'USD', 1, 'USD')",
+                    (-1 - i, rng.choice(["DEPOSIT", "REFUND", "TRANSFER"]),
+                     BASE + timedelta(minutes=rng.randrange(5 * 24 * 60)), rng.randrange(1, 1000)),
+                )
+            yield cur
+        conn.rollback()
+
+
+@pytest.mark.parametrize("start, end", [
+    (BASE, BASE + timedelta(days=5)),
+    (BASE + timedelta(hours=3, minutes=17), BASE + timedelta(days=3, hours=5, minutes=42)),
+    (BASE + timedelta(hours=3, minutes=17), BASE + timedelta(hours=9, minutes=1)),
+    (BASE + timedelta(hours=3, minutes=17), BASE + timedelta(hours=3, minutes=48)),
+    (BASE + timedelta(days=1), BASE + timedelta(days=2)),
+])
+def test_summary_matches_raw_rows(seeded_cursor, start, end):
+    seeded_cursor.execute(queries.TRANSACTION_SUMMARY, (start, end))
+    from_rollups = {row[0]: (row[1], row[2]) for row in seeded_cursor.fetchall()}
+    seeded_cursor.execute(RAW_SUMMARY, (start, end))
+    from_rows = {row[0]: (row[1], row[2]) for row in seeded_cursor.fetchall()}
+    assert from_rollups == from_rows
+
+    seeded_cursor.execute(queries.TOTAL_TRANSACTION_AMOUNT, (start, end))
+    assert seeded_cursor.fetchone()[0] == (sum(total for _, total in from_rows.values()) or None)
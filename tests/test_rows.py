@@ -0,0 +1,26 @@
+from src.server.models.transaction import Country, TransactionType
+from src.server.rows import compile_mapper, load_json, projection
+
+NAMES = ("id", "type", "origin_country", "origin_device_data")
+
+
+def test_mapper_is_compiled_once_per_shape():
+    assert compile_mapper(NAMES) is compile_mapper(NAMES)
+    assert compile_mapper(NAMES) is not compile_mapper(NAMES, ("id",))
+
+
+def test_mapper_converts_enums():
+    row = compile_mapper(NAMES)((1, "DEPOSIT", "US", {"a": 1}))
+    assert row == {"id": 1, "type": TransactionType.DEPOSIT, "origin_country": Country.US, "origin_device_data": {"a": 1}}
+    # Values without a member, such as NULL, are passed through.
+    assert compile_mapper(NAMES)((2, "LEGACY", None, None))["type"] == "LEGACY"
+
+
+def test_mapper_projection():
+    mapper = compile_mapper(NAMES, ("type", "id"))
+    assert list(mapper((1, "DEPOSIT", "US", None)).items()) == [("type", TransactionType.DEPOSIT), ("id", 1)]
+    assert projection(("id",))({"id": 1, "type": "DEPOSIT"}) == {"id": 1}
+
+
+def test_load_json_parses_each_value_once():
+    assert load_json(b'{"ipAddress": "10.0.0.1"}') is load_json(memoryview(b'{"ipAddress": "10.0.0.1"}'))
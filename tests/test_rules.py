@@ -0,0 +1,107 @@
+import json
+from datetime import datetime
+import pytest
+from psycopg2.extras import Json
+from pydantic import ValidationError
+from src.server.database import get_db
+from src.server.devices import DeviceBatch
+from server import queries, rules
+
+DEFINITIONS = rules.rule_definitions_adapter.validate_python([
+    {"ruleId": "big", "ruleName": "Big", "score": 70, "conditions": [{"field": "origin_amount", "op": ">=", "value": 1000}]},
+    {"ruleId": "eur", "ruleName": "EUR transfer", "score": 50, "conditions": [
+        {"field": "type", "op": "in", "value": ["TRANSFER", "EXTERNAL_PAYMENT"]},
+        {"field": "origin_currency", "op": "==", "value": "EUR"},
+    ]},
+    {"ruleId": "other_user", "ruleName": "Not user 1", "isShadow": True, "score": 90, "conditions": [
+        {"field": "origin_user_id", "op": "!=", "value": "1"},
+        {"field": "origin_country", "op": "not_in", "value": ["US"]},
+    ]},
+])
+
+
+def transaction(amount=10.0, type="DEPOSIT", currency="USD", country="US", user="1"):
+    details = {"transactionAmount": amount, "transactionCurrency": currency, "country": country}
+    return {
+        "type": type, "timestamp": datetime(1994, 6, 1, 12), "originUserId": user, "destinationUserId": "2",
+        "originAmountDetails": details, "destinationAmountDetails": details,
+    }
+
+
+def hit_ids(hits):
+    return [hit["ruleId"] for hit in hits]
+
+
+@pytest.mark.parametrize("data, ids, score, level", [
+    (transaction(), [], 0.0, "VERY_LOW"),
+    (transaction(amount=1000), ["big"], 70.0, "HIGH"),
+    (transaction(amount=5000, type="TRANSFER", currency="EUR"), ["big", "eur"], 100.0, "VERY_HIGH"),
+    (transaction(type="EXTERNAL_PAYMENT", currency="EUR", country="DE", user="7"), ["eur", "other_user"], 50.0, "MEDIUM"),
+    (transaction(country="DE", user=None), [], 0.0, "VERY_LOW"),  # a missing value fails every condition on it
+])
+def test_assess(data, ids, score, level):
+    hits, risk_score, risk_level = rules.RuleEngine(DEFINITIONS).assess(data)
+    assert (hit_ids(hits), risk_score, risk_level) == (ids, score, level)
+
+
+def test_default_rules_flag_proof_of_funds():
+    hits, score, level = rules.engine().assess(transaction(amount=1800, type="TRANSFER", currency="EUR"))
+    assert hit_ids(hits) == ["R-1a"]
+    assert hits[0]["ruleName"] == "Proof of funds for high value transactions" and hits[0]["ruleAction"] == "FLAG"
+    assert (score, level) == (40.0, "MEDIUM")
+
+
+@pytest.mark.parametrize("condition", [
+    {"field": "device", "op": "==", "value": "x"},
+    {"field": "origin_amount", "op": ">=", "value": "1800"},
+    {"field": "origin_currency", "op": ">", "value": "EUR"},
+    {"field": "origin_currency", "op": "==", "value": "GBP"},
+    {"field": "type", "op": "in", "value": "TRANSFER"},
+    {"field": "type", "op": "in", "value": []},
+])
+def test_invalid_conditions(condition):
+    with pytest.raises(ValidationError):
+        rules.rule_definitions_adapter.validate_python([{"ruleId": "r", "ruleName": "r", "conditions": [condition]}])
+
+
+def test_duplicate_rule_ids(tmp_path):
+    path = tmp_path / "rules.json"
+    definition = {"ruleId": "r", "ruleName": "r", "conditions": [{"field": "origin_amount", "op": ">", "value": 1}]}
+    path.write_text(json.dumps([definition, definition]))
+    with pytest.raises(ValueError):
+        rules.load_rules(str(path))
+
+
+def test_rescore_matches_assess():
+    engine = rules.RuleEngine(DEFINITIONS)
+    cases = [
+        transaction(),
+        transaction(amount=1000),
+        transaction(amount=5000, type="TRANSFER", currency="EUR"),
+        transaction(type="EXTERNAL_PAYMENT", currency="EUR", country="DE", user="7"),
+        transaction(country="DE", user=None),
+    ]
+    # Rolled back.
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            for i, data in enumerate(cases):
+                cur.execute(queries.INSERT_TRANSACTION, queries.insert_params(data, -9301 - i, Json, DeviceBatch()))
+            assert engine.rescore_window(cur, datetime(1994, 6, 1), datetime(1994, 6, 2)) >= len(cases)
+            cur.execute("SELECT transaction_id, hit_rules, risk_score, risk_level FROM Transactions WHERE transaction_id <= -9301 AND transaction_id > -9310 ORDER BY transaction_id DESC")
+            stored = cur.fetchall()
+        conn.rollback()
+    for data, (_, hits, score, level) in zip(cases, stored):
+        expected = engine.assess(data)
+        assert (hit_ids(hits), score, level) == (hit_ids(expected[0]), expected[1], expected[2])
+        assert hits == expected[0]
+
+
+def test_insert_stores_assessment():
+    with get_db() as conn:
+        with conn.cursor() as cur:
+            data = transaction(amount=1800, type="TRANSFER", currency="EUR")
+            cur.execute(queries.INSERT_TRANSACTION, queries.insert_params(data, -9311, Json, DeviceBatch()))
+            row = dict(zip([column.name for column in cur.description], cur.fetchone()))
+        conn.rollback()
+    assert hit_ids(row["hit_rules"]) == ["R-1a"]
+    assert (row["risk_score"], row["risk_level"]) == (40.0, "MEDIUM")
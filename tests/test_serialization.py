@@ -0,0 +1,24 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+from fastapi.encoders import jsonable_encoder
+from src.server.utils.serialization import FastJSONResponse, ndjson_line
+
+
+ROW = {
+    "transaction_id": Decimal("1000000001"),
+    "origin_amount": Decimal("12.50"),
+    "destination_amount": Decimal("3"),
+    "timestamp": datetime(2024, 1, 2, 3, 4, 5, 123456),
+    "created_at": datetime(2024, 1, 2, tzinfo=timezone.utc),
+    "origin_user_id": None,
+    "origin_device_data": {"ipAddress": "10.23.191.2", "batteryLevel": 95.0},
+    "tags": [{"key": "customKey", "value": "customValue"}],
+}
+
+
+def test_matches_jsonable_encoder():
+    expected = jsonable_encoder([ROW])
+    assert json.loads(FastJSONResponse([ROW]).body) == expected
+    assert json.loads(ndjson_line(ROW)) == expected[0]
+    assert json.loads(FastJSONResponse(ROW).body)["destination_amount"] == 3
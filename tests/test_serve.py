@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# Two workers' worth of metrics, written to the same directory by separate processes.
+RECORD = """
+from server import metrics
+metrics.QUERY_DURATION.labels("get_transactions").observe(0.01)
+"""
+
+RENDER = """
+from server import metrics
+metrics.CACHE_SIZE.set_function(("entries",), lambda: 3)
+print(metrics.render().decode())
+"""
+
+
+def _run(code, env):
+    return subprocess.run([sys.executable, "-c", code], cwd=SRC, env=env, capture_output=True, text=True, check=True).stdout
+
+
+def test_metrics_are_summed_over_workers(tmp_path):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    _run(RECORD, env)
+    _run(RECORD, env)
+    output = _run(RENDER, env)
+    assert 'db_query_duration_seconds_count{query="get_transactions"} 2.0' in output
+    assert 'transaction_cache_size{unit="entries"} 3.0' in output
+
+
+def test_pinned_id_worker_is_refused_with_several_workers():
+    env = dict(os.environ, ID_WORKER_ID="1")
+    result = subprocess.run([sys.executable, "serve.py", "--workers", "2"], cwd=SRC, env=env, capture_output=True, text=True)
+    assert result.returncode == 1
+    assert "ID_WORKER_ID" in result.stdout
@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# Seconds `import server.app` may take in a fresh interpreter; about 1s on a 1 CPU host.
+# Raise STARTUP_BUDGET_SECONDS on slower machines rather than deleting the test.
+STARTUP_BUDGET = float(os.getenv("STARTUP_BUDGET_SECONDS", "3"))
+
+# Only needed by scripts or on first use of an endpoint, never at import.
+DEFERRED_MODULES = ("pandas", "numpy", "pyarrow", "redis")
+
+IMPORT_APP = """
+import sys, time
+started = time.perf_counter()
+import server.app
+print(time.perf_counter() - started, ",".join(name for name in {deferred!r} if name in sys.modules))
+"""
+
+
+def _import_app(env) -> tuple:
+    code = IMPORT_APP.format(deferred=DEFERRED_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], cwd=SRC, env=env, capture_output=True, text=True, check=True, timeout=60).stdout
+    seconds, _, loaded = output.splitlines()[-1].partition(" ")
+    return float(seconds), [name for name in loaded.split(",") if name]
+
+
+def test_import_needs_no_database():
+    # Nothing listens on port 1: importing must not connect.
+    env = dict(os.environ, DATABASE_URL="postgresql://postgres@127.0.0.1:1/postgres")
+    _import_app(env)
+
+
+def test_import_is_within_budget():
+    seconds, loaded = _import_app(dict(os.environ))
+    assert not loaded, f"imported at startup: {loaded}"
+    assert seconds < STARTUP_BUDGET, f"import server.app took {seconds:.2f}s, budget {STARTUP_BUDGET}s"
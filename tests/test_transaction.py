@@ -1,6 +1,7 @@
 import pytest
+from fastapi.testclient import TestClient
+from src.server.app import app
 from src.server.database import get_transactions, get_total_transaction_amount
-import threading
 import time
 
 def test_get_transactions():
@@ -16,14 +17,14 @@ def test_get_total_transaction_amount():
     assert isinstance(total_amount, float)
 
 def test_generate_transaction():
-    from src.server.routes.transaction import generate_transaction, cron_running, cron_thread
-    cron_running = True
-    cron_thread = threading.Thread(target=generate_transaction)
-    cron_thread.start()
-    time.sleep(2)
-    cron_running = False
-    cron_thread.join()
-    transaction_id = 123456
-    transaction = get_transactions(transaction_id)
-    assert transaction is not None
-    assert transaction["transaction_id"] == transaction_id
+    headers = {"access_token": "valid_api_key"}
+    config = {"rate": 200, "workers": 2, "batch_size": 10, "user_skew": 1.1, "amount_distribution": "lognormal"}
+    with TestClient(app) as client:
+        assert client.post("/cron/start", json=config, headers=headers).status_code == 200
+        time.sleep(1)
+        status = client.get("/cron/status", headers=headers).json()
+        assert client.post("/cron/stop", headers=headers).status_code == 200
+    assert status["running"]
+    assert status["inserted"] > 0
+    assert status["failed_batches"] == 0
+    assert status["insert_latency_ms"]["p99"] > 0
@@ -0,0 +1,81 @@
+import time
+import uuid
+from datetime import datetime
+import orjson
+from fastapi.testclient import TestClient
+from server import velocity
+from server.app import app
+
+NOW = velocity.epoch_seconds(datetime(2024, 5, 1, 12, 0))
+HOUR = 3600
+
+
+def counts(store, user_id, seconds=NOW):
+    return {name: window["count"] for name, window in store.get(user_id, seconds).items()}
+
+
+def test_windows():
+    store = velocity.VelocityStore()
+    store.record("u", NOW - 10, 1, 5.0)
+    store.record("u", NOW - 2 * HOUR, 2, 20.0)
+    store.record("u", NOW - 3 * 24 * HOUR, 4, 100.0)
+    store.record("u", NOW - 8 * 24 * HOUR, 8, 1000.0)  # older than every window
+    assert store.get("u", NOW) == {
+        "1h": {"count": 1, "volume": 5.0},
+        "24h": {"count": 3, "volume": 25.0},
+        "7d": {"count": 7, "volume": 125.0},
+    }
+    assert counts(store, "other") == {"1h": 0, "24h": 0, "7d": 0}
+
+
+def test_windows_slide():
+    store = velocity.VelocityStore()
+    store.record("u", NOW, 1, 1.0)
+    assert counts(store, "u", NOW + HOUR - 300) == {"1h": 1, "24h": 1, "7d": 1}
+    assert counts(store, "u", NOW + HOUR) == {"1h": 0, "24h": 1, "7d": 1}
+    # A later transaction reuses the slots of expired buckets.
+    store.record("u", NOW + 2 * HOUR, 1, 1.0)
+    assert counts(store, "u", NOW + 2 * HOUR) == {"1h": 1, "24h": 2, "7d": 2}
+    # Late transactions still count in the windows they fall in.
+    store.record("u", NOW + 2 * HOUR - 1800, 1, 1.0)
+    store.record("u", NOW - 23 * HOUR, 1, 1.0)  # 25 hours before
+    assert counts(store, "u", NOW + 2 * HOUR) == {"1h": 2, "24h": 3, "7d": 4}
+    # Looking back before the latest transaction; buckets count whole (7d has 6 hour ones).
+    assert counts(store, "u", NOW + HOUR) == {"1h": 0, "24h": 2, "7d": 4}
+    assert store.get("u", NOW + 8 * 24 * HOUR) == {name: {"count": 0, "volume": 0.0} for name in ("1h", "24h", "7d")}
+
+
+def test_apply_and_prune():
+    store = velocity.VelocityStore()
+    store.replace(velocity.VelocityStore(), velocity.parse_snapshot("100:105:102,104"))
+    payload = lambda xid: orjson.dumps({"xid": xid, "rows": [["u", NOW - 60, 2, 3.5], ["v", NOW + 3600, 1, 1]]})
+    assert store.apply(payload(99), NOW) == 0  # counted in the snapshot
+    assert store.apply(payload(103), NOW) == 0
+    assert store.apply(payload(102), NOW) == 1  # in progress at the snapshot; "v" is in the future
+    assert store.apply(payload(105), NOW) == 1
+    assert store.get("u", NOW)["1h"] == {"count": 4, "volume": 7.0}
+    assert len(store) == 1
+    assert store.prune(NOW + 6 * 24 * HOUR) == 0
+    assert store.prune(NOW + 7 * 24 * HOUR) == 1
+    assert len(store) == 0
+
+
+def test_velocity_route():
+    headers = {"access_token": "valid_api_key"}
+    user_id = f"velocity-{uuid.uuid4()}"
+    transaction = {"amount": 7.5, "sender_id": user_id, "destination_id": "2", "type": "DEPOSIT", "currency": "USD", "country": "US"}
+    with TestClient(app) as client:
+        assert client.get(f"/users/{user_id}/velocity", headers=headers).json()["windows"]["1h"] == {"count": 0, "volume": 0.0}
+        assert client.post("/create_transactions", json=transaction, headers=headers).status_code == 200
+        # Counted when the insert's notification arrives.
+        for _ in range(50):
+            windows = client.get(f"/users/{user_id}/velocity", headers=headers).json()["windows"]
+            if windows["1h"]["count"]:
+                break
+            time.sleep(0.1)
+        assert windows == {name: {"count": 1, "volume": 7.5} for name in ("1h", "24h", "7d")}
+    # Rebuilt from Transactions at the next start, and not counted twice.
+    with TestClient(app) as client:
+        client.post("/create_transactions", json=dict(transaction, sender_id="other"), headers=headers)
+        time.sleep(0.2)
+        assert client.get(f"/users/{user_id}/velocity", headers=headers).json()["windows"]["7d"] == {"count": 1, "volume": 7.5}